@@ -2,6 +2,11 @@
 ASGI config for hasker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The question lists, question pages, answers and votes are served by the
+async views of qa.async_views, the live event streams of qa.live by
+LiveApplication in front of Django. Serve with, for example:
+
+    uvicorn hasker.asgi:application --workers 4 --no-access-log
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -12,5 +17,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hasker.settings')
+# settings.ASYNC_VIEWS
+os.environ.setdefault('HASKER_ASYNC_VIEWS', '1')
+
+django_application = get_asgi_application()
+
+from qa.live import LiveApplication  # noqa: E402 - needs the settings
 
-application = get_asgi_application()
+application = LiveApplication(django_application)
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
+import os
 import sys
 
 from pathlib import Path
@@ -38,12 +39,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'qa.apps.QaConfig',
     'users.apps.UsersConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # above the session middleware, session writes pin the client to the primary
+    'qa.routers.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +91,16 @@ DATABASES = {
     }
 }
 
+# Read-only streaming replicas of "default": add them to DATABASES and list
+# their aliases, e.g.
+# DATABASES["replica1"] = {**DATABASES["default"], "HOST": "replica1"}
+# DATABASE_REPLICAS = ["replica1"]
+# Question lists, question pages and the tag directory read from a random
+# replica, everything else uses "default", see qa.routers
+DATABASE_REPLICAS = []
+
+DATABASE_ROUTERS = ["qa.routers.ReplicaRouter"]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -153,11 +167,41 @@ if not TESTING:
         *MIDDLEWARE,
     ]
 
+# Cache shared by all worker processes of one host; use Memcached or Redis
+# when running on several hosts. Tests use an isolated in-memory cache.
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
+    }
+}
+
+if TESTING:
+    # a second connection to the test database, for the replica routing tests
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # to print emails to console
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 MAX_FILE_SIZE = 102400  
 
+# avatars are resized to these sizes (pixels) once, after upload
+AVATAR_SIZES = (32, 64, 256)
+
+# directory of the resized avatars in the media storage
+AVATAR_VARIANTS_DIR = "avatars/variants"
+
+# processes resizing avatars, 0 resizes in the web process after commit
+AVATAR_WORKERS = 2
+
 ############################
 ### settings for Q&A app ###
 
@@ -170,5 +214,107 @@ PAGINATE_ANSWERS = 5
 # technical email address to send notifications
 TECH_EMAIL = "hasker@localhost"
 
+# notifications are queued in the database and sent by
+# `manage.py send_notifications`, this many per SMTP round
+NOTIFICATION_BATCH_SIZE = 100
+
+# failed notifications are retried after this many seconds,
+# the delay doubles after every failed attempt
+NOTIFICATION_RETRY_DELAY = 60
+
+# notifications are given up after this many failed attempts
+NOTIFICATION_MAX_ATTEMPTS = 5
+
+# number of suggestions of the tag autocomplete
+TAG_AUTOCOMPLETE_LIMIT = 10
+
+# seconds browsers may reuse tag suggestions
+TAG_AUTOCOMPLETE_MAX_AGE = 60
+
+# number of the most used tags in the tag cloud of the tag directory
+TAG_CLOUD_SIZE = 30
+
+# number of rows on one page of the JSON API, ?limit= can ask for up to API_MAX_PAGE_SIZE
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 1000
+
+# rows the JSON API fetches from a server-side cursor and writes to the response at once
+API_CHUNK_SIZE = 200
+
+# questions `manage.py export_qa` and the admin export fetch from a server-side cursor at once
+EXPORT_CHUNK_SIZE = 500
+
+# questions search backend:
+# "qa.search.postgres.PostgresSearchBackend" - PostgreSQL full-text search
+# "qa.search.memory.InvertedIndexBackend" - in-process inverted index
+SEARCH_BACKEND = "qa.search.postgres.PostgresSearchBackend"
+
+# PostgreSQL text search configuration used by the postgres backend
+SEARCH_CONFIG = "english"
+
+# snapshot of the in-process index, written by `manage.py build_search_index`
+SEARCH_INDEX_PATH = BASE_DIR / ".search_index"
+
+# number of changed questions the in-process index reindexes at once
+SEARCH_INDEX_BATCH = 100
+
+# maximum number of ranked results of the in-process index
+SEARCH_MAX_RESULTS = 1000
+
+# seconds page visits are counted in memory before they are written
+VISITS_FLUSH_INTERVAL = 60
+
+# seconds question views are counted in memory before they are written
+VIEWS_FLUSH_INTERVAL = 60
+
+# seconds repeated views of a question by the same visitor are not counted
+VIEWS_DEDUP_WINDOW = 30 * 60
+
+# seconds rendered question cards and answer blocks are kept in the cache
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# seconds whole pages for anonymous readers are kept in the cache
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
 # number of trending questions showing on the sidebar
 TRENDING_COUNT = 10
+
+# hotness = (score + weight * answers + 1) / (age in hours + 2) ** gravity
+TRENDING_GRAVITY = 1.5
+TRENDING_ANSWER_WEIGHT = 2
+
+# only questions created within this number of days can be trending
+TRENDING_WINDOW_DAYS = 30
+
+# seconds before the cached ranking is rebuilt on read,
+# `manage.py refresh_trending` run by cron keeps it warm
+TRENDING_CACHE_TIMEOUT = 15 * 60
+
+# seconds a client reads from the primary after it wrote, and a page changed
+# this recently is not cached from a replica: longer than the replication lag
+REPLICA_PIN_SECONDS = 5
+
+# question lists, question pages, answers and votes are served by the
+# async views of qa.async_views; turned on by hasker/asgi.py
+ASYNC_VIEWS = os.environ.get("HASKER_ASYNC_VIEWS") == "1"
+
+# requests of one server process inside the async views at a time, each
+# holds a database connection: keep workers * this below max_connections
+ASYNC_VIEWS_CONCURRENCY = 32
+
+# live events of qa.live: "postgres" sends them to every server process
+# with NOTIFY, "memory" to the streams of the publishing process only
+LIVE_BACKEND = "memory" if TESTING else "postgres"
+
+# events queued for one stream; a client falling further behind gets one
+# reset event instead and reloads the page state
+LIVE_QUEUE_SIZE = 64
+
+# seconds between keep-alive comments of an idle stream
+LIVE_HEARTBEAT = 15
+
+# streams of one server process, more are answered with 503
+LIVE_MAX_CLIENTS = 10000
+
+# seconds before the LISTEN connection is opened again after a failure
+LIVE_RECONNECT_DELAY = 1
@@ -0,0 +1,24 @@
+""" Settings of the servers started by `manage.py benchmark_servers`: no debug, no toolbar """
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, INSTALLED_APPS, MIDDLEWARE
+
+DEBUG = False
+
+ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "debug_toolbar"]
+MIDDLEWARE = [name for name in MIDDLEWARE if not name.startswith("debug_toolbar.")]
+
+# the seeded benchmark database, never the development one
+DATABASES["default"]["NAME"] = os.environ["HASKER_DATABASE_NAME"]
+
+# shared by the worker processes, emptied before every server starts
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("HASKER_CACHE_DIR", BASE_DIR / ".cache-benchmark"),
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    }
+}
@@ -25,6 +25,8 @@ from .settings import TESTING
 
 urlpatterns = [
     path("qa/", include("qa.urls")),
+    # read-only JSON API
+    path("api/v1/", include("qa.api.urls")),
     path("admin/", admin.site.urls),
     # Add URL maps to redirect the base URL to our application
     path('', RedirectView.as_view(url='qa/')),
@@ -34,7 +36,7 @@ urlpatterns = [
     path('users/', include('django.contrib.auth.urls')),
 ]
 
-if not TESTING:
+if not TESTING and "debug_toolbar" in settings.INSTALLED_APPS:
     urlpatterns = [
         *urlpatterns,
         path("__debug__/", include("debug_toolbar.urls")),
@@ -1,7 +1,12 @@
 """ Admin page for Q&A app """
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import path
+from django.utils import timezone
 
-from .models import Question, Tag, Answer
+from . import export
+from .models import Question, Tag, Answer, Notification, PageVisits
 
 
 admin.site.register(Tag)
@@ -22,3 +27,45 @@ class QuestionAdmin(admin.ModelAdmin):
     list_display = ["title", "created", "author", "was_created_recently", "display_tags"]
     list_filter = ["created", "author"]
     search_fields = ["text"]
+
+    def get_urls(self):
+        return [
+            path("export/", self.admin_site.admin_view(self.export_view), name="qa_question_export"),
+            *super().get_urls(),
+        ]
+
+    def export_view(self, request):
+        """
+        Streaming download of the corpus: ?format=ndjson|csv, ?gzip=1,
+        ?since=<ISO date or date and time> for an incremental export
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get("format", "ndjson")
+        compress = request.GET.get("gzip") == "1"
+        try:
+            since = export.parse_since(request.GET["since"]) if request.GET.get("since") else None
+            chunks, _ = export.export(fmt, since=since, compress=compress)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        response = StreamingHttpResponse(
+            chunks, content_type="application/gzip" if compress else export.FORMATS[fmt])
+        name = export.filename(fmt, compress, timezone.now())
+        response["Content-Disposition"] = f'attachment; filename="{name}"'
+        return response
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """ Outbox of emails, to watch delivery and failures """
+    list_display = ["recipient", "subject", "created", "attempts", "sent"]
+    list_filter = ["sent", "attempts"]
+    search_fields = ["recipient", "subject"]
+    readonly_fields = ["created", "attempts", "last_error", "sent"]
+
+
+@admin.register(PageVisits)
+class PageVisitsAdmin(admin.ModelAdmin):
+    """ Daily visits of the questions lists """
+    list_display = ["page", "day", "visits"]
+    list_filter = ["page", "day"]
@@ -0,0 +1,3 @@
+"""
+Read-only JSON API of questions, answers and tags, mounted at /api/v1/
+"""
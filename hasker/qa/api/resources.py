@@ -0,0 +1,141 @@
+""" Fields of the API resources, read with values() and serialized row by row """
+import json
+from typing import Callable, NamedTuple
+from urllib.parse import quote
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, OuterRef, Q, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import get_script_prefix, reverse
+from django.utils.http import RFC3986_SUBDELIMS
+
+from qa import tags
+from qa.models import Answer
+
+# prefix of the values() keys of the fields, so that a field can be named as a model field
+ALIAS = "api_{name}"
+
+
+class Field(NamedTuple):
+    """ A field of a resource: database expression and conversion of its value """
+    expression: object
+    convert: Callable = None
+
+
+class Resource:
+    """
+    A model exposed by the API. Clients select fields with ?fields=a,b;
+    only their columns are read, as plain values() rows, never as
+    model instances.
+    """
+
+    def __init__(self, fields: dict, default: tuple):
+        """
+        :param fields: name -> Field, a string expression is a field path
+        :param default: names of the fields returned without ?fields=
+        """
+        self.fields = fields
+        self.default = default
+
+    def select(self, requested: str) -> tuple:
+        """ Field names of a ?fields= value, ValueError for unknown names """
+        if not requested:
+            return self.default
+        names = tuple(dict.fromkeys(name.strip() for name in requested.split(",") if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return names or self.default
+
+    def values(self, queryset: QuerySet, names: tuple, extra: tuple = ()) -> QuerySet:
+        """
+        Rows with the selected fields
+        :param extra: plain columns needed besides the fields, e.g. the ordering
+        """
+        expressions = {}
+        for name in names:
+            expression = self.fields[name].expression
+            expressions[ALIAS.format(name=name)] = (
+                F(expression) if isinstance(expression, str) else expression)
+        return queryset.values(*extra, **expressions)
+
+    def serialize(self, row: dict, names: tuple) -> dict:
+        item = {}
+        for name in names:
+            value = row[ALIAS.format(name=name)]
+            convert = self.fields[name].convert
+            item[name] = convert(value) if convert else value
+        return item
+
+    def dumps(self, row: dict, names: tuple) -> str:
+        return json.dumps(self.serialize(row, names), cls=DjangoJSONEncoder)
+
+
+class Url:
+    """
+    Converts a value to the url of a view with one argument. reverse()
+    runs once per script prefix, not for every row.
+    """
+    # matches int and str path converters, never a part of an url pattern
+    PLACEHOLDER = "9876543210123456789"
+
+    def __init__(self, viewname: str):
+        self.viewname = viewname
+        self._parts = {}
+
+    def __call__(self, value) -> str:
+        prefix = get_script_prefix()
+        parts = self._parts.get(prefix)
+        if parts is None:
+            parts = self._parts[prefix] = reverse(
+                self.viewname, args=(self.PLACEHOLDER,)).split(self.PLACEHOLDER)
+        # quoted as reverse() quotes arguments
+        return quote(str(value), safe=RFC3986_SUBDELIMS + "/~:@").join(parts)
+
+
+_answers_count = Answer.objects.filter(
+    question=OuterRef("pk")
+).order_by().values("question").annotate(count=Count("pk")).values("count")
+
+QUESTION = Resource(
+    fields={
+        "id": Field("id"),
+        "title": Field("title"),
+        "text": Field("text"),
+        "score": Field("score"),
+        "views": Field("views"),
+        "answers": Field(Coalesce(Subquery(_answers_count), 0)),
+        "tags": Field(tags.question_tag_names()),
+        "author": Field("author__username"),
+        "created": Field("created"),
+        "correct_answer": Field("correct_answer_id"),
+        "url": Field("id", Url("qa:question_detail")),
+    },
+    default=("id", "title", "score", "views", "answers", "tags", "author", "created", "url"),
+)
+
+# the detail of one question includes its text
+QUESTION_DETAIL = Resource(QUESTION.fields, default=tuple(QUESTION.fields))
+
+ANSWER = Resource(
+    fields={
+        "id": Field("id"),
+        "question": Field("question_id"),
+        "text": Field("text"),
+        "score": Field("score"),
+        "author": Field("author__username"),
+        "created": Field("created"),
+        "is_correct": Field(ExpressionWrapper(
+            Q(question__correct_answer=F("pk")), output_field=BooleanField())),
+    },
+    default=("id", "question", "text", "score", "author", "created", "is_correct"),
+)
+
+TAG = Resource(
+    fields={
+        "name": Field("tag_text"),
+        "questions": Field("usage"),
+        "url": Field("tag_text", Url("qa:tag_detail")),
+    },
+    default=("name", "questions", "url"),
+)
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from . import views
+
+app_name = "api"
+urlpatterns = [
+    # ex: /api/v1/questions/?fields=id,title&tag=linux&sort=views&limit=100
+    path("questions/", views.QuestionListApi.as_view(), name="questions"),
+    # ex: /api/v1/questions/5/
+    path("questions/<int:pk>/", views.QuestionApi.as_view(), name="question"),
+    # ex: /api/v1/questions/5/answers/
+    path("questions/<int:pk>/answers/", views.AnswerListApi.as_view(), name="answers"),
+    # ex: /api/v1/tags/?q=li
+    path("tags/", views.TagListApi.as_view(), name="tags"),
+    # ex: /api/v1/search/?q=tag:linux kernel
+    path("search/", views.QuestionSearchApi.as_view(), name="search"),
+]
@@ -0,0 +1,251 @@
+""" Views of the read-only JSON API """
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.generic import View
+
+from qa import pagecache, search, tags
+from qa.models import Answer, Question, Tag
+from qa.pagination import CursorPaginator
+
+from . import resources
+
+
+class ApiError(Exception):
+    """ Request the API cannot answer, turned into a JSON error response """
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiView(View):
+    """
+    GET of one API resource. Validators are derived from the page cache
+    stamps of the data the response depends on (see qa.pagecache), so a
+    conditional request is answered with 304 before any query is made.
+    """
+    http_method_names = ["get", "head"]
+    resource = None
+
+    def scopes(self) -> list:
+        """ Page cache scopes of the data in the response """
+        raise NotImplementedError
+
+    def field_scopes(self) -> list:
+        # views are written without touching the question scopes
+        scopes = []
+        if "views" in self.names:
+            scopes.append(pagecache.VIEWS)
+        if "author" in self.names:
+            scopes.append(pagecache.PROFILES)
+        return scopes
+
+    def respond(self) -> HttpResponse:
+        raise NotImplementedError
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        try:
+            try:
+                self.names = self.resource.select(request.GET.get("fields", ""))
+            except ValueError as error:
+                raise ApiError(str(error)) from error
+            modified = pagecache.last_modified(self.scopes() + self.field_scopes())
+            etag = quote_etag(
+                hashlib.md5(f"{request.get_full_path()}:{modified!r}".encode()).hexdigest())
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=int(modified))
+            if not_modified is not None:
+                return not_modified
+            response = self.respond()
+        except ApiError as error:
+            return JsonResponse({"error": str(error)}, status=error.status)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(modified)
+        # clients keep responses but revalidate them on every use
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class ApiListView(ApiView):
+    """
+    Cursor-paginated list streamed row by row: rows are read with
+    QuerySet.iterator() and written in chunks of API_CHUNK_SIZE,
+    a page is never held in memory as a whole.
+    ?sort= picks one of `orderings`, ?limit= the page size,
+    ?cursor= continues from the `next` url of the previous page.
+    """
+    # ?sort= value -> keyset ordering, all descending, the last field is unique
+    orderings = {}
+    sort = ""
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_ordering(self) -> tuple:
+        sort = self.request.GET.get("sort", self.sort)
+        if sort not in self.orderings:
+            raise ApiError(f"Unknown sort: {sort}, one of {', '.join(self.orderings)}")
+        return self.orderings[sort]
+
+    def get_limit(self) -> int:
+        try:
+            limit = int(self.request.GET.get("limit", settings.API_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= settings.API_MAX_PAGE_SIZE:
+            raise ApiError(f"limit must be from 1 to {settings.API_MAX_PAGE_SIZE}")
+        return limit
+
+    def next_url(self, cursor: str) -> str:
+        params = self.request.GET.copy()
+        params["cursor"] = cursor
+        return f"{self.request.path}?{params.urlencode()}"
+
+    def respond(self) -> HttpResponse:
+        ordering = self.get_ordering()
+        limit = self.get_limit()
+        paginator = CursorPaginator(self.get_queryset(), ordering, limit)
+        rows = self.resource.values(
+            paginator.forward(self.request.GET.get("cursor")), self.names, extra=ordering
+        )[:limit + 1].iterator(chunk_size=settings.API_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            self.stream(rows, paginator, limit), content_type="application/json")
+
+    def stream(self, rows, paginator: CursorPaginator, limit: int):
+        yield b'{"results": ['
+        chunk, count, last, has_next = [], 0, None, False
+        for row in rows:
+            # the row after the page only tells that there is a next page
+            if count == limit:
+                has_next = True
+                continue
+            chunk.append(self.resource.dumps(row, self.names))
+            count += 1
+            last = row
+            if len(chunk) == settings.API_CHUNK_SIZE:
+                yield self._join(chunk, first=count == len(chunk))
+                chunk = []
+        if chunk:
+            yield self._join(chunk, first=count == len(chunk))
+        next_url = self.next_url(paginator.next_cursor(last)) if has_next else None
+        yield f'], "next": {json.dumps(next_url)}}}'.encode()
+
+    @staticmethod
+    def _join(chunk: list, first: bool) -> bytes:
+        return (("" if first else ",") + ",".join(chunk)).encode()
+
+
+def _tagged(questions, included: list, excluded: list):
+    """ Questions filtered by tag names, ApiError for unknown included tags """
+    if not included and not excluded:
+        return questions
+    included, excluded, unknown = tags.resolve(included, excluded)
+    if unknown:
+        raise ApiError(f"Unknown tags: {', '.join(unknown)}", status=404)
+    return tags.tagged(questions, included, excluded)
+
+
+class QuestionListApi(ApiListView):
+    """ /api/v1/questions/?tag=python&exclude=windows&sort=views """
+    resource = resources.QUESTION
+    orderings = {
+        "score": ("score", "created", "id"),
+        "views": ("views", "created", "id"),
+        "created": ("created", "id"),
+    }
+    sort = "score"
+
+    def scopes(self):
+        scopes = [pagecache.SITE]
+        if self.request.GET.get("sort") == "views":
+            scopes.append(pagecache.VIEWS)
+        return scopes
+
+    def get_queryset(self):
+        return _tagged(
+            Question.objects.all(), self.request.GET.getlist("tag"), self.request.GET.getlist("exclude"))
+
+
+class QuestionSearchApi(QuestionListApi):
+    """ /api/v1/search/?q=tag:linux kernel panic, ordered by relevance """
+    sort = "relevance"
+
+    def get(self, request, *args, **kwargs):
+        self.query = search.parse_query(request.GET.get("q", ""))
+        if not (self.query.tags or self.query.excluded_tags or self.query.text):
+            return JsonResponse({"error": "Empty search phrase"}, status=400)
+        self.orderings = {
+            **self.orderings,
+            "relevance": ("rank", "score", "created", "id") if self.query.text else ("score", "created", "id"),
+        }
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        try:
+            questions = _tagged(Question.objects.all(), self.query.tags, self.query.excluded_tags)
+        except ApiError:
+            # like the search page, unknown tags find nothing
+            return Question.objects.none()
+        if self.query.text:
+            questions = search.search(questions, self.query.text)
+        return questions
+
+
+class QuestionApi(ApiView):
+    """ /api/v1/questions/5/ """
+    resource = resources.QUESTION_DETAIL
+
+    def scopes(self):
+        return [pagecache.question_scope(self.kwargs["pk"])]
+
+    def respond(self):
+        question = self.resource.values(
+            Question.objects.filter(pk=self.kwargs["pk"]), self.names).first()
+        if question is None:
+            raise ApiError("Question not found", status=404)
+        return JsonResponse(self.resource.serialize(question, self.names))
+
+
+class AnswerListApi(ApiListView):
+    """ /api/v1/questions/5/answers/ """
+    resource = resources.ANSWER
+    orderings = {
+        "score": ("score", "created", "id"),
+        "created": ("created", "id"),
+    }
+    sort = "score"
+
+    def scopes(self):
+        return [pagecache.question_scope(self.kwargs["pk"])]
+
+    def get_queryset(self):
+        question = Question.objects.filter(pk=self.kwargs["pk"]).values_list("pk", flat=True).first()
+        if question is None:
+            raise ApiError("Question not found", status=404)
+        return Answer.objects.filter(question=question)
+
+
+class TagListApi(ApiListView):
+    """ /api/v1/tags/?q=py, the most used tags first """
+    resource = resources.TAG
+    orderings = {
+        "popular": ("usage", "id"),
+    }
+    sort = "popular"
+
+    def scopes(self):
+        return [pagecache.TAGS]
+
+    def field_scopes(self):
+        return []
+
+    def get_queryset(self):
+        prefix = self.request.GET.get("q", "").strip().lower()
+        if prefix:
+            return tags.by_lower_name().filter(name_lower__startswith=prefix)
+        return Tag.objects.all()
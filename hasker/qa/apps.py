@@ -6,6 +6,9 @@ class QaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'qa'
 
+    def ready(self):
+        import qa.signals  # noqa
+
 
 # class QaAdminConfig(AdminConfig):
 #     default_site = "qa.admin.QaAdminSite"
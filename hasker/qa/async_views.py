@@ -0,0 +1,227 @@
+"""
+Async views of the question list, the question page, answers and votes,
+served under ASGI (settings.ASYNC_VIEWS, see hasker/asgi.py). Queries use
+the async ORM API; votes, answers and templates are synchronous code and
+run in the worker thread of the request.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.views.generic import View
+
+from . import counters, fragments, pagecache, routers, tags, views
+from .forms import AnswerForm
+from .models import Answer, Question
+from .pagination import CursorPaginator
+
+# every request in a view holds a thread and a database connection, the
+# others wait on the event loop instead of exhausting the connections
+_slots = asyncio.Semaphore(settings.ASYNC_VIEWS_CONCURRENCY)
+
+
+class AsyncPageView(routers.ReplicaReadsMixin, pagecache.AnonymousPageCacheMixin, View):
+    """ Pages of the site: the user is loaded before the page cache looks at it """
+
+    async def count(self, request, response) -> None:
+        """ Count the request, cached pages are counted too """
+
+    def dispatch(self, request, *args, **kwargs):
+        dispatch = super().dispatch
+
+        async def respond():
+            async with _slots:
+                # the session and the user are read in one thread hop, the
+                # lazy request.user would query from the event loop
+                request.user = await request.auser()
+                response = await dispatch(request, *args, **kwargs)
+                await self.count(request, response)
+                return response
+
+        return respond()
+
+
+class QuestionListView(AsyncPageView):
+    """ Latest questions and questions of tags, search results are served by views.QuestionListView """
+    http_method_names = ["get", "head"]
+    template_name = "qa/question_list.html"
+    sort_orderings = views.QuestionListView.sort_orderings
+    sort = "score"
+    tag_text = ""
+    included_tags = []
+    excluded_tags = []
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        if request.GET.get("sort") in self.sort_orderings:
+            self.sort = request.GET["sort"]
+        self.tag_text = kwargs.get("tag_text", "")
+        if self.tag_text:
+            # ex: /qa/tag/python/?tag=django&exclude=windows
+            self.included_tags = [self.tag_text, *request.GET.getlist("tag")]
+            self.excluded_tags = request.GET.getlist("exclude")
+
+    async def count(self, request, response) -> None:
+        await counters.visits.aadd("tag_detail" if self.tag_text else "index")
+
+    def page_cache_scopes(self):
+        # cards show view counts
+        return [*super().page_cache_scopes(), pagecache.VIEWS]
+
+    @property
+    def title(self) -> str:
+        if not self.tag_text:
+            return "Latest questions list"
+        title = f"Tags: {' + '.join(self.included_tags)}"
+        if self.excluded_tags:
+            title += f", without {', '.join(self.excluded_tags)}"
+        return title
+
+    async def get(self, request, *args, **kwargs):
+        questions = Question.objects.all()
+        if self.tag_text:
+            included, excluded, unknown = await tags.aresolve(self.included_tags, self.excluded_tags)
+            if unknown:
+                raise Http404(f"Unknown tags: {', '.join(unknown)}")
+            questions = tags.tagged(questions, included, excluded)
+
+        paginator = CursorPaginator(
+            views.question_cards(questions), self.sort_orderings[self.sort], settings.PAGINATE_QUESTIONS)
+        page = await paginator.apage(request.GET.get("cursor"))
+        fragments.prepare_question_cards(page.object_list, request)
+        return TemplateResponse(request, self.template_name, {
+            "view": self,
+            "paginator": paginator,
+            "page_obj": page,
+            "is_paginated": page.has_other_pages(),
+            "object_list": page.object_list,
+            "questions": page.object_list,
+            "title": self.title,
+            "tag": self.tag_text,
+            "included_tags": self.included_tags,
+            "excluded_tags": self.excluded_tags,
+            "search_phrase": "",
+            "sort": self.sort,
+        })
+
+
+class QuestionDetailView(AsyncPageView):
+    """ Question with a page of its answers, answers are posted here """
+    http_method_names = ["get", "head", "post"]
+    template_name = "qa/question_detail.html"
+    answers_paginate_by = settings.PAGINATE_ANSWERS
+
+    def page_cache_scopes(self):
+        return [pagecache.question_scope(self.kwargs["pk"]), pagecache.SIDEBAR, pagecache.PROFILES]
+
+    async def count(self, request, response) -> None:
+        # missing questions are not counted
+        if request.method == "GET" and response.status_code in (200, 304):
+            await counters.views.aadd_view(self.kwargs["pk"], counters.visitor(request))
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            question = await views.question_details().aget(pk=kwargs["pk"])
+        except Question.DoesNotExist:
+            raise Http404("No question found matching the query")
+
+        answers_page_obj = await views.answers_paginator(
+            question, self.answers_paginate_by).apage(request.GET.get("cursor"))
+        fragments.prepare_answer_blocks(answers_page_obj.object_list, question, request)
+        return TemplateResponse(request, self.template_name, {
+            "view": self,
+            "object": question,
+            "question": question,
+            "form": AnswerForm(),
+            "answers_page_obj": answers_page_obj,
+            "answers": answers_page_obj.object_list,
+        })
+
+    async def post(self, request, *args, **kwargs):
+        """ Used for posting answer to the question """
+        question = await aget_object_or_404(Question, pk=kwargs["pk"])
+        if not request.user.is_authenticated:
+            return await self.get(request, *args, **kwargs)
+
+        # the POST body is parsed by the CSRF middleware already
+        form = AnswerForm(request.POST)
+        if form.is_valid():
+            await sync_to_async(views.post_answer)(question, request.user, form.cleaned_data["text"])
+        return HttpResponseRedirect(reverse("qa:question_detail", args=(question.id,)))
+
+
+class BaseVoteView(View):
+    """ Vote for a question or an answer and go back """
+    http_method_names = ["get"]
+    model = None
+    pk_url_kwarg = None
+
+    async def get_redirect_url(self, request, vote_object) -> str:
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        async with _slots:
+            user = await request.auser()
+            if not user.is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            vote_object = await aget_object_or_404(self.model, id=int(kwargs[self.pk_url_kwarg]))
+            # one atomic statement with signals, see models.do_vote
+            await sync_to_async(vote_object.do_vote)(user=user, current_vote=int(kwargs["vote"]))
+            return HttpResponseRedirect(await self.get_redirect_url(request, vote_object))
+
+
+class QuestionVoteView(BaseVoteView):
+
+    model = Question
+    pk_url_kwarg = "question_id"
+
+    async def get_redirect_url(self, request, vote_object) -> str:
+        # redirect to parameter next if exists
+        return request.GET.get("next", reverse("qa:index"))
+
+
+class AnswerVoteView(BaseVoteView):
+
+    model = Answer
+    pk_url_kwarg = "answer_id"
+
+    async def get_redirect_url(self, request, vote_object) -> str:
+        return reverse("qa:question_detail", args=(vote_object.question_id,))
+
+
+class BaseVoteApiView(View):
+    """ Vote with POST and get the new score as JSON, see views.BaseVoteApiView """
+    http_method_names = ["post"]
+    model = None
+    pk_url_kwarg = None
+
+    async def post(self, request, *args, **kwargs):
+        async with _slots:
+            request.user = await request.auser()
+            vote = views.posted_vote(request)
+            error = views.vote_error(request, vote)
+            if error:
+                return error
+            try:
+                vote_object = await self.model.objects.aget(id=kwargs[self.pk_url_kwarg])
+            except self.model.DoesNotExist:
+                return JsonResponse({"error": "Not found"}, status=404)
+            result = await sync_to_async(vote_object.do_vote)(user=request.user, current_vote=vote)
+            return views.vote_result(result)
+
+
+class QuestionVoteApiView(BaseVoteApiView):
+
+    model = Question
+    pk_url_kwarg = "question_id"
+
+
+class AnswerVoteApiView(BaseVoteApiView):
+
+    model = Answer
+    pk_url_kwarg = "answer_id"
@@ -0,0 +1,200 @@
+""" Latency and query count benchmarks of the Q&A request paths """
+import datetime
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import pagecache, search
+from .models import Question, Tag
+from .seed import Seeder
+
+# name -> number of questions
+DATASETS = {
+    "1k": 1_000,
+    "100k": 100_000,
+}
+
+BENCHMARK_USERNAME = "benchmark_user"
+
+# pages of the anonymous page cache: measured rendered, with the cache
+# invalidated before every request, and as cache hits under "<name>_cached"
+CACHED_PAGES = ("index", "tag_detail", "question_detail")
+
+
+def percentile(samples: list, percent: float) -> float:
+    """ Nearest-rank percentile of the samples """
+    ordered = sorted(samples)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def git_revision() -> str:
+    """ Current commit, to tell result files apart """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def seed_dataset(questions: int, seed: int = 0) -> dict:
+    """ Fill the database with a synthetic dataset and index it for search """
+    counts = Seeder(questions, seed=seed).run()
+    search.get_backend().rebuild()
+    return dict(counts)
+
+
+class Benchmark:
+    """
+    Requests every path `iterations` times with the test client, measuring
+    wall time and number of queries of each request
+    """
+
+    def __init__(self, iterations: int = 20, warmup: int = 2):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.anonymous = Client()
+        self.client = Client()
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        self.client.force_login(user)
+
+        # the most popular tag and the most answered question
+        self.tag = Tag.objects.annotate(
+            num_questions=Count("questions")
+        ).order_by("-num_questions").first()
+        self.question = Question.objects.annotate(
+            num_answers=Count("answer")
+        ).order_by("-num_answers", "id").first()
+        # a word of the most popular tag is a frequent search term
+        self.search_phrase = self.tag.tag_text.rstrip("0123456789") if self.tag else "kernel"
+
+    def paths(self) -> dict:
+        """ name -> callable doing one request """
+        question_url = reverse("qa:question_detail", args=(self.question.id,))
+        vote_url = reverse("qa:question_vote", args=(self.question.id, "+1"))
+        paths = {
+            "index": lambda: self.anonymous.get(reverse("qa:index")),
+            "tag_detail": lambda: self.anonymous.get(
+                reverse("qa:tag_detail", args=(self.tag.tag_text,))),
+            "search": lambda: self.anonymous.get(
+                reverse("qa:search_results"), {"q": self.search_phrase}),
+            "question_detail": lambda: self.anonymous.get(question_url),
+            "vote": lambda: self.client.get(vote_url, {"next": question_url}),
+            "answer_post": lambda: self.client.post(question_url, {"text": "Benchmark answer"}),
+            # the largest page of the JSON API, read to the end
+            "api_questions": lambda: self.read(self.anonymous.get(
+                reverse("api:questions"), {"limit": settings.API_MAX_PAGE_SIZE})),
+        }
+        paths.update({f"{name}_cached": paths[name] for name in CACHED_PAGES})
+        return paths
+
+    def invalidate_pages(self) -> None:
+        """ The next requests of the cached pages render them """
+        pagecache.touch(
+            pagecache.SITE, pagecache.SIDEBAR, pagecache.PROFILES, pagecache.VIEWS, pagecache.TAGS,
+            pagecache.question_scope(self.question.id),
+        )
+
+    @staticmethod
+    def read(response):
+        """ Consume a streamed response, the rows are serialized while it is read """
+        if response.streaming:
+            response.content_bytes = b"".join(response.streaming_content)
+        return response
+
+    def api_rows(self) -> int:
+        response = self.read(self.anonymous.get(
+            reverse("api:questions"), {"limit": settings.API_MAX_PAGE_SIZE}))
+        return len(json.loads(response.content_bytes)["results"])
+
+    def measure(self, request, prepare=None) -> dict:
+        """ Timings and queries of `request`, `prepare` is called untimed before each one """
+        for _ in range(self.warmup):
+            if prepare:
+                prepare()
+            request()
+        timings, queries = [], []
+        for _ in range(self.iterations):
+            if prepare:
+                prepare()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.status_code} response: {response.content[:200]!r}")
+            queries.append(len(captured))
+        return {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "queries": max(queries),
+        }
+
+    def run(self, only: list = None) -> dict:
+        """ Results of all (or `only` the given) paths """
+        # the debug toolbar would be measured too
+        with override_settings(DEBUG=False):
+            results = {
+                name: self.measure(request, self.invalidate_pages if name in CACHED_PAGES else None)
+                for name, request in self.paths().items()
+                if not only or name in only
+            }
+            if "api_questions" in results:
+                # serialization throughput of the streamed API
+                result = results["api_questions"]
+                result["rows"] = self.api_rows()
+                result["rows_per_s"] = round(result["rows"] / result["p50_ms"] * 1000)
+            return results
+
+
+def report(results: dict, dataset: str, iterations: int, rows: dict) -> dict:
+    """ Machine-readable result document """
+    return {
+        "revision": git_revision(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "dataset": dataset,
+        "iterations": iterations,
+        "rows": rows,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """ Lines describing p50/p95 and query count changes against a baseline """
+    lines = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            lines.append(f"{name}: new")
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms"):
+            delta = result[metric] - before[metric]
+            ratio = delta / before[metric] * 100 if before[metric] else 0
+            changes.append(f"{metric} {before[metric]:.1f} -> {result[metric]:.1f} ({ratio:+.0f}%)")
+        changes.append(f"queries {before['queries']} -> {result['queries']}")
+        lines.append(f"{name}: " + ", ".join(changes))
+    return lines
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save(document: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=2)
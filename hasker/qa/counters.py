@@ -0,0 +1,176 @@
+""" Counters buffered in memory and written to the database in batches """
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import pagecache
+from .models import PageVisits, Question
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCounter:
+    """
+    Increments are added up in memory by every worker process and written
+    with one statement per flush: read-only requests do no database writes.
+    A flush happens on the first increment after `flush_interval` seconds
+    and when the process exits; increments of a killed process are lost.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def _increment(self, key, amount: int) -> bool:
+        """ Add in memory, True when a flush is due """
+        with self._lock:
+            self._counts[key] += amount
+            return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def add(self, key, amount: int = 1) -> None:
+        if self._increment(key, amount):
+            self.flush()
+
+    async def aadd(self, key, amount: int = 1) -> None:
+        """ add() for async views, a due flush is written in a worker thread """
+        if self._increment(key, amount):
+            await sync_to_async(self.flush)()
+
+    def pending(self) -> Counter:
+        """ Increments not written yet """
+        with self._lock:
+            return self._counts.copy()
+
+    def clear(self) -> None:
+        """ Drop the increments not written yet """
+        with self._lock:
+            self._counts.clear()
+
+    def flush(self) -> int:
+        """ Write the buffered increments, return the number of written keys """
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._last_flush = time.monotonic()
+        if not counts:
+            return 0
+        try:
+            with transaction.atomic():
+                self.write(counts)
+        except Exception:  # pylint: disable=broad-except
+            # kept for the next flush, counting never breaks a request
+            logger.exception("Flush of %s failed", type(self).__name__)
+            with self._lock:
+                self._counts.update(counts)
+            return 0
+        return len(counts)
+
+    def write(self, counts: Counter) -> None:
+        raise NotImplementedError
+
+
+class VisitCounter(BufferedCounter):
+    """ Daily visits of pages, keyed by url name """
+
+    def _increment(self, key, amount: int) -> bool:
+        return super()._increment((key, timezone.localdate()), amount)
+
+    def write(self, counts: Counter) -> None:
+        table = connection.ops.quote_name(PageVisits._meta.db_table)
+        # the same order in every worker, concurrent flushes do not deadlock
+        rows = sorted(counts.items())
+        values = ", ".join(["(%s, %s, %s)"] * len(rows))
+        params = [value for (page, day), visits in rows for value in (page, day, visits)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (page, day, visits) VALUES {values} "
+                f"ON CONFLICT (page, day) DO UPDATE SET visits = {table}.visits + EXCLUDED.visits",
+                params,
+            )
+
+
+class ViewCounter(BufferedCounter):
+    """
+    Views of question pages. A visitor (session or IP address) is counted
+    once per question within `dedup_window` seconds. All increments are
+    added with one UPDATE ... FROM (VALUES ...), so the hottest questions
+    are not locked by every page view.
+    """
+
+    def __init__(self, flush_interval: float, dedup_window: float):
+        super().__init__(flush_interval)
+        self.dedup_window = dedup_window
+        self._seen = {}     # (question id, visitor) -> time the view is counted again
+
+    def _first_view(self, question_id: int, visitor: str) -> bool:
+        now = time.monotonic()
+        key = (question_id, visitor)
+        with self._lock:
+            if self._seen.get(key, 0) > now:
+                return False
+            self._seen[key] = now + self.dedup_window
+        return True
+
+    def add_view(self, question_id: int, visitor: str) -> bool:
+        """ Count a view unless the visitor has viewed the question recently """
+        if not self._first_view(question_id, visitor):
+            return False
+        self.add(question_id)
+        return True
+
+    async def aadd_view(self, question_id: int, visitor: str) -> bool:
+        """ add_view() for async views """
+        if not self._first_view(question_id, visitor):
+            return False
+        await self.aadd(question_id)
+        return True
+
+    def flush(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._seen = {key: until for key, until in self._seen.items() if until > now}
+        return super().flush()
+
+    def clear(self) -> None:
+        super().clear()
+        with self._lock:
+            self._seen.clear()
+
+    def write(self, counts: Counter) -> None:
+        table = connection.ops.quote_name(Question._meta.db_table)
+        # ordered by id, concurrent flushes lock the rows in the same order
+        rows = sorted(counts.items())
+        values = ", ".join(["(%s::bigint, %s::bigint)"] * len(rows))
+        params = [value for row in rows for value in row]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} q SET views = q.views + v.views "
+                f"FROM (VALUES {values}) AS v (id, views) WHERE q.id = v.id",
+                params,
+            )
+        # question lists and the pages of the viewed questions show the counts
+        scopes = (pagecache.VIEWS, *(pagecache.question_scope(pk) for pk, _ in rows))
+        transaction.on_commit(lambda: pagecache.touch(*scopes))
+
+
+def visitor(request) -> str:
+    """ Session of the visitor or, for anonymous readers without one, the IP address """
+    if request.session.session_key:
+        return f"session:{request.session.session_key}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+visits = VisitCounter(flush_interval=settings.VISITS_FLUSH_INTERVAL)
+views = ViewCounter(
+    flush_interval=settings.VIEWS_FLUSH_INTERVAL,
+    dedup_window=settings.VIEWS_DEDUP_WINDOW,
+)
@@ -0,0 +1,199 @@
+""" Streaming export of questions with their answers, tags and scores to NDJSON or CSV """
+import csv
+import datetime
+import json
+import logging
+import time
+import zlib
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, OuterRef, Q, QuerySet
+from django.db.models.functions import JSONObject
+from django.utils import dateparse, timezone
+
+from . import tags
+from .models import Answer, Question
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_HEADER = [
+    "record", "id", "question_id", "title", "text", "author", "created",
+    "score", "views", "tags", "is_correct",
+]
+
+# encoded output is written (and compressed) in blocks of about this size
+BLOCK_SIZE = 64 * 1024
+
+
+class ExportStats:
+    """ Progress of one export, complete when its stream is exhausted """
+
+    def __init__(self):
+        self.questions = 0
+        self.answers = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def rows(self) -> int:
+        return self.questions + self.answers
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.questions} questions, {self.answers} answers, {self.bytes} bytes "
+            f"in {self.seconds:.2f} s ({self.rows_per_s:.0f} rows/s)"
+        )
+
+
+def questions(since: Optional[datetime.datetime] = None) -> QuerySet:
+    """
+    Rows of questions in id order, answers and tag names are arrays of the
+    question row: the whole corpus is one query read by a server-side cursor
+    :param since: only questions asked or answered at or after this moment
+    """
+    answers = Answer.objects.filter(question=OuterRef("pk")).order_by("id").values(
+        json=JSONObject(
+            id="id", text="text", author=F("author__username"), created="created", score="score"))
+    queryset = Question.objects.all()
+    if since is not None:
+        queryset = queryset.filter(
+            Q(created__gte=since)
+            | Q(pk__in=Answer.objects.filter(created__gte=since).values("question")))
+    return queryset.order_by("id").values(
+        "id", "title", "text", "created", "score", "views", "correct_answer_id",
+        author_name=F("author__username"),
+        tag_names=tags.question_tag_names(),
+        answer_list=ArraySubquery(answers),
+    )
+
+
+def records(since: Optional[datetime.datetime] = None, chunk_size: int = None) -> Iterator[dict]:
+    """ Questions with their answers, fetched `chunk_size` rows at a time """
+    rows = questions(since).iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+    for row in rows:
+        yield {
+            "id": row["id"],
+            "title": row["title"],
+            "text": row["text"],
+            "author": row["author_name"],
+            "created": row["created"],
+            "score": row["score"],
+            "views": row["views"],
+            "tags": row["tag_names"],
+            "correct_answer": row["correct_answer_id"],
+            "answers": row["answer_list"],
+        }
+
+
+def ndjson_lines(rows: Iterator[dict], stats: ExportStats) -> Iterator[str]:
+    """ One JSON document per question """
+    for row in rows:
+        stats.questions += 1
+        stats.answers += len(row["answers"])
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+class _Echo:
+    """ File-like object returning what is written, for csv.writer """
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows: Iterator[dict], stats: ExportStats) -> Iterator[str]:
+    """ A line per question followed by lines of its answers """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        stats.questions += 1
+        yield writer.writerow([
+            "question", row["id"], "", row["title"], row["text"], row["author"],
+            row["created"].isoformat(), row["score"], row["views"], ";".join(row["tags"]), "",
+        ])
+        for answer in row["answers"]:
+            stats.answers += 1
+            yield writer.writerow([
+                "answer", answer["id"], row["id"], "", answer["text"], answer["author"],
+                answer["created"], answer["score"], "", "", int(answer["id"] == row["correct_answer"]),
+            ])
+
+
+def encode(lines: Iterator[str], stats: ExportStats, compress: bool = False) -> Iterator[bytes]:
+    """ UTF-8 blocks of about BLOCK_SIZE bytes, gzip-compressed when `compress` """
+    # wbits=31: gzip header and trailer
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    block, size = [], 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        size += len(data)
+        if size >= BLOCK_SIZE:
+            data = b"".join(block)
+            block, size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                stats.bytes += len(data)
+                yield data
+    data = b"".join(block)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        stats.bytes += len(data)
+        yield data
+
+
+def export(fmt: str = "ndjson", since: Optional[datetime.datetime] = None,
+           compress: bool = False, chunk_size: int = None) -> tuple:
+    """
+    Export the corpus in constant memory
+    :param fmt: one of FORMATS
+    :param since: incremental export of questions asked or answered since this moment
+    :param compress: gzip the output
+    :return: iterator of bytes and its ExportStats, filled while the iterator is consumed
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    stats = ExportStats()
+    lines = (ndjson_lines if fmt == "ndjson" else csv_lines)(records(since, chunk_size), stats)
+
+    def stream():
+        yield from encode(lines, stats, compress)
+        stats.finished = time.monotonic()
+        logger.info("Exported %s", stats)
+
+    return stream(), stats
+
+
+def parse_since(value: str) -> datetime.datetime:
+    """ Moment of an ISO date or date and time, naive ones are in the current time zone """
+    moment = dateparse.parse_datetime(value)
+    if moment is None:
+        day = dateparse.parse_date(value)
+        if day is None:
+            raise ValueError(f"Not an ISO date or date and time: {value}")
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filename(fmt: str, compress: bool, now: datetime.datetime) -> str:
+    return f"hasker-qa-{now:%Y%m%d-%H%M%S}.{fmt}" + (".gz" if compress else "")
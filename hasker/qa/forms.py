@@ -1,6 +1,8 @@
 """ Forms for Q&A App """
-from django.forms import (ModelForm, CharField, ModelMultipleChoiceField, SelectMultiple, ValidationError)
+from django.forms import (ModelForm, CharField, Field, TextInput, ValidationError)
+from django.urls import reverse_lazy
 
+from . import tags as tag_lookup
 from .models import Question, Tag, Answer
 
 
@@ -21,13 +23,59 @@ class TagForm(ModelForm):
         fields = ("tag_text",)
 
 
+class TagNamesInput(TextInput):
+    """ Comma-separated tag names with suggestions from the autocomplete endpoint """
+
+    class Media:
+        js = ("qa/tag_autocomplete.js",)
+
+    def __init__(self, attrs=None):
+        super().__init__({
+            "class": "tag-autocomplete",
+            "autocomplete": "off",
+            "data-autocomplete-url": reverse_lazy("qa:tag_autocomplete"),
+            **(attrs or {}),
+        })
+
+    def format_value(self, value):
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(tag.tag_text if isinstance(tag, Tag) else str(tag) for tag in value)
+        return super().format_value(value)
+
+
+class TagNamesField(Field):
+    """
+    Tags entered by name: the page does not list all tags and
+    the entered ones are validated in one query
+    """
+    widget = TagNamesInput
+    default_error_messages = {
+        "unknown_tags": "Unknown tags: %(names)s",
+    }
+
+    def to_python(self, value):
+        if not value:
+            return []
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(name) for name in value)
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    def clean(self, value):
+        names = super().clean(value)
+        if not names:
+            return []
+        found, unknown = tag_lookup.find(names)
+        if unknown:
+            raise ValidationError(
+                self.error_messages["unknown_tags"],
+                code="unknown_tags",
+                params={"names": ", ".join(unknown)},
+            )
+        return found
+
+
 class QuestionForm(ModelForm):
-    tags = ModelMultipleChoiceField(
-        required=False,
-        to_field_name="tag_text",
-        queryset=Tag.objects.all(),
-        widget=SelectMultiple(attrs={'class': 'multiselect'})
-    )
+    tags = TagNamesField(required=False)
 
     class Meta:
         model = Question
@@ -0,0 +1,141 @@
+""" Versioned cache of rendered question cards and answer blocks """
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "qa:version:{kind}:{id}"
+FRAGMENT_KEY = "qa:fragment:{name}:{id}:{versions}:{variant}"
+STATS_KEY = "qa:fragment_stats:{name}:{outcome}"
+
+# fragments which hit/miss counters are kept for
+FRAGMENTS = ("question_card", "answer_block")
+
+
+def _new_version() -> int:
+    # never reused, so that a fragment stored for an evicted version
+    # cannot match a recreated one
+    return time.time_ns()
+
+
+def versions(objects: list) -> dict:
+    """
+    Current version counters of (kind, id) pairs, created when missing,
+    with one cache round trip when all of them exist
+    """
+    keys = {VERSION_KEY.format(kind=kind, id=pk): (kind, pk) for kind, pk in objects}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            # add() keeps a version created or bumped meanwhile by another process
+            cache.add(key, _new_version(), None)
+        found.update(cache.get_many(missing))
+        for key in missing:
+            # culled by a full cache meanwhile: a version nobody
+            # stored matches no fragment
+            found.setdefault(key, _new_version())
+    return {keys[key]: version for key, version in found.items()}
+
+
+def _bump(kind: str, ids) -> None:
+    for pk in set(ids):
+        key = VERSION_KEY.format(kind=kind, id=pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def bump(kind: str, *ids: int) -> None:
+    """
+    Invalidate fragments of the objects. Versions change after commit,
+    so that a fragment rendered from uncommitted data is never stored
+    under the new version.
+    """
+    transaction.on_commit(lambda: _bump(kind, ids))
+
+
+def _record(name: str, hits: int, misses: int) -> None:
+    for outcome, count in (("hits", hits), ("misses", misses)):
+        if count:
+            key = STATS_KEY.format(name=name, outcome=outcome)
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def stats() -> dict:
+    """ name -> hits, misses and hit ratio of every fragment since the last reset """
+    keys = [STATS_KEY.format(name=name, outcome=outcome)
+            for name in FRAGMENTS for outcome in ("hits", "misses")]
+    counters = cache.get_many(keys)
+    result = {}
+    for name in FRAGMENTS:
+        hits = counters.get(STATS_KEY.format(name=name, outcome="hits"), 0)
+        misses = counters.get(STATS_KEY.format(name=name, outcome="misses"), 0)
+        total = hits + misses
+        result[name] = {"hits": hits, "misses": misses, "ratio": hits / total if total else 0.0}
+    return result
+
+
+def reset_stats() -> None:
+    cache.delete_many([STATS_KEY.format(name=name, outcome=outcome)
+                       for name in FRAGMENTS for outcome in ("hits", "misses")])
+
+
+def prepare(name: str, objects: list, dependencies, variant) -> None:
+    """
+    Look up cached fragments of a page of objects in two cache round trips.
+    Sets `fragment_key` and, on a hit, `cached_fragment` on every object,
+    both used by the {% fragment %} template tag.
+    :param name: fragment name, one of FRAGMENTS
+    :param dependencies: object -> (kind, id) pairs which versions the fragment depends on
+    :param variant: object -> part of the key for everything else the fragment
+        shows, e.g. whether vote buttons are rendered for the current user
+    """
+    needed = {obj.pk: dependencies(obj) for obj in objects}
+    current = versions({pair for pairs in needed.values() for pair in pairs})
+    keys = {}
+    for obj in objects:
+        key_versions = ".".join(str(current[pair]) for pair in needed[obj.pk])
+        obj.fragment_key = FRAGMENT_KEY.format(
+            name=name, id=obj.pk, versions=key_versions, variant=variant(obj))
+        keys[obj.fragment_key] = obj
+    cached = cache.get_many(keys)
+    for key, html in cached.items():
+        keys[key].cached_fragment = html
+    _record(name, hits=len(cached), misses=len(keys) - len(cached))
+
+
+def store(key: str, html: str) -> None:
+    # versions make invalidation exact, the timeout only lets
+    # fragments of outdated versions expire
+    cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def prepare_question_cards(questions: list, request) -> None:
+    """ Cards depend on the question (votes, edits, answers, tags) and its author (avatar) """
+    # vote buttons are shown to users and link back to the current page
+    variant = f"{int(request.user.is_authenticated)}:{request.path}"
+    prepare(
+        "question_card", questions,
+        lambda question: (("question", question.pk), ("user", question.author_id)),
+        # views are written in batches without signals, the loaded count is in the key
+        lambda question: f"{variant}:{question.views}",
+    )
+
+
+def prepare_answer_blocks(answers: list, question, request) -> None:
+    """ Answer blocks depend on the answer (votes, edits) and its author (avatar) """
+    user = request.user
+    is_owner = user.is_authenticated and user.id == question.author_id
+    # buttons depend on the user and on the correct answer of the question
+    prepare(
+        "answer_block", answers,
+        lambda answer: (("answer", answer.pk), ("user", answer.author_id)),
+        lambda answer: (
+            f"{int(user.is_authenticated)}{int(is_owner)}"
+            f"{int(answer.id == question.correct_answer_id)}"
+        ),
+    )
@@ -0,0 +1,241 @@
+"""
+Live score, answer and trending events. Changes are published after
+commit with PostgreSQL NOTIFY; every server process LISTENs on one
+connection and fans the events out to its Server-Sent Events streams,
+served in front of Django by LiveApplication (hasker/asgi.py).
+"""
+import asyncio
+import json
+import logging
+import re
+from collections import defaultdict
+from typing import Optional
+
+import psycopg
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "hasker_live"
+
+# the trending sidebar of every page
+TRENDING = "trending"
+
+# ex: /qa/live/ - trending only, /qa/live/question/5/ - question 5 and trending
+PATH_PREFIX = "/qa/live/"
+QUESTION_PATH = re.compile(r"^question/(\d+)/$")
+
+# a client that missed events, it has to reload the state
+RESET = b"event: reset\ndata: {}\n\n"
+# comment keeping idle connections open through proxies
+PING = b": ping\n\n"
+
+
+def question_topic(question_id: int) -> str:
+    """ Scores and new answers of one question page """
+    return f"question:{question_id}"
+
+
+def stream_url(question_id: Optional[int] = None) -> str:
+    return PATH_PREFIX + (f"question/{question_id}/" if question_id else "")
+
+
+def message(topic: str, event: str, data: dict) -> str:
+    return json.dumps({"topic": topic, "event": event, "data": data}, separators=(",", ":"))
+
+
+def publish(topic: str, event: str, data: dict) -> None:
+    """ Send an event to the streams of the topic in all processes once the transaction commits """
+    text = message(topic, event, data)
+    transaction.on_commit(lambda: send(text))
+
+
+def send(text: str) -> None:
+    """ Send a message() now """
+    if settings.LIVE_BACKEND == "postgres":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, text])
+    else:
+        # this process only, for a single server process and the tests
+        hub.dispatch_threadsafe(text)
+
+
+def frame(event: str, data: dict) -> bytes:
+    """ Server-Sent Events message, encoded once for all streams """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscriber:
+    """ Bounded queue of the events of one stream """
+
+    def __init__(self, topics: tuple, size: int):
+        self.topics = topics
+        self.queue = asyncio.Queue(size)
+        # events replaced by resets
+        self.dropped = 0
+
+    def offer(self, message: bytes) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # the client reads slower than events come: the queued events
+            # are replaced by one reset instead of growing the memory
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class Hub:
+    """ Streams of this process by topic, fed by one LISTEN connection """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.clients = 0
+        self.loop = None
+        self.listening = None
+        self._listener = None
+
+    def subscribe(self, topics: tuple) -> Subscriber:
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.listening = asyncio.Event()
+            self._listener = None
+        if settings.LIVE_BACKEND == "postgres" and (self._listener is None or self._listener.done()):
+            self._listener = loop.create_task(self.listen())
+        subscriber = Subscriber(topics, settings.LIVE_QUEUE_SIZE)
+        for topic in topics:
+            self.subscribers[topic].add(subscriber)
+        self.clients += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        for topic in subscriber.topics:
+            self.subscribers[topic].discard(subscriber)
+            if not self.subscribers[topic]:
+                del self.subscribers[topic]
+        self.clients -= 1
+
+    def dispatch(self, text: str) -> None:
+        try:
+            event = json.loads(text)
+            subscribers = self.subscribers.get(event["topic"])
+            if subscribers:
+                data = frame(event["event"], event["data"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Malformed live event: %r", text)
+            return
+        for subscriber in list(subscribers or ()):
+            subscriber.offer(data)
+
+    def dispatch_threadsafe(self, text: str) -> None:
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.dispatch, text)
+
+    def reset_all(self) -> None:
+        for subscriber in set().union(*self.subscribers.values()):
+            subscriber.offer(RESET)
+
+    async def listen(self) -> None:
+        """ Dispatch notifications until the loop ends, reconnecting after failures """
+        database = connections["default"].settings_dict
+        params = {
+            "dbname": database["NAME"], "user": database["USER"], "password": database["PASSWORD"],
+            "host": database["HOST"], "port": database["PORT"],
+        }
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                        autocommit=True, **{key: value for key, value in params.items() if value}) as listener:
+                    await listener.execute(f"LISTEN {CHANNEL}")
+                    if self.listening.is_set():
+                        # events sent while reconnecting are lost
+                        self.reset_all()
+                    self.listening.set()
+                    async for notify in listener.notifies():
+                        self.dispatch(notify.payload)
+            except psycopg.Error as error:
+                logger.warning("Live events listener failed, reconnecting: %s", error)
+                await asyncio.sleep(settings.LIVE_RECONNECT_DELAY)
+
+
+hub = Hub()
+
+
+def topics(path: str) -> Optional[tuple]:
+    """ Topics of a stream path below PATH_PREFIX, None for unknown paths """
+    if path == "":
+        return (TRENDING,)
+    match = QUESTION_PATH.match(path)
+    if match:
+        return question_topic(int(match[1])), TRENDING
+    return None
+
+
+class LiveApplication:
+    """
+    ASGI application serving the event streams, other requests go to
+    `application`. A stream costs a queue and a coroutine: no thread,
+    no database connection and no Django middleware, the events are public.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(PATH_PREFIX):
+            return await self.application(scope, receive, send)
+        stream_topics = topics(scope["path"][len(PATH_PREFIX):])
+        if stream_topics is None or scope["method"] != "GET":
+            return await self.respond(send, 404, b"Not found")
+        if hub.clients >= settings.LIVE_MAX_CLIENTS:
+            return await self.respond(send, 503, b"Too many streams", [(b"retry-after", b"30")])
+        await self.stream(stream_topics, receive, send)
+
+    async def respond(self, send, status: int, body: bytes, headers: list = ()) -> None:
+        await send({
+            "type": "http.response.start", "status": status,
+            "headers": [(b"content-type", b"text/plain"), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def stream(self, stream_topics: tuple, receive, send) -> None:
+        subscriber = hub.subscribe(stream_topics)
+        writer = asyncio.ensure_future(self.write(subscriber, send))
+        disconnect = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await asyncio.wait({writer, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            hub.unsubscribe(subscriber)
+            writer.cancel()
+            disconnect.cancel()
+        if writer.done() and not writer.cancelled() and writer.exception():
+            # the server failed to send to a client that went away
+            logger.debug("Live stream ended: %r", writer.exception())
+
+    async def write(self, subscriber: Subscriber, send) -> None:
+        await send({
+            "type": "http.response.start", "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # nginx would buffer the stream
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        # reconnecting browsers wait, with the subscription in place
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+        while True:
+            try:
+                async with asyncio.timeout(settings.LIVE_HEARTBEAT):
+                    message = await subscriber.queue.get()
+            except TimeoutError:
+                message = PING
+            # waits while the client does not read, its queue takes the events
+            await send({"type": "http.response.body", "body": message, "more_body": True})
+
+    async def wait_disconnect(self, receive) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
@@ -0,0 +1,395 @@
+""" Closed-loop HTTP load generator and the servers it compares: gunicorn (WSGI) and uvicorn (ASGI) """
+import asyncio
+import contextlib
+import json
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.urls import reverse
+
+from .benchmark import Benchmark, percentile
+
+# name -> command serving on {port} with {workers} processes of {threads} threads
+SERVERS = {
+    # threads of a worker serve one request each, as the sync views need
+    "wsgi": [
+        "gunicorn", "hasker.wsgi:application", "--bind", "127.0.0.1:{port}",
+        "--workers", "{workers}", "--worker-class", "gthread", "--threads", "{threads}",
+        "--backlog", "2048", "--log-level", "warning",
+    ],
+    # one event loop per worker, sync code runs in threads of the requests
+    "asgi": [
+        "uvicorn", "hasker.asgi:application", "--host", "127.0.0.1", "--port", "{port}",
+        "--workers", "{workers}", "--backlog", "2048", "--no-access-log", "--log-level", "warning",
+    ],
+}
+
+
+def requests() -> dict:
+    """
+    name -> request of the paths compared, in the current database: pages of
+    the benchmark user are rendered, anonymous readers get cached pages
+    """
+    bench = Benchmark()
+    question_url = reverse("qa:question_detail", args=(bench.question.id,))
+    csrf_secret = secrets.token_hex(16)
+    cookies = {
+        "Cookie": f"{settings.SESSION_COOKIE_NAME}={bench.client.cookies[settings.SESSION_COOKIE_NAME].value}; "
+                  f"{settings.CSRF_COOKIE_NAME}={csrf_secret}",
+    }
+    return {
+        "index_anonymous": http_request("GET", reverse("qa:index")),
+        "index": http_request("GET", reverse("qa:index"), cookies),
+        "tag_detail": http_request("GET", reverse("qa:tag_detail", args=(bench.tag.tag_text,)), cookies),
+        "question_detail": http_request("GET", question_url, cookies),
+        "vote": http_request(
+            "GET", reverse("qa:question_vote", args=(bench.question.id, "+1")) + "?" + urlencode(
+                {"next": question_url}),
+            cookies),
+        # the unmasked secret of the cookie is a valid token
+        "answer_post": http_request(
+            "POST", question_url,
+            {**cookies, "Content-Type": "application/x-www-form-urlencoded"},
+            urlencode({"text": "Benchmark answer", "csrfmiddlewaretoken": csrf_secret}).encode()),
+    }
+
+
+def http_request(method: str, path: str, headers: dict = None, body: bytes = b"") -> bytes:
+    """ Bytes of a keep-alive HTTP/1.1 request """
+    headers = {"Host": "localhost", "Connection": "keep-alive", **(headers or {})}
+    if body or method == "POST":
+        headers["Content-Length"] = str(len(body))
+    head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return (head + "\r\n").encode("latin-1") + body
+
+
+async def read_head(reader: asyncio.StreamReader) -> tuple:
+    """ Status and headers (lowercase names) of a response """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by the server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple:
+    """ Status of a response read to its end and whether the connection stays open """
+    status, headers = await read_head(reader)
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            # the chunk and its CRLF, the last chunk is followed by an empty line
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get("connection", "").lower() != "close"
+
+
+class LoadResult:
+    """ Latencies and errors of the requests of one load run """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        # seconds of every completed request
+        self.latencies = []
+        # failed connections, timeouts and responses with status >= 400
+        self.errors = 0
+        self.seconds = 0.0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> dict:
+        latencies = [latency * 1000 for latency in self.latencies] or [0.0]
+        return {
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.rps, 1),
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(max(latencies), 3),
+        }
+
+
+async def _client(host: str, port: int, request: bytes, deadline: float,
+                  timeout: float, result: LoadResult) -> None:
+    """ One connection sending the request again as soon as the response is read """
+    writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            writer.write(request)
+            status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            result.errors += 1
+            if writer is not None:
+                writer.close()
+                writer = None
+            # a refusing server is not hammered in a busy loop
+            await asyncio.sleep(0.01)
+            continue
+        result.latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            result.errors += 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(host: str, port: int, request: bytes, concurrency: int,
+              duration: float, timeout: float = 30.0) -> LoadResult:
+    """
+    `concurrency` connections requesting for `duration` seconds, each sends
+    its next request when the previous response is read (closed loop)
+    """
+    result = LoadResult(concurrency)
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _client(host, port, request, deadline, timeout, result) for _ in range(concurrency)))
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def load(port: int, request: bytes, concurrency: int, duration: float) -> LoadResult:
+    return asyncio.run(run("127.0.0.1", port, request, concurrency, duration))
+
+
+class EventParser:
+    """ Events of a Server-Sent Events stream read in pieces of any size """
+
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data: bytes) -> list:
+        """ (event, data) of the messages completed by `data`, comments and retry hints are skipped """
+        *messages, self.buffer = (self.buffer + data).split(b"\n\n")
+        events = []
+        for message in messages:
+            event, lines = "message", []
+            for line in message.decode().split("\n"):
+                if not line or line.startswith(":"):
+                    continue
+                name, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if name == "event":
+                    event = value
+                elif name == "data":
+                    lines.append(value)
+            if lines:
+                events.append((event, "\n".join(lines)))
+        return events
+
+
+async def read_body(reader: asyncio.StreamReader, headers: dict):
+    """ Pieces of a streamed body as they arrive """
+    chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+    while True:
+        if chunked:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            data = (await reader.readexactly(size + 2))[:-2]
+            if size == 0:
+                return
+        else:
+            data = await reader.read(64 * 1024)
+            if not data:
+                return
+        yield data
+
+
+class FanoutResult:
+    """ Delivery of published events to many open streams """
+
+    def __init__(self, clients: int):
+        self.clients = clients
+        self.connected = 0
+        self.errors = 0
+        self.sent = 0
+        # seconds from publishing to receiving, of every delivered event
+        self.latencies = []
+        self.resets = 0
+        self.connect_seconds = 0.0
+
+    @property
+    def delivered_ratio(self) -> float:
+        expected = self.connected * self.sent
+        return len(self.latencies) / expected if expected else 0.0
+
+    def summary(self) -> dict:
+        latencies = [latency * 1000 for latency in self.latencies] or [0.0]
+        return {
+            "clients": self.clients,
+            "connected": self.connected,
+            "errors": self.errors,
+            "connect_s": round(self.connect_seconds, 2),
+            "sent": self.sent,
+            "delivered": len(self.latencies),
+            "delivered_ratio": round(self.delivered_ratio, 4),
+            "resets": self.resets,
+            "p50_ms": round(statistics.median(latencies), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(max(latencies), 3),
+        }
+
+
+async def _subscriber(host: str, port: int, path: str, connecting: asyncio.Semaphore,
+                      result: FanoutResult) -> None:
+    """ One stream, events carry the time they were published in `sent` """
+    async with connecting:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(http_request("GET", path, {"Accept": "text/event-stream"}))
+            status, headers = await read_head(reader)
+            body = read_body(reader, headers)
+            # the retry hint is sent once the stream is subscribed
+            first = await anext(body)
+        except (OSError, ValueError, asyncio.IncompleteReadError, StopAsyncIteration):
+            result.errors += 1
+            return
+        if status != 200:
+            result.errors += 1
+            writer.close()
+            return
+    result.connected += 1
+    parser = EventParser()
+    parser.feed(first)
+    try:
+        async for data in body:
+            received = time.time()
+            for event, payload in parser.feed(data):
+                if event == "reset":
+                    result.resets += 1
+                elif event == "benchmark":
+                    result.latencies.append(received - json.loads(payload)["sent"])
+    except (OSError, ValueError, asyncio.IncompleteReadError):
+        result.errors += 1
+    finally:
+        writer.close()
+
+
+async def fanout(host: str, port: int, path: str, clients: int, events: int, rate: float,
+                 publish, settle: float = 5.0) -> FanoutResult:
+    """
+    Open `clients` streams of `path`, then publish `events` benchmark events
+    at `rate` per second with publish({"seq": ..., "sent": ...}), a blocking
+    callable run in a thread
+    """
+    result = FanoutResult(clients)
+    # a burst of connections larger than the listen backlog would be refused
+    connecting = asyncio.Semaphore(256)
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(_subscriber(host, port, path, connecting, result)) for _ in range(clients)]
+    while result.connected + result.errors < clients:
+        await asyncio.sleep(0.05)
+    result.connect_seconds = time.perf_counter() - started
+
+    for seq in range(events):
+        await asyncio.to_thread(publish, {"seq": seq, "sent": time.time()})
+        result.sent += 1
+        await asyncio.sleep(1 / rate)
+    deadline = time.monotonic() + settle
+    while len(result.latencies) < result.connected * result.sent and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return result
+
+
+def rss(pid: int) -> int:
+    """ Resident memory of a process in bytes, 0 where /proc is not available """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(process: subprocess.Popen, port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The server did not listen on port {port} in {timeout:.0f} s")
+
+
+@contextlib.contextmanager
+def serve(name: str, workers: int = 1, threads: int = 8, env: Optional[dict] = None):
+    """
+    Run one of SERVERS on a free port in the project directory
+    :return: the port and the server process
+    """
+    port = free_port()
+    command = [sys.executable, "-m"] + [
+        part.format(port=port, workers=workers, threads=threads) for part in SERVERS[name]]
+    environment = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "hasker.settings_benchmark",
+        "HASKER_ASYNC_VIEWS": "1" if name == "asgi" else "0",
+        **(env or {}),
+    }
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=environment, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            try:
+                wait_until_ready(process, port)
+            except RuntimeError as error:
+                log.seek(0)
+                raise RuntimeError(f"{error}: {log.read().decode(errors='replace')[-2000:]}") from None
+            yield port, process
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
@@ -0,0 +1,84 @@
+""" Benchmark the Q&A request paths on a seeded throwaway database """
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from qa import benchmark, counters
+from qa.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a separate database with a synthetic dataset, time and count queries "
+        "of the index, tag, search, question, vote, answer and API paths, write JSON results"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset", choices=sorted(benchmark.DATASETS), default="1k",
+            help="Size of the seeded dataset",
+        )
+        parser.add_argument(
+            "--questions", type=int,
+            help="Number of questions, overrides --dataset",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the dataset")
+        parser.add_argument("--iterations", type=int, default=20, help="Requests per path")
+        parser.add_argument(
+            "--only", nargs="+", metavar="PATH",
+            help="Benchmark only these paths (index, tag_detail, search, question_detail, vote, "
+                 "answer_post, api_questions)",
+        )
+        parser.add_argument("--output", help="Write results to this JSON file")
+        parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="Keep the benchmark database and reuse its data on the next run",
+        )
+
+    def handle(self, *args, **options):
+        questions = options["questions"] or benchmark.DATASETS[options["dataset"]]
+        dataset = f"{questions}q-seed{options['seed']}"
+        baseline = benchmark.load(options["compare"]) if options["compare"] else None
+
+        # never touch the development database or its cache
+        test_settings = connection.settings_dict.setdefault("TEST", {})
+        test_settings["NAME"] = f"benchmark_{connection.settings_dict['NAME']}"
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            with override_settings(CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            }):
+                rows = {}
+                if not Question.objects.exists():
+                    self.stdout.write(f"Seeding {questions} questions...")
+                    rows = benchmark.seed_dataset(questions, seed=options["seed"])
+                if not Question.objects.exists():
+                    raise CommandError("The dataset is empty")
+
+                results = benchmark.Benchmark(iterations=options["iterations"]).run(options["only"])
+        finally:
+            # benchmark visits and views are not real ones, nor is the database there at exit
+            counters.visits.clear()
+            counters.views.clear()
+            if not options["keepdb"]:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        document = benchmark.report(results, dataset, options["iterations"], rows)
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:24} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                f"queries {result['queries']}"
+                + (f"  {result['rows_per_s']} rows/s" if "rows_per_s" in result else "")
+            )
+        if baseline:
+            self.stdout.write("Compared with " + (baseline.get("revision") or options["compare"]) + ":")
+            for line in benchmark.compare(baseline, document):
+                self.stdout.write("  " + line)
+        if options["output"]:
+            benchmark.save(document, options["output"])
+            self.stdout.write(f"Results written to {options['output']}")
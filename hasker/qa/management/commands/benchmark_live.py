@@ -0,0 +1,77 @@
+""" Fan-out of live events to many Server-Sent Events streams of one uvicorn process """
+import asyncio
+import datetime
+import importlib.util
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from qa import benchmark, live, loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the site with one uvicorn process, open many event streams of a question "
+        "page, publish events with NOTIFY at a fixed rate and report how many were "
+        "delivered, the publish-to-receive latency and the memory of the server per stream. "
+        "Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000, help="Open streams")
+        parser.add_argument("--events", type=int, default=100, help="Events published")
+        parser.add_argument("--rate", type=float, default=20, help="Events published per second")
+        parser.add_argument("--question", type=int, default=1, help="Question id of the streams")
+        parser.add_argument("--output", help="Write results to this JSON file")
+
+    def handle(self, *args, **options):
+        if not importlib.util.find_spec("uvicorn"):
+            raise CommandError("Not installed: uvicorn (pip install -r requirements.txt)")
+        if connection.vendor != "postgresql" or settings.LIVE_BACKEND != "postgres":
+            raise CommandError("Live events between processes need PostgreSQL and LIVE_BACKEND = 'postgres'")
+        if options["clients"] > settings.LIVE_MAX_CLIENTS:
+            raise CommandError(f"More clients than LIVE_MAX_CLIENTS ({settings.LIVE_MAX_CLIENTS})")
+
+        topic = live.question_topic(options["question"])
+
+        def publish(data: dict) -> None:
+            live.send(live.message(topic, "benchmark", data))
+            close_old_connections()
+
+        cache_dir = tempfile.mkdtemp(prefix="hasker-benchmark-cache-")
+        env = {"HASKER_DATABASE_NAME": connection.settings_dict["NAME"], "HASKER_CACHE_DIR": cache_dir}
+        try:
+            with loadtest.serve("asgi", env=env) as (port, process):
+                idle = loadtest.rss(process.pid)
+                result = asyncio.run(loadtest.fanout(
+                    "127.0.0.1", port, live.stream_url(options["question"]), options["clients"],
+                    options["events"], options["rate"], publish))
+                # measured after the streams are closed, the memory is not given back
+                loaded = loadtest.rss(process.pid)
+        except RuntimeError as error:
+            raise CommandError(str(error))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        summary = result.summary()
+        summary["server_rss_mb"] = round(loaded / 2 ** 20, 1)
+        summary["rss_per_client_kb"] = round((loaded - idle) / 1024 / max(result.connected, 1), 1)
+        self.stdout.write(
+            f"{summary['connected']}/{summary['clients']} streams in {summary['connect_s']} s, "
+            f"{summary['delivered']} of {summary['connected'] * summary['sent']} events delivered "
+            f"({summary['delivered_ratio']:.2%}), resets {summary['resets']}, errors {summary['errors']}\n"
+            f"latency p50 {summary['p50_ms']:.1f} ms  p95 {summary['p95_ms']:.1f} ms  "
+            f"p99 {summary['p99_ms']:.1f} ms  max {summary['max_ms']:.1f} ms\n"
+            f"server {summary['server_rss_mb']} MB, {summary['rss_per_client_kb']} KB per stream"
+        )
+        if options["output"]:
+            benchmark.save({
+                "revision": benchmark.git_revision(),
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "rate": options["rate"],
+                "results": summary,
+            }, options["output"])
+            self.stdout.write(f"Results written to {options['output']}")
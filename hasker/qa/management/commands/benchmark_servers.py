@@ -0,0 +1,131 @@
+""" Throughput and tail latency of the question paths served by gunicorn (WSGI) and uvicorn (ASGI) """
+import datetime
+import importlib.util
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from qa import benchmark, loadtest
+from qa.models import Question
+
+# server -> module that has to be installed
+MODULES = {"wsgi": "gunicorn", "asgi": "uvicorn"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a separate database, serve it with the sync views under gunicorn and with "
+        "the async views under uvicorn, load the question list, tag, question, vote and "
+        "answer paths with many keep-alive connections and compare requests per second "
+        "and p50/p95/p99 latency. The load generator runs on the same machine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset", choices=sorted(benchmark.DATASETS), default="1k",
+            help="Size of the seeded dataset",
+        )
+        parser.add_argument("--questions", type=int, help="Number of questions, overrides --dataset")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the dataset")
+        parser.add_argument(
+            "--servers", nargs="+", choices=sorted(loadtest.SERVERS), default=["wsgi", "asgi"],
+            help="Servers to compare",
+        )
+        parser.add_argument(
+            "--only", nargs="+", metavar="PATH",
+            help="Load only these paths (index_anonymous, index, tag_detail, question_detail, "
+                 "vote, answer_post)",
+        )
+        parser.add_argument("--concurrency", type=int, default=64, help="Open connections")
+        parser.add_argument("--duration", type=float, default=10, help="Seconds of load per path")
+        parser.add_argument("--warmup", type=float, default=2, help="Seconds of unmeasured load per path")
+        parser.add_argument("--workers", type=int, default=1, help="Server processes")
+        parser.add_argument("--threads", type=int, default=8, help="Threads of a gunicorn process")
+        parser.add_argument("--output", help="Write results to this JSON file")
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="Keep the benchmark database and reuse its data on the next run",
+        )
+
+    def handle(self, *args, **options):
+        missing = [MODULES[name] for name in options["servers"] if not importlib.util.find_spec(MODULES[name])]
+        if missing:
+            raise CommandError(f"Not installed: {', '.join(missing)} (pip install -r requirements.txt)")
+        questions = options["questions"] or benchmark.DATASETS[options["dataset"]]
+        dataset = f"{questions}q-seed{options['seed']}"
+
+        # never touch the development database or its cache
+        test_settings = connection.settings_dict.setdefault("TEST", {})
+        test_settings["NAME"] = f"benchmark_{connection.settings_dict['NAME']}"
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            rows = {}
+            if not Question.objects.exists():
+                self.stdout.write(f"Seeding {questions} questions...")
+                rows = benchmark.seed_dataset(questions, seed=options["seed"])
+            requests = {
+                name: request for name, request in loadtest.requests().items()
+                if not options["only"] or name in options["only"]
+            }
+            # the servers connect on their own
+            connection.close()
+            results = {}
+            for server in options["servers"]:
+                results[server] = self.load_server(server, requests, options)
+        except RuntimeError as error:
+            raise CommandError(str(error))
+        finally:
+            connection.close()
+            if not options["keepdb"]:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if {"wsgi", "asgi"} <= results.keys():
+            self.stdout.write("ASGI compared with WSGI:")
+            for name in requests:
+                wsgi, asgi = results["wsgi"][name], results["asgi"][name]
+                self.stdout.write(
+                    f"  {name:16} rps {wsgi['rps']:.0f} -> {asgi['rps']:.0f} "
+                    f"({(asgi['rps'] / wsgi['rps'] - 1) * 100 if wsgi['rps'] else 0:+.0f}%), "
+                    f"p99 {wsgi['p99_ms']:.1f} -> {asgi['p99_ms']:.1f} ms"
+                )
+        if options["output"]:
+            benchmark.save({
+                "revision": benchmark.git_revision(),
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "dataset": dataset,
+                "rows": rows,
+                "concurrency": options["concurrency"],
+                "duration": options["duration"],
+                "workers": options["workers"],
+                "threads": options["threads"],
+                "results": results,
+            }, options["output"])
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def load_server(self, server: str, requests: dict, options: dict) -> dict:
+        """ name -> summary of the load of every path """
+        cache_dir = tempfile.mkdtemp(prefix="hasker-benchmark-cache-")
+        env = {"HASKER_DATABASE_NAME": connection.settings_dict["NAME"], "HASKER_CACHE_DIR": cache_dir}
+        results = {}
+        try:
+            with loadtest.serve(server, options["workers"], options["threads"], env) as (port, _):
+                for name, request in requests.items():
+                    if options["warmup"]:
+                        loadtest.load(port, request, options["concurrency"], options["warmup"])
+                    results[name] = loadtest.load(
+                        port, request, options["concurrency"], options["duration"]).summary()
+                    result = results[name]
+                    self.stdout.write(
+                        f"{server} {name:16} {result['rps']:8.1f} rps  p50 {result['p50_ms']:8.1f} ms  "
+                        f"p95 {result['p95_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+                        f"errors {result['errors']}"
+                    )
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        return results
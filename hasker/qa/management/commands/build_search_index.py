@@ -0,0 +1,23 @@
+""" Rebuild the index of the configured search backend """
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from qa import search
+
+
+class Command(BaseCommand):
+    help = "Index all questions with the configured search backend and save its snapshot"
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        started = time.monotonic()
+        indexed = backend.rebuild()
+        if hasattr(backend, "save"):
+            backend.save()
+            self.stdout.write(f"Snapshot saved to {settings.SEARCH_INDEX_PATH}")
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Indexed {indexed} question(s) with {settings.SEARCH_BACKEND} in {elapsed:.1f}s"
+        )
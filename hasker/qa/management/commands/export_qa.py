@@ -0,0 +1,52 @@
+""" Export questions with their answers, tags and scores to NDJSON or CSV """
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from qa import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream questions with answers, tags and scores to NDJSON or CSV in constant memory, "
+        "optionally gzipped and only for questions asked or answered since a moment"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(export.FORMATS), default="ndjson")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument(
+            "--since", metavar="ISO_DATETIME",
+            help="Incremental export: questions asked or answered at or after this moment",
+        )
+        parser.add_argument("--output", help="Write to this file instead of the standard output")
+        parser.add_argument(
+            "--chunk-size", type=int,
+            help="Questions fetched from the server-side cursor at once (EXPORT_CHUNK_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_since(options["since"]) if options["since"] else None
+        except ValueError as error:
+            raise CommandError(error) from error
+
+        # the next incremental export starts where this one has started
+        started = timezone.now()
+        chunks, stats = export.export(
+            options["format"], since=since, compress=options["gzip"], chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+            report = self.stdout
+        else:
+            output = getattr(self.stdout, "buffer", None) or sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            # the standard output is the data
+            report = self.stderr
+        report.write(f"Exported {stats}")
+        report.write(f"Next incremental export: --since {started.isoformat()}")
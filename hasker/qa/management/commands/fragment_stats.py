@@ -0,0 +1,21 @@
+""" Hit/miss counters of the fragment cache """
+from django.core.management.base import BaseCommand
+
+from qa import fragments
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of cached question cards and answer blocks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters after showing them")
+
+    def handle(self, *args, **options):
+        for name, counters in fragments.stats().items():
+            self.stdout.write(
+                f"{name:16} hits {counters['hits']:>10}  misses {counters['misses']:>10}  "
+                f"hit ratio {counters['ratio']:.1%}"
+            )
+        if options["reset"]:
+            fragments.reset_stats()
+            self.stdout.write("Counters reset")
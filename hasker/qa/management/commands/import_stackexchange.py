@@ -0,0 +1,69 @@
+""" Import a Stack Exchange data dump, continuing an interrupted import """
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from qa import stackexchange
+
+
+class Command(BaseCommand):
+    help = (
+        "Import Users.xml, Tags.xml, Posts.xml and Votes.xml of a Stack Exchange dump "
+        "directory as users, tags, questions, answers and votes, written with COPY in "
+        "batches; run it again to continue an interrupted import"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory with the extracted XML files of the dump")
+        parser.add_argument("--name", help="Name of the import progress, the directory name by default")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Rows per COPY and transaction")
+        parser.add_argument(
+            "--username-prefix", default="se_",
+            help="Usernames of imported users are this prefix and the dump user id; "
+                 "a new import refuses a prefix of existing users",
+        )
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Forget the progress of a previous import with the same name and import "
+                 "everything again; needs a --username-prefix no existing user has",
+        )
+        parser.add_argument(
+            "--no-index", action="store_true",
+            help="Do not rebuild the search index and trending ranking afterwards",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The import writes with COPY, which is supported by PostgreSQL only")
+        if not os.path.isfile(os.path.join(options["path"], stackexchange.FILES["posts"])):
+            raise CommandError(f"{stackexchange.FILES['posts']} not found in {options['path']}")
+
+        importer = stackexchange.Importer(
+            options["path"],
+            name=options["name"],
+            batch_size=options["batch_size"],
+            username_prefix=options["username_prefix"],
+        )
+
+        def report(importer):
+            self.stdout.write(
+                f"{importer.progress.stage}: id {importer.progress.position}, "
+                f"{importer.read:,} rows read, {importer.rows_per_s:,.0f} rows/s, "
+                f"peak memory {stackexchange.peak_memory() / 2 ** 20:,.0f} MiB"
+            )
+
+        try:
+            counts = importer.run(restart=options["restart"], index=not options["no_index"], report=report)
+        except ValueError as error:
+            raise CommandError(error) from error
+
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f"{label:24} {count:>12,}")
+        for reason, count in sorted(importer.skipped.items()):
+            self.stdout.write(f"skipped {reason:16} {count:>12,}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {importer.read:,} rows in {importer.seconds:.1f}s, "
+            f"{importer.rows_per_s:,.0f} rows/s, "
+            f"peak memory {stackexchange.peak_memory() / 2 ** 20:,.0f} MiB"
+        ))
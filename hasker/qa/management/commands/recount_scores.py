@@ -0,0 +1,50 @@
+""" Backfill or reconcile stored votes score of questions and answers """
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from qa.models import Answer, AnswerVote, Question, QuestionVote
+
+
+def recount_scores(model, vote_model, fk: str, dry_run: bool = False) -> int:
+    """
+    Recompute score from votes for every row whose stored score has drifted
+    :param model: Question or Answer
+    :param vote_model: corresponding votes model
+    :param fk: name of the votes model foreign key to the model
+    :param dry_run: only count drifted rows, do not update them
+    :return: number of drifted rows
+    """
+    votes_sum = vote_model.objects.filter(
+        **{fk: OuterRef("pk")}
+    ).values(fk).annotate(total=Sum("vote")).values("total")
+    actual_score = Coalesce(Subquery(votes_sum), 0)
+
+    drifted = model.objects.alias(actual_score=actual_score).exclude(score=F("actual_score"))
+    if dry_run:
+        return drifted.count()
+    return drifted.update(score=actual_score)
+
+
+class Command(BaseCommand):
+    help = "Recompute stored votes score of questions and answers from their votes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many scores differ from the votes sum",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        with transaction.atomic():
+            for model, vote_model, fk in (
+                    (Question, QuestionVote, "question"),
+                    (Answer, AnswerVote, "answer")):
+                drifted = recount_scores(model, vote_model, fk, dry_run=dry_run)
+                verb = "Found" if dry_run else "Fixed"
+                self.stdout.write(
+                    f"{verb} {drifted} drifted {model._meta.verbose_name} score(s)"
+                )
@@ -0,0 +1,25 @@
+""" Backfill or reconcile stored usage counts of tags """
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from qa import pagecache, tags
+
+
+class Command(BaseCommand):
+    help = "Recompute stored usage counts of tags from their questions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many usage counts differ from the number of questions",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        with transaction.atomic():
+            drifted = tags.recount_usage(dry_run=dry_run)
+            if drifted and not dry_run:
+                pagecache.changed(scopes=(pagecache.TAGS,))
+        verb = "Found" if dry_run else "Fixed"
+        self.stdout.write(f"{verb} {drifted} drifted tag usage count(s)")
@@ -0,0 +1,12 @@
+""" Periodic recompute of the trending questions ranking """
+from django.core.management.base import BaseCommand
+
+from qa import trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the time-decayed trending ranking and store it in the cache (run by cron)"
+
+    def handle(self, *args, **options):
+        entries = trending.refresh()
+        self.stdout.write(f"Cached {len(entries)} trending question candidate(s)")
@@ -0,0 +1,79 @@
+""" Fill the database with a large reproducible synthetic dataset """
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from qa import search, trending
+from qa.models import Answer, AnswerVote, Question, QuestionVote, Tag
+from qa.seed import CopySeeder, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate users, tags, questions, answers and votes with power-law "
+        "distributions, written in batches with COPY (PostgreSQL) or bulk_create"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("questions", type=int, help="Number of questions to create")
+        parser.add_argument("--users", type=int, help="Number of users (questions / 10 by default)")
+        parser.add_argument("--tags", type=int, help="Number of tags (questions / 50 by default)")
+        parser.add_argument("--days", type=int, default=365, help="Spread questions over this many days")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed gives the same data")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Questions per batch")
+        parser.add_argument(
+            "--method", choices=["copy", "bulk"],
+            default="copy" if connection.vendor == "postgresql" else "bulk",
+            help="COPY streams (PostgreSQL only) or bulk_create INSERTs",
+        )
+        parser.add_argument(
+            "--no-index", action="store_true",
+            help="Do not rebuild the search index and trending ranking afterwards",
+        )
+
+    def handle(self, *args, **options):
+        if options["method"] == "copy" and connection.vendor != "postgresql":
+            raise CommandError("COPY is supported by PostgreSQL only, use --method bulk")
+
+        seeder_class = CopySeeder if options["method"] == "copy" else Seeder
+        seeder = seeder_class(
+            options["questions"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            users=options["users"],
+            tags=options["tags"],
+            days=options["days"],
+        )
+        started = time.monotonic()
+
+        def progress(done):
+            elapsed = time.monotonic() - started
+            rows = sum(seeder.counts.values())
+            self.stdout.write(
+                f"{done}/{options['questions']} questions, {rows} rows, "
+                f"{rows / elapsed:,.0f} rows/s"
+            )
+
+        counts = seeder.run(progress=progress)
+        elapsed = time.monotonic() - started
+
+        if connection.vendor == "postgresql":
+            # fresh statistics, so that the planner uses the new indexes
+            self.stdout.write("Analyzing tables...")
+            with connection.cursor() as cursor:
+                for model in (Question, Question.tags.through, Answer, QuestionVote, AnswerVote, Tag):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f"{label:20} {count:>12,}")
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {total:,} rows in {elapsed:.1f}s, {total / elapsed:,.0f} rows/s"
+        ))
+
+        if not options["no_index"]:
+            started = time.monotonic()
+            search.get_backend().rebuild()
+            trending.refresh()
+            self.stdout.write(f"Search index and trending rebuilt in {time.monotonic() - started:.1f}s")
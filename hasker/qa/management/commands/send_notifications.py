@@ -0,0 +1,48 @@
+""" Worker delivering the notification outbox """
+import time
+
+from django.core.management.base import BaseCommand
+
+from qa import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued notifications in batches over one SMTP connection, retrying "
+        "failures with backoff; run by cron or with --loop as a long-lived worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Notifications per batch")
+        parser.add_argument("--max-attempts", type=int, help="Give up after this many failed attempts")
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep running, polling the outbox every --interval seconds",
+        )
+        parser.add_argument("--interval", type=float, default=5, help="Polling interval of --loop")
+        parser.add_argument(
+            "--metrics", action="store_true",
+            help="Only print queue depth and delivery latency",
+        )
+
+    def handle(self, *args, **options):
+        if not options["metrics"]:
+            with notifications.Worker(
+                batch_size=options["batch_size"], max_attempts=options["max_attempts"]
+            ) as worker:
+                while True:
+                    result = worker.deliver()
+                    if result.sent or result.failed:
+                        self.stdout.write(f"Sent {result.sent}, failed {result.failed} notification(s)")
+                    if not options["loop"]:
+                        break
+                    # the connection is not kept open while idle
+                    worker.close()
+                    time.sleep(options["interval"])
+
+        stats = notifications.metrics(max_attempts=options["max_attempts"])
+        self.stdout.write(
+            f"Queue depth {stats['pending']} (oldest {stats['oldest_pending_s']:.0f}s), "
+            f"dead {stats['dead']}, delivery latency p50 {stats['latency_p50_s']:.1f}s "
+            f"p95 {stats['latency_p95_s']:.1f}s"
+        )
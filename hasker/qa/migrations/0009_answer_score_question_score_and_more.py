@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_scores(apps, schema_editor):
+    """ Fill the new score columns from existing votes """
+    for model_name, vote_model_name, fk in (
+            ("Question", "QuestionVote", "question"),
+            ("Answer", "AnswerVote", "answer")):
+        model = apps.get_model("qa", model_name)
+        vote_model = apps.get_model("qa", vote_model_name)
+        votes_sum = vote_model.objects.filter(
+            **{fk: OuterRef("pk")}
+        ).values(fk).annotate(total=Sum("vote")).values("total")
+        model.objects.update(score=Coalesce(Subquery(votes_sum), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0008_alter_tag_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='score',
+            field=models.IntegerField(default=0, editable=False, help_text='Sum of all votes, maintained by do_vote', verbose_name='votes score'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='score',
+            field=models.IntegerField(default=0, editable=False, help_text='Sum of all votes, maintained by do_vote', verbose_name='votes score'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', '-score', '-created'], name='answer_score_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-score', '-created'], name='question_score_created_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0009_answer_score_question_score_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-created'], name='question_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:44
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+BACKFILL_SEARCH_VECTOR = """
+    UPDATE qa_question q SET search_vector =
+        setweight(to_tsvector('english', q.title), 'A')
+        || setweight(to_tsvector('english', q.text), 'B')
+        || setweight(to_tsvector('english', coalesce(
+            (SELECT string_agg(a.text, ' ') FROM qa_answer a WHERE a.question_id = q.id),
+            '')), 'C')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0010_question_question_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SEARCH_VECTOR, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='question_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0011_question_search_vector_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='answer',
+            name='answer_score_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_score_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', '-score', '-created', '-id'], name='answer_score_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-score', '-created', '-id'], name='question_score_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0012_remove_answer_answer_score_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=200)),
+                ('body', models.TextField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date created')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, help_text='Not delivered before this time, moved forward after each failure', verbose_name='next attempt')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='date sent')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('sent__isnull', True)), fields=['next_attempt', 'id'], name='notification_pending_idx')],
+            },
+        ),
+    ]
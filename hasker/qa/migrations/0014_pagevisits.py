@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0013_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageVisits',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('visits', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'page visits',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pagevisits',
+            constraint=models.UniqueConstraint(fields=('page', 'day'), name='page_visits_page_day_unique'),
+        ),
+    ]
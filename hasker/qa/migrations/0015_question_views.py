@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0014_pagevisits'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='views',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Views of the question page, written in batches by qa.counters', verbose_name='number of views'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-views', '-created', '-id'], name='question_views_created_idx'),
+        ),
+    ]
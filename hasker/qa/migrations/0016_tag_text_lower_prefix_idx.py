@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:16
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0015_question_views'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('tag_text'), name='text_pattern_ops'), name='tag_text_lower_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_usage(apps, schema_editor):
+    """ Fill the new usage column from existing question tags """
+    Question = apps.get_model("qa", "Question")
+    Tag = apps.get_model("qa", "Tag")
+    links = Question.tags.through.objects.filter(
+        tag=OuterRef("pk")
+    ).order_by().values("tag").annotate(total=Count("*")).values("total")
+    Tag.objects.update(usage=Coalesce(Subquery(links), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0016_tag_text_lower_prefix_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='usage',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_usage, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-usage', 'tag_text'], name='tag_usage_idx'),
+        ),
+    ]
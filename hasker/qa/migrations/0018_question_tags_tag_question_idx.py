@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index of the join table of Question.tags for tag combinations:
+    questions of a tag in (tag_id, question_id) order. The other direction
+    is the unique (question_id, tag_id) index created with the table.
+    The table is auto-created, so the index is not part of the model state.
+    """
+
+    dependencies = [
+        ('qa', '0017_tag_usage'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX qa_question_tags_tag_question_idx ON qa_question_tags (tag_id, question_id)",
+            "DROP INDEX qa_question_tags_tag_question_idx",
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0018_question_tags_tag_question_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['created'], name='answer_created_idx'),
+        ),
+    ]
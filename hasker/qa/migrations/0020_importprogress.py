@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0019_answer_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('user_offset', models.BigIntegerField()),
+                ('question_offset', models.BigIntegerField()),
+                ('answer_offset', models.BigIntegerField()),
+                ('stage', models.CharField(max_length=20)),
+                ('position', models.BigIntegerField(blank=True, help_text='Dump id of the last committed row of the stage', null=True)),
+                ('started', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date started')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='date finished')),
+            ],
+        ),
+    ]
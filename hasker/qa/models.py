@@ -1,10 +1,13 @@
 """ Models for Q&A application """
 import datetime 
-from typing import Union
+from typing import NamedTuple, Union
 
 from django.contrib import admin
 from django.contrib.auth.models import User
-from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import DatabaseError, connection, models
+from django.dispatch import Signal
 from django.utils import timezone
 
 from django.urls import reverse
@@ -16,12 +19,28 @@ class VoteStatus(models.IntegerChoices):
     DISLIKE = -1
 
 
+# Sent after a vote is applied, with sender=Question or Answer and
+# instance (voted object with the new score), user and result arguments.
+# Votes are written with raw SQL, so post_save is not sent for them.
+vote_applied = Signal()
+
+
+class VoteResult(NamedTuple):
+    """ Outcome of a vote: user's vote after it, score change and new score """
+    vote: int
+    score_delta: int
+    score: int
+
+
 class Tag(models.Model):
     """ Tags for questions """
     tag_text = models.CharField(
         max_length=200,
         unique=True,
         help_text="Enter tags for a question (e.g. Linux, DB, Network etc.)")
+    # number of questions with the tag, maintained by qa.signals,
+    # `manage.py recount_tags` recomputes it
+    usage = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.tag_text}"
@@ -34,6 +53,15 @@ class Tag(models.Model):
                 violation_error_message = "Tag already exists (case insensitive match)"
             ),
         ]
+        indexes = [
+            # LOWER(tag_text) LIKE 'prefix%' of the autocomplete, the unique
+            # index above has the default collation and cannot serve LIKE
+            models.Index(
+                OpClass(models.functions.Lower("tag_text"), name="text_pattern_ops"),
+                name="tag_text_lower_prefix_idx"),
+            # tag directory sorted by popularity
+            models.Index(fields=["-usage", "tag_text"], name="tag_usage_idx"),
+        ]
         ordering = ["tag_text"]
 
 
@@ -48,20 +76,23 @@ class AbstractQA(models.Model):
     text = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField("date created", default=timezone.now)
+    score = models.IntegerField(
+        "votes score",
+        default=0,
+        editable=False,
+        help_text="Sum of all votes, maintained by do_vote")
 
     class Meta:
         abstract = True
 
-    @transaction.atomic
-    def do_vote(self, user: User, current_vote: VoteStatus) -> None:
+    def do_vote(self, user: User, current_vote: VoteStatus) -> VoteResult:
         """ Like or Dislike vote """
-        do_vote(vote_object=self, user=user, current_vote=current_vote)
+        return do_vote(vote_object=self, user=user, current_vote=current_vote)
 
     @property
     def votes_count(self):
-        """ Get total votes count """
-        votes = self.votes.aggregate(sum_votes=models.Sum("vote"))["sum_votes"]
-        return votes or 0
+        """ Get total votes count (stored score, no aggregate query) """
+        return self.score
 
 
 class Question(AbstractQA):
@@ -78,6 +109,21 @@ class Question(AbstractQA):
         related_name="correct_answer_for",
         on_delete=models.CASCADE
     )
+    # title, text and answers text, maintained by qa.signals
+    search_vector = SearchVectorField(null=True, editable=False)
+    views = models.PositiveBigIntegerField(
+        "number of views",
+        default=0,
+        editable=False,
+        help_text="Views of the question page, written in batches by qa.counters")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "-created", "-id"], name="question_score_created_idx"),
+            models.Index(fields=["-created"], name="question_created_idx"),
+            models.Index(fields=["-views", "-created", "-id"], name="question_views_created_idx"),
+            GinIndex(fields=["search_vector"], name="question_search_vector_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title}"
@@ -110,6 +156,15 @@ class Answer(AbstractQA):
     """ An answer to a question """
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["question", "-score", "-created", "-id"],
+                name="answer_score_created_idx"),
+            # questions answered since the last incremental export
+            models.Index(fields=["created"], name="answer_created_idx"),
+        ]
+
     def __str__(self):
         return f"votes:{self.votes_count}, {self.text}"
 
@@ -124,12 +179,91 @@ class AbstractVote(models.Model):
         default=0,
         help_text="Vote status")
 
+    # name of the foreign key to the voted object, set by subclasses
+    voted_field = ""
+
+    # Applies like, dislike or revoke in one statement:
+    # the existing vote row is locked, then deleted (same vote again),
+    # switched (opposite vote) or created, and the score delta is added
+    # to the voted object. A concurrent first vote of the same user makes
+    # the insert hit the unique constraint and do nothing; the statement
+    # then returns no row and is repeated with a fresh snapshot.
+    VOTE_SQL = """
+        WITH previous AS (
+            SELECT id, vote FROM {votes}
+            WHERE user_id = %(user_id)s AND {fk} = %(object_id)s
+            FOR UPDATE
+        ),
+        revoked AS (
+            DELETE FROM {votes} v USING previous
+            WHERE v.id = previous.id AND previous.vote = %(vote)s
+            RETURNING 0 AS new_vote, previous.vote AS old_vote
+        ),
+        switched AS (
+            UPDATE {votes} v SET vote = %(vote)s FROM previous
+            WHERE v.id = previous.id AND previous.vote <> %(vote)s
+            RETURNING v.vote AS new_vote, previous.vote AS old_vote
+        ),
+        created AS (
+            INSERT INTO {votes} (user_id, {fk}, vote)
+            SELECT %(user_id)s, %(object_id)s, %(vote)s
+            WHERE NOT EXISTS (SELECT 1 FROM previous)
+            ON CONFLICT (user_id, {fk}) DO NOTHING
+            RETURNING vote AS new_vote, 0 AS old_vote
+        ),
+        changed AS (
+            SELECT * FROM revoked
+            UNION ALL SELECT * FROM switched
+            UNION ALL SELECT * FROM created
+        ),
+        scored AS (
+            UPDATE {voted} o SET score = o.score + changed.new_vote - changed.old_vote
+            FROM changed WHERE o.id = %(object_id)s
+            RETURNING o.score
+        )
+        SELECT changed.new_vote, changed.new_vote - changed.old_vote, scored.score
+        FROM changed, scored
+    """
+
+    # every repeated attempt means another click of the same user won,
+    # so this bounds the number of simultaneous clicks that are tolerated
+    VOTE_ATTEMPTS = 10
+
     def __str__(self):
         return f"{self.vote}"
 
     class Meta:
         abstract = True
 
+    @classmethod
+    def apply(cls, user_id: int, object_id: int, current_vote: VoteStatus) -> VoteResult:
+        """
+        Apply a vote of the user and update the voted object score atomically
+        :param user_id: id of the user who votes
+        :param object_id: id of the voted question or answer
+        :param current_vote: vote that should be made (like or dislike),
+            the same vote again revokes it
+        :return: user's vote after the click, score delta and new score
+        """
+        voted = cls._meta.get_field(cls.voted_field)
+        sql = cls.VOTE_SQL.format(
+            votes=connection.ops.quote_name(cls._meta.db_table),
+            fk=connection.ops.quote_name(voted.column),
+            voted=connection.ops.quote_name(voted.related_model._meta.db_table),
+        )
+        params = {"user_id": user_id, "object_id": object_id, "vote": int(current_vote)}
+
+        with connection.cursor() as cursor:
+            for _ in range(cls.VOTE_ATTEMPTS):
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+                if row is not None:
+                    return VoteResult(*row)
+        raise DatabaseError(
+            f"Vote of user {user_id} for {voted.related_model.__name__} {object_id} "
+            f"was not applied after {cls.VOTE_ATTEMPTS} attempts"
+        )
+
 
 class QuestionVote(AbstractVote):
     """ 
@@ -141,6 +275,8 @@ class QuestionVote(AbstractVote):
         on_delete=models.CASCADE,
         related_name="votes",)
 
+    voted_field = "question"
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -161,6 +297,8 @@ class AnswerVote(AbstractVote):
         on_delete=models.CASCADE,
         related_name="votes",)
 
+    voted_field = "answer"
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -174,32 +312,86 @@ class AnswerVote(AbstractVote):
 def do_vote(
     vote_object: Union[Question, Answer],
     user: User,
-    current_vote: VoteStatus) -> None:
+    current_vote: VoteStatus) -> VoteResult:
 
     """
     Vote (like or dislike) for question or answer
+    The vote row and the stored score are changed by one atomic statement
     :param vote_object: object to vote for (concrete question or answer)
     :param user: user who votes
     :param status: vote that should be made (like or dislike)
+    :return: user's vote after the click, score delta and new score
     """
 
-    opposite_vote = VoteStatus.DISLIKE if current_vote == VoteStatus.LIKE else VoteStatus.LIKE
-    vote_object.votes.filter(
-        models.Q(user_id=user.id) &
-        models.Q(vote=opposite_vote)
-    ).delete()
-
-    user_action_is_already_done = vote_object.votes.filter(
-        models.Q(user_id=user.id) &
-        models.Q(vote=current_vote)
+    result = vote_object.votes.model.apply(
+        user_id=user.id,
+        object_id=vote_object.pk,
+        current_vote=current_vote
     )
+    vote_object.score = result.score
+    vote_applied.send(
+        sender=type(vote_object), instance=vote_object, user=user, result=result
+    )
+    return result
 
-    # revoke current vote if the same button is pressed again
-    if user_action_is_already_done.exists():
-        user_action_is_already_done.delete()
-        return
 
-    vote_object.votes.create(
-        user_id=user.id,
-        vote=current_vote
-    )
+class Notification(models.Model):
+    """
+    Outbox of emails: rows are written in the transaction of the change
+    they announce and delivered by `manage.py send_notifications`
+    """
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    created = models.DateTimeField("date created", default=timezone.now)
+    next_attempt = models.DateTimeField(
+        "next attempt", default=timezone.now,
+        help_text="Not delivered before this time, moved forward after each failure")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent = models.DateTimeField("date sent", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # pending rows only, the delivered history does not slow the worker down
+            models.Index(
+                fields=["next_attempt", "id"],
+                condition=models.Q(sent__isnull=True),
+                name="notification_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.subject}"
+
+
+class PageVisits(models.Model):
+    """ Daily number of visits of a page, written in batches by qa.counters """
+    page = models.CharField(max_length=100)
+    day = models.DateField()
+    visits = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["page", "day"], name="page_visits_page_day_unique"),
+        ]
+        verbose_name_plural = "page visits"
+
+    def __str__(self):
+        return f"{self.page} {self.day}: {self.visits}"
+
+
+class ImportProgress(models.Model):
+    """ Position of a resumable Stack Exchange dump import, see qa.stackexchange """
+    name = models.CharField(max_length=200, unique=True)
+    # row ids are dump ids shifted by the largest ids before the import
+    user_offset = models.BigIntegerField()
+    question_offset = models.BigIntegerField()
+    answer_offset = models.BigIntegerField()
+    stage = models.CharField(max_length=20)
+    position = models.BigIntegerField(
+        null=True, blank=True, help_text="Dump id of the last committed row of the stage")
+    started = models.DateTimeField("date started", default=timezone.now)
+    finished = models.DateTimeField("date finished", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.stage} {self.position}"
@@ -0,0 +1,154 @@
+""" Notification outbox: queueing emails with data changes and delivering them later """
+import datetime
+import statistics
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .models import Answer, Notification
+
+
+class DeliveryResult(NamedTuple):
+    """ Outcome of one worker pass """
+    sent: int
+    failed: int
+
+
+def enqueue(recipient: str, subject: str, body: str) -> Notification:
+    """
+    Queue an email; called inside the transaction of the change, so the
+    notification is stored if and only if the change is committed
+    """
+    return Notification.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def notify_question_author(answer: Answer) -> Optional[Notification]:
+    """ Queue a notification for the author of the question when a new answer is added, None without an email """
+    recipient = answer.question.author.email
+    if not recipient:
+        return None
+    title_truncated = Truncator(answer.question.title)
+
+    subject = f"New reply for '{title_truncated.words(5)}' - Hasker"
+    message = f"""
+        <p>{answer.author.username} has replied to your question
+        <a href="{answer.question.url}">{title_truncated.words(10)}</a>:</p>
+        <p>{Truncator(answer.text).words(25)}</p>
+    """
+    return enqueue(recipient, subject, message)
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    """ Exponential backoff: the base delay doubles after every failed attempt """
+    return datetime.timedelta(seconds=settings.NOTIFICATION_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+class Worker:
+    """
+    Delivers pending notifications in batches over a single SMTP
+    connection, which is opened once and reused for all messages.
+    Failed messages are retried with exponential backoff until
+    NOTIFICATION_MAX_ATTEMPTS is reached.
+    """
+
+    def __init__(self, batch_size: int = None, max_attempts: int = None, connection=None):
+        self.batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.NOTIFICATION_MAX_ATTEMPTS
+        self.connection = connection or get_connection()
+        self.opened = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        if self.opened:
+            self.connection.close()
+            self.opened = False
+
+    def send(self, notification: Notification) -> None:
+        if not self.opened:
+            self.connection.open()
+            self.opened = True
+        message = EmailMessage(
+            notification.subject,
+            notification.body,
+            settings.TECH_EMAIL,
+            [notification.recipient],
+            connection=self.connection,
+        )
+        message.send()
+
+    def deliver_batch(self) -> DeliveryResult:
+        """ Send one batch of due notifications """
+        sent = failed = 0
+        with transaction.atomic():
+            # other workers skip the locked rows and take the next batch
+            batch = list(Notification.objects.select_for_update(skip_locked=True).filter(
+                sent__isnull=True,
+                next_attempt__lte=timezone.now(),
+                attempts__lt=self.max_attempts,
+            ).order_by("next_attempt", "id")[:self.batch_size])
+
+            for notification in batch:
+                notification.attempts += 1
+                try:
+                    self.send(notification)
+                except Exception as error:  # pylint: disable=broad-except
+                    # a broken connection is reopened for the next message
+                    self.close()
+                    notification.last_error = f"{type(error).__name__}: {error}"
+                    notification.next_attempt = timezone.now() + retry_delay(notification.attempts)
+                    failed += 1
+                else:
+                    notification.sent = timezone.now()
+                    notification.last_error = ""
+                    sent += 1
+            Notification.objects.bulk_update(
+                batch, ["attempts", "last_error", "next_attempt", "sent"])
+        return DeliveryResult(sent, failed)
+
+    def deliver(self) -> DeliveryResult:
+        """ Send batches until no notification is due """
+        sent = failed = 0
+        while True:
+            result = self.deliver_batch()
+            sent += result.sent
+            failed += result.failed
+            if result.sent + result.failed < self.batch_size:
+                return DeliveryResult(sent, failed)
+
+
+def metrics(max_attempts: int = None, window: int = 1000) -> dict:
+    """
+    Queue depth and delivery latency (time from queueing to sending)
+    :param max_attempts: notifications with this many attempts count as dead
+    :param window: latency is measured over this many last sent notifications
+    """
+    max_attempts = max_attempts or settings.NOTIFICATION_MAX_ATTEMPTS
+    now = timezone.now()
+    pending = Notification.objects.filter(sent__isnull=True)
+    oldest = pending.filter(attempts__lt=max_attempts).aggregate(oldest=Min("created"))["oldest"]
+    latencies = [
+        (sent - created).total_seconds()
+        for created, sent in Notification.objects.filter(
+            sent__isnull=False
+        ).order_by("-sent").values_list("created", "sent")[:window]
+    ]
+    return {
+        "pending": pending.filter(attempts__lt=max_attempts).count(),
+        "dead": pending.filter(attempts__gte=max_attempts).count(),
+        "oldest_pending_s": (now - oldest).total_seconds() if oldest else 0.0,
+        "latency_p50_s": statistics.median(latencies) if latencies else 0.0,
+        "latency_p95_s": (
+            statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1
+            else latencies[0] if latencies else 0.0
+        ),
+    }
@@ -0,0 +1,155 @@
+""" Full-page cache for anonymous readers with conditional GET (ETag, Last-Modified) """
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import routers
+
+STAMP_KEY = "qa:changed:{scope}"
+PAGE_KEY = "qa:page:{digest}"
+
+# questions lists: any question, answer, vote or tag change
+SITE = "site"
+# trending questions on the sidebar of every page
+SIDEBAR = "sidebar"
+# usernames and avatars shown on every page
+PROFILES = "profiles"
+# views of questions, written in batches by qa.counters
+VIEWS = "views"
+# tag directory and cloud: tags and their usage counts
+TAGS = "tags"
+
+
+def question_scope(question_id: int) -> str:
+    """ Detail page of one question: the question, its answers and their votes """
+    return f"question:{question_id}"
+
+
+def touch(*scopes: str) -> None:
+    """ Record that content of the scopes has changed now """
+    now = time.time()
+    cache.set_many({STAMP_KEY.format(scope=scope): now for scope in scopes}, None)
+
+
+def changed(*question_ids: int, scopes: tuple = (SITE,)) -> None:
+    """
+    Invalidate the lists and the pages of the questions. Stamps are
+    touched now and once more after commit: a page rendered from data
+    read before the commit is stored under the intermediate stamp only.
+    """
+    scopes = (*scopes, *(question_scope(pk) for pk in question_ids))
+    touch(*scopes)
+    transaction.on_commit(lambda: touch(*scopes))
+
+
+def last_modified(scopes: list) -> float:
+    """ Time of the newest change of the scopes, unknown ones count as changed now """
+    keys = [STAMP_KEY.format(scope=scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, None)
+        stamps.update(cache.get_many(missing))
+    return max(stamps.values())
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serves GET requests of anonymous users from a cache of whole pages.
+    The cache key includes the time of the last change of the page scopes,
+    so pages are invalidated by model changes (see qa.signals), and the
+    stored ETag and Last-Modified answer conditional requests with 304
+    without rendering anything.
+    """
+
+    def page_cache_scopes(self) -> list:
+        """ Scopes the page depends on, None disables the cache """
+        return [SITE, SIDEBAR, PROFILES]
+
+    def _page_key(self, request) -> tuple:
+        """ Cache key of the page and the time of its last change, Nones if it is not cached """
+        if (
+            request.method not in ("GET", "HEAD")
+            or request.user.is_authenticated
+            # one-time messages must not be cached nor be hidden by a cached page
+            or len(get_messages(request))
+        ):
+            return None, None
+        scopes = self.page_cache_scopes()
+        if scopes is None:
+            return None, None
+        modified = last_modified(scopes)
+        digest = hashlib.md5(f"{request.get_full_path()}:{modified!r}".encode()).hexdigest()
+        return PAGE_KEY.format(digest=digest), modified
+
+    def _missed(self, modified: float) -> None:
+        if time.time() - modified < settings.REPLICA_PIN_SECONDS:
+            # replicas may not have the change yet, the page is stored
+            # under the new stamp and must not be older than the change
+            routers.pin()
+
+    def _store(self, key: str, response) -> dict:
+        page = {
+            "content": response.content,
+            "content_type": response["Content-Type"],
+            "etag": quote_etag(hashlib.md5(response.content).hexdigest()),
+        }
+        cache.set(key, page, settings.PAGE_CACHE_TIMEOUT)
+        return page
+
+    def _respond(self, request, page: dict, modified: float, response=None):
+        if response is None:
+            response = HttpResponse(page["content"], content_type=page["content_type"])
+        response["ETag"] = page["etag"]
+        response["Last-Modified"] = http_date(modified)
+        # browsers keep the page but revalidate it on every visit
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ("Cookie",))
+        # Last-Modified has a resolution of one second, If-None-Match
+        # is checked first and is exact
+        return get_conditional_response(
+            request, etag=page["etag"], last_modified=int(modified), response=response)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self._cached_dispatch(super().dispatch, request, *args, **kwargs)
+        key, modified = self._page_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+        page = cache.get(key)
+        if page is not None:
+            return self._respond(request, page, modified)
+        self._missed(modified)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+        if hasattr(response, "render"):
+            response.render()
+        return self._respond(request, self._store(key, response), modified, response)
+
+    async def _cached_dispatch(self, dispatch, request, *args, **kwargs):
+        # the cache is local (memory or files), its calls cost less than a
+        # thread hop; request.user must be loaded already (see qa.async_views)
+        key, modified = self._page_key(request)
+        if key is None:
+            return await dispatch(request, *args, **kwargs)
+        page = cache.get(key)
+        if page is not None:
+            return self._respond(request, page, modified)
+        self._missed(modified)
+        response = await dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or response.streaming:
+            return response
+        if hasattr(response, "render"):
+            await sync_to_async(response.render)()
+        return self._respond(request, self._store(key, response), modified, response)
@@ -0,0 +1,178 @@
+""" Keyset (cursor) pagination for question and answer listings """
+import base64
+import binascii
+import datetime
+import json
+from typing import Optional
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, QuerySet, Value
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def _row(*expressions):
+    """ SQL row value, compared element by element: (a, b) < (c, d) """
+    return Func(*expressions, function="ROW", output_field=Field())
+
+
+def _json_default(value):
+    # full microsecond precision, the cursor must match the row exactly
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot put {type(value).__name__} into a cursor")
+
+
+def encode_cursor(direction: str, values: list) -> str:
+    """ Opaque url-safe cursor pointing before or after a row """
+    payload = json.dumps([direction, values], default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """ Direction and raw row values of a cursor, ValueError if it is malformed """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError("Malformed cursor") from exc
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        raise ValueError("Malformed cursor")
+    return direction, values
+
+
+class CursorPage:
+    """ One page of a keyset-paginated queryset """
+
+    def __init__(self, object_list: list, next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset by comparing the ordering columns with the row
+    value stored in the cursor, so the database seeks to the page through
+    the (score, created, id) indexes instead of counting and skipping rows.
+    The last ordering field must be unique. All fields are ordered descending.
+    """
+
+    def __init__(self, queryset: QuerySet, ordering: tuple, per_page: int):
+        """
+        :param queryset: unordered or ordered queryset, the ordering is replaced
+        :param ordering: model fields or annotations, e.g. ("score", "created", "id")
+        :param per_page: number of objects on a page
+        """
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+
+    def _output_field(self, name: str) -> Field:
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        if name == "pk":
+            return self.queryset.model._meta.pk
+        return self.queryset.model._meta.get_field(name)
+
+    def _values(self, obj) -> list:
+        # model instances or rows of values()
+        if isinstance(obj, dict):
+            return [obj[name] for name in self.ordering]
+        return [getattr(obj, name) for name in self.ordering]
+
+    def _seek(self, direction: str, raw_values: list) -> QuerySet:
+        if len(raw_values) != len(self.ordering):
+            raise ValueError("Malformed cursor")
+        try:
+            values = [
+                Value(self._output_field(name).to_python(value), output_field=self._output_field(name))
+                for name, value in zip(self.ordering, raw_values)
+            ]
+        except (ValidationError, TypeError, ValueError) as exc:
+            # ex: a number for a datetime field
+            raise ValueError("Malformed cursor") from exc
+
+        position = _row(*[F(name) for name in self.ordering])
+        queryset = self.queryset.alias(cursor_position=position)
+        if direction == NEXT:
+            return queryset.filter(cursor_position__lt=_row(*values))
+        return queryset.filter(cursor_position__gt=_row(*values))
+
+    def forward(self, cursor: Optional[str] = None) -> QuerySet:
+        """
+        All rows after a next cursor in page order, not sliced, for callers
+        streaming a page with iterator(). Previous and malformed cursors
+        start from the first row.
+        """
+        queryset = self.queryset
+        if cursor:
+            try:
+                direction, raw_values = decode_cursor(cursor)
+                if direction == NEXT:
+                    queryset = self._seek(direction, raw_values)
+            except ValueError:
+                pass
+        return queryset.order_by(*[f"-{name}" for name in self.ordering])
+
+    def next_cursor(self, row) -> str:
+        """ Cursor of the rows after `row`, a model instance or a row of values() """
+        return encode_cursor(NEXT, self._values(row))
+
+    def _page_rows(self, cursor: Optional[str]) -> tuple:
+        """ Sliced queryset of the page rows, the valid cursor and its direction """
+        direction, queryset = NEXT, self.queryset
+        if cursor:
+            try:
+                direction, raw_values = decode_cursor(cursor)
+                queryset = self._seek(direction, raw_values)
+            except ValueError:
+                cursor, direction, queryset = None, NEXT, self.queryset
+
+        if direction == NEXT:
+            queryset = queryset.order_by(*[f"-{name}" for name in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        return queryset[:self.per_page + 1], cursor, direction
+
+    def _make_page(self, rows: list, cursor: Optional[str], direction: str) -> CursorPage:
+        has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+        if direction == NEXT:
+            has_next, has_previous = has_more, cursor is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = encode_cursor(NEXT, self._values(rows[-1])) if has_next and rows else None
+        previous_cursor = encode_cursor(PREVIOUS, self._values(rows[0])) if has_previous and rows else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def page(self, cursor: Optional[str] = None) -> CursorPage:
+        """
+        Page after (or before) the cursor, the first page for an empty or
+        malformed cursor
+        """
+        queryset, cursor, direction = self._page_rows(cursor)
+        return self._make_page(list(queryset), cursor, direction)
+
+    async def apage(self, cursor: Optional[str] = None) -> CursorPage:
+        """ page() for async views, rows are fetched with the async ORM API """
+        queryset, cursor, direction = self._page_rows(cursor)
+        return self._make_page([row async for row in queryset], cursor, direction)
@@ -0,0 +1,177 @@
+""" Read queries of chosen views go to database replicas, writers read from the primary for a while """
+import contextlib
+import contextvars
+import random
+import time
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# set on responses of requests that wrote, holds the end of the pin (unix time)
+PIN_COOKIE = "hasker_primary"
+
+
+class Routing:
+    """ Routing state of one request """
+
+    def __init__(self, pinned: bool = False):
+        # reads go to the primary: the client wrote recently
+        self.pinned = pinned
+        # the request itself wrote, its next reads must see the writes
+        self.written = False
+        # alias of the replica inside replica_reads()
+        self.replica = None
+
+
+# a mutable object: the threads that serve one request under ASGI
+# run in copies of its context and share the state
+_routing = contextvars.ContextVar("qa_routing", default=None)
+
+
+def current() -> Optional[Routing]:
+    return _routing.get()
+
+
+def mark_written() -> None:
+    """ Reads of the rest of the request and the next ones of the client go to the primary """
+    state = _routing.get()
+    if state is not None:
+        state.written = True
+
+
+def pin() -> None:
+    """ Reads of the rest of the request go to the primary """
+    state = _routing.get()
+    if state is not None:
+        state.pinned = True
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """ Reads in the block go to a replica, unless the request is pinned or has written """
+    state = _routing.get()
+    token = None
+    if state is None:
+        state = Routing()
+        token = _routing.set(state)
+    previous = state.replica
+    if settings.DATABASE_REPLICAS:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+    try:
+        yield state
+    finally:
+        state.replica = previous
+        if token is not None:
+            _routing.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Writes, transactions and all reads outside replica_reads() use the
+    primary (`default`). Objects read from a replica are saved to the
+    primary and may be related to its objects, the data is the same.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (
+            state is None
+            or state.replica is None
+            or state.pinned
+            or state.written
+            # the session is read before anything is known about the client
+            or model._meta.app_label == "sessions"
+        ):
+            # explicitly, None would send related reads of replica objects to the replica
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        mark_written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # replicas get the schema by replication
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaReadsMixin:
+    """ GET and HEAD of the view read from a replica, the template included """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+        if self.view_is_async:
+            return self._replica_dispatch(super().dispatch(request, *args, **kwargs))
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            # templates query too, they are rendered before the block ends
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+
+    async def _replica_dispatch(self, handler):
+        # the coroutine of the view has not started yet, its queries run in the block
+        with replica_reads():
+            response = await handler
+            if hasattr(response, "render") and not response.is_rendered:
+                await sync_to_async(response.render)()
+        return response
+
+
+class PrimaryPinMiddleware:
+    """
+    Read-your-writes: a response to a request that wrote sets a cookie,
+    requests with the cookie read from the primary until the replicas
+    have caught up (REPLICA_PIN_SECONDS). Must be above SessionMiddleware
+    to see the session writes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request) -> Routing:
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return Routing(pinned=pinned)
+
+    def _finish(self, state: Routing, response):
+        if state.written:
+            response.set_cookie(
+                PIN_COOKIE, f"{time.time() + settings.REPLICA_PIN_SECONDS:.0f}",
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._start(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state = self._start(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._finish(state, response)
@@ -0,0 +1,70 @@
+"""
+Questions search: query parsing and the backend selected by SEARCH_BACKEND
+"""
+import functools
+import re
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils.module_loading import import_string
+
+# backends mark matches in snippets with these control characters,
+# the template filter `highlight` escapes the snippet and only then
+# turns them into tags
+HIGHLIGHT_START = "\u0002"
+HIGHLIGHT_STOP = "\u0003"
+
+# "quoted phrase", prefix* or a plain word
+TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+WORD_RE = re.compile(r"\w+")
+
+
+class ParsedQuery(NamedTuple):
+    """ Search phrase split into tag filters and full-text part """
+    tags: list
+    text: str
+    # `-tag:windows`, questions with these tags are left out
+    excluded_tags: tuple = ()
+
+
+def parse_query(phrase: str) -> ParsedQuery:
+    """
+    Split a search phrase like `tag:linux -tag:windows kernel panic`
+    into tags, excluded tags and text
+    :param phrase: search phrase as typed by the user
+    """
+    tags, excluded, words = [], [], []
+    for match in TOKEN_RE.finditer(phrase):
+        token = match.group(0)
+        lowered = token.lower()
+        if lowered.startswith("tag:"):
+            tag_text = token[4:].strip()
+            if tag_text:
+                tags.append(tag_text)
+        elif lowered.startswith("-tag:"):
+            tag_text = token[5:].strip()
+            if tag_text:
+                excluded.append(tag_text)
+        else:
+            words.append(token)
+    return ParsedQuery(tags=tags, text=" ".join(words), excluded_tags=tuple(excluded))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_backend(path: str):
+    return import_string(path)()
+
+
+def get_backend():
+    """ Search backend instance configured by SEARCH_BACKEND setting """
+    return _load_backend(settings.SEARCH_BACKEND)
+
+
+def search(questions: QuerySet, text: str) -> QuerySet:
+    """
+    Filter questions by full-text query and order them by relevance
+    :param questions: questions queryset to search in
+    :param text: full-text part of the search phrase
+    """
+    return get_backend().search(questions, text)
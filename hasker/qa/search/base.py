@@ -0,0 +1,28 @@
+""" Interface of questions search backends """
+from django.db.models import QuerySet
+
+
+class BaseSearchBackend:
+    """
+    Search backends keep their own index of questions, qa.signals tells
+    them about every saved or deleted question and answer
+    """
+
+    def search(self, questions: QuerySet, text: str) -> QuerySet:
+        """
+        Filter questions by full-text query and order them by relevance,
+        backends may annotate `rank` and a highlighted `snippet`
+        """
+        raise NotImplementedError
+
+    def index_question(self, question_id: int) -> None:
+        """ Question or one of its answers has been saved or deleted """
+        raise NotImplementedError
+
+    def remove_question(self, question_id: int) -> None:
+        """ Question has been deleted """
+        raise NotImplementedError
+
+    def rebuild(self) -> int:
+        """ Index all questions from scratch, return number of indexed questions """
+        raise NotImplementedError
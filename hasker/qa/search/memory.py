@@ -0,0 +1,280 @@
+""" In-process inverted index of questions with BM25 ranking """
+import bisect
+import heapq
+import logging
+import math
+import os
+import pickle
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db.models import Case, FloatField, QuerySet, Value, When
+
+from . import TOKEN_RE, WORD_RE
+from .base import BaseSearchBackend
+from ..models import Answer, Question
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such "
+    "that the their then there these they this to was will with".split()
+)
+
+SNAPSHOT_VERSION = 1
+
+
+def tokenize(text: str) -> list:
+    """ Lowercased words without stop words """
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Postings lists of every worker kept in memory, for environments
+    without PostgreSQL full-text search.
+
+    Changes are queued by qa.signals and applied in batches of
+    SEARCH_INDEX_BATCH questions, or before the next search. Before the
+    first search at most a batch of them is kept for it.
+    A worker starts from the snapshot at SEARCH_INDEX_PATH, written by
+    `manage.py build_search_index`; changes made by other workers after
+    the snapshot are seen only after the next rebuild.
+    Positions are not stored, so a quoted phrase matches all its words.
+    """
+    k1 = 1.2
+    b = 0.75
+    # title words count as this many occurrences
+    title_boost = 3
+    # maximum number of terms a prefix* query expands to
+    max_prefix_terms = 100
+    # questions read from the database at once on rebuild
+    chunk_size = 2000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = None       # term -> {question id: term frequency}
+        self._lengths = {}          # question id -> document length
+        self._doc_terms = {}        # question id -> its terms, for removal
+        self._total_length = 0
+        self._sorted_terms = None   # for prefix queries, built on demand
+        self._pending = set()       # question ids waiting to be reindexed
+
+    # index maintenance
+
+    def _clear(self):
+        self._postings = {}
+        self._lengths = {}
+        self._doc_terms = {}
+        self._total_length = 0
+        self._sorted_terms = None
+
+    def _add(self, question_id: int, title: str, text: str, answers: list) -> None:
+        counts = Counter(tokenize(text))
+        for answer_text in answers:
+            counts.update(tokenize(answer_text))
+        for term in tokenize(title):
+            counts[term] += self.title_boost
+
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[question_id] = frequency
+        length = sum(counts.values())
+        self._lengths[question_id] = length
+        self._total_length += length
+        self._doc_terms[question_id] = tuple(counts)
+        self._sorted_terms = None
+
+    def _remove(self, question_id: int) -> None:
+        for term in self._doc_terms.pop(question_id, ()):
+            postings = self._postings[term]
+            del postings[question_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(question_id, 0)
+        self._sorted_terms = None
+
+    def _index_batch(self, question_ids) -> int:
+        """ Reindex questions from their current state in the database """
+        answers = defaultdict(list)
+        for question_id, text in Answer.objects.filter(
+                question_id__in=question_ids).values_list("question_id", "text"):
+            answers[question_id].append(text)
+
+        for question_id in question_ids:
+            self._remove(question_id)
+        # deleted questions are simply not found
+        indexed = 0
+        for question_id, title, text in Question.objects.filter(
+                pk__in=question_ids).values_list("id", "title", "text"):
+            self._add(question_id, title, text, answers[question_id])
+            indexed += 1
+        return indexed
+
+    def _flush(self) -> None:
+        if not self._pending or self._postings is None:
+            return
+        question_ids, self._pending = list(self._pending), set()
+        self._index_batch(question_ids)
+
+    def _ensure_loaded(self) -> None:
+        if self._postings is not None:
+            return
+        if not self.load():
+            logger.warning("No search index snapshot, building it from the database")
+            self.rebuild()
+            self.save()
+
+    def index_question(self, question_id: int) -> None:
+        with self._lock:
+            self._pending.add(question_id)
+            if len(self._pending) < settings.SEARCH_INDEX_BATCH:
+                return
+            if self._postings is None:
+                # a worker that never searches does not keep its changes
+                # without bound: once a batch is queued they are left to the
+                # next rebuild, like the changes of other workers
+                self._pending = set()
+            else:
+                self._flush()
+
+    def remove_question(self, question_id: int) -> None:
+        self.index_question(question_id)
+
+    def rebuild(self) -> int:
+        with self._lock:
+            self._clear()
+            self._pending = set()
+            indexed = 0
+            last_id = 0
+            while True:
+                question_ids = list(Question.objects.filter(
+                    pk__gt=last_id
+                ).order_by("pk").values_list("pk", flat=True)[:self.chunk_size])
+                if not question_ids:
+                    return indexed
+                indexed += self._index_batch(question_ids)
+                last_id = question_ids[-1]
+
+    # snapshot
+
+    def save(self, path=None) -> None:
+        """ Atomically write the postings and document lengths to disk """
+        path = path or settings.SEARCH_INDEX_PATH
+        with self._lock:
+            self._ensure_loaded()
+            self._flush()
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "postings": self._postings,
+                "lengths": self._lengths,
+            }
+            directory = os.path.dirname(os.fspath(path)) or "."
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as snapshot:
+                pickle.dump(data, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(snapshot.name, path)
+
+    def load(self, path=None) -> bool:
+        """ Read the snapshot, return False when there is no usable one """
+        path = path or settings.SEARCH_INDEX_PATH
+        try:
+            with open(path, "rb") as snapshot:
+                data = pickle.load(snapshot)
+        except FileNotFoundError:
+            return False
+        if data.get("version") != SNAPSHOT_VERSION:
+            return False
+
+        with self._lock:
+            self._clear()
+            self._postings = data["postings"]
+            self._lengths = data["lengths"]
+            self._total_length = sum(self._lengths.values())
+            # the forward index is not stored, invert the postings
+            doc_terms = defaultdict(list)
+            for term, postings in self._postings.items():
+                for question_id in postings:
+                    doc_terms[question_id].append(term)
+            self._doc_terms = {question_id: tuple(terms) for question_id, terms in doc_terms.items()}
+        return True
+
+    # search
+
+    def _expand_prefix(self, prefix: str) -> list:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = []
+        position = bisect.bisect_left(self._sorted_terms, prefix)
+        while (position < len(self._sorted_terms)
+               and self._sorted_terms[position].startswith(prefix)
+               and len(terms) < self.max_prefix_terms):
+            terms.append(self._sorted_terms[position])
+            position += 1
+        return terms
+
+    def _query_groups(self, text: str) -> list:
+        """ Every group is a list of terms, a document must match each group """
+        groups = []
+        for match in TOKEN_RE.finditer(text):
+            phrase, word = match.groups()
+            if phrase is not None:
+                groups.extend([term] for term in tokenize(phrase))
+                continue
+            terms = tokenize(word)
+            if not terms:
+                continue
+            groups.extend([term] for term in terms[:-1])
+            if word.endswith("*"):
+                groups.append(self._expand_prefix(terms[-1]))
+            else:
+                groups.append([terms[-1]])
+        return groups
+
+    def _score(self, text: str) -> dict:
+        groups = self._query_groups(text)
+        if not groups or not self._lengths:
+            return {}
+
+        documents = len(self._lengths)
+        average_length = self._total_length / documents
+        scores = None
+        for terms in groups:
+            group_scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term, {})
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for question_id, frequency in postings.items():
+                    length_norm = 1 - self.b + self.b * self._lengths[question_id] / average_length
+                    group_scores[question_id] += idf * frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * length_norm)
+            if scores is None:
+                scores = group_scores
+            else:
+                scores = {
+                    question_id: score + group_scores[question_id]
+                    for question_id, score in scores.items() if question_id in group_scores
+                }
+            if not scores:
+                return {}
+        return scores
+
+    def search(self, questions: QuerySet, text: str) -> QuerySet:
+        with self._lock:
+            self._ensure_loaded()
+            self._flush()
+            scores = self._score(text)
+        if not scores:
+            return questions.none()
+
+        best = heapq.nlargest(settings.SEARCH_MAX_RESULTS, scores.items(), key=itemgetter(1))
+        rank = Case(
+            *[When(pk=question_id, then=Value(score)) for question_id, score in best],
+            output_field=FloatField(),
+        )
+        return questions.filter(
+            pk__in=[question_id for question_id, _ in best]
+        ).annotate(
+            rank=rank
+        ).order_by("-rank", "-score", "-created")
@@ -0,0 +1,90 @@
+""" Full-text search of questions built on PostgreSQL tsvector """
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db.models import F, FloatField, OuterRef, QuerySet, Subquery, TextField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from . import HIGHLIGHT_START, HIGHLIGHT_STOP, TOKEN_RE, WORD_RE
+from .base import BaseSearchBackend
+from ..models import Answer, Question
+
+
+def to_tsquery(text: str) -> str:
+    """
+    Build to_tsquery() syntax: words are AND-ed, "quoted phrases" become
+    <-> sequences and a trailing * makes a prefix query
+    """
+    terms = []
+    for match in TOKEN_RE.finditer(text):
+        phrase, word = match.groups()
+        if phrase is not None:
+            lexemes = WORD_RE.findall(phrase)
+            if lexemes:
+                terms.append("(" + " <-> ".join(lexemes) + ")")
+        else:
+            lexemes = WORD_RE.findall(word)
+            if not lexemes:
+                continue
+            prefix = ":*" if word.endswith("*") else ""
+            terms.extend(lexemes[:-1])
+            terms.append(lexemes[-1] + prefix)
+    return " & ".join(terms)
+
+
+def search_vector():
+    """
+    Weighted document of a question: title (A), text (B) and answers (C)
+    """
+    answers_text = Answer.objects.filter(
+        question=OuterRef("pk")
+    ).values("question").annotate(
+        text=StringAgg("text", delimiter=" ")
+    ).values("text")
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector("title", weight="A", config=config)
+        + SearchVector("text", weight="B", config=config)
+        + SearchVector(
+            Coalesce(Subquery(answers_text), Value(""), output_field=TextField()),
+            weight="C",
+            config=config,
+        )
+    )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """ Ranked search over the stored, GIN-indexed Question.search_vector """
+
+    def search(self, questions: QuerySet, text: str) -> QuerySet:
+        raw_query = to_tsquery(text)
+        if not raw_query:
+            return questions.none()
+
+        query = SearchQuery(raw_query, search_type="raw", config=settings.SEARCH_CONFIG)
+        return questions.filter(
+            search_vector=query
+        ).annotate(
+            # ts_rank is real, double precision survives the round trip
+            # through a pagination cursor exactly
+            rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+            snippet=SearchHeadline(
+                "text",
+                query,
+                config=settings.SEARCH_CONFIG,
+                start_sel=HIGHLIGHT_START,
+                stop_sel=HIGHLIGHT_STOP,
+                max_words=35,
+                min_words=15,
+            ),
+        ).order_by("-rank", "-score", "-created")
+
+    def index_question(self, question_id: int) -> None:
+        Question.objects.filter(pk=question_id).update(search_vector=search_vector())
+
+    def remove_question(self, question_id: int) -> None:
+        # the vector is deleted together with its row
+        pass
+
+    def rebuild(self) -> int:
+        return Question.objects.update(search_vector=search_vector())
@@ -0,0 +1,227 @@
+""" Reproducible synthetic Q&A data with skewed vote, answer and tag distributions """
+import datetime
+import itertools
+import random
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import FileField
+from django.utils import timezone
+
+from users.models import Profile
+
+from . import tags as tag_lookup
+from .models import Answer, AnswerVote, Question, QuestionVote, Tag
+
+WORDS = (
+    "kernel panic linux network socket timeout python django query index "
+    "database postgres cache memory thread process deadlock lock transaction "
+    "docker container image volume nginx proxy request response header cookie "
+    "session login password token user group permission file path encoding "
+    "unicode string list dict class function method module package import "
+    "error exception traceback debug log test mock fixture migration schema "
+    "table column row join select update delete insert commit rollback "
+    "server client api json xml html css javascript browser render template"
+).split()
+
+USERNAME_PREFIX = "seed_user_"
+
+
+class Seeder:
+    """
+    Generates users, tags, questions, answers and votes.
+
+    Popularity follows power laws: a few tags are on most questions and a
+    few questions get most answers and votes. The same `seed` always
+    produces the same data. Rows are written with bulk_create in batches,
+    scores are computed from the generated votes and each user votes at
+    most once per question or answer, so constraints always hold.
+    """
+
+    def __init__(self, questions: int, seed: int = 0, batch_size: int = 5000,
+                 users: int = None, tags: int = None, days: int = 365):
+        """
+        :param questions: number of questions to create
+        :param seed: random seed, the same seed gives the same data
+        :param batch_size: rows per INSERT
+        :param users: number of users, questions / 10 by default
+        :param tags: number of tags, questions / 50 by default
+        :param days: questions are spread over this many past days
+        """
+        self.questions = questions
+        self.batch_size = batch_size
+        self.users = users or max(questions // 10, 20)
+        self.tags = tags or max(questions // 50, 10)
+        self.days = days
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        self.counts = Counter()
+        self._cum_weights = {}
+
+    # distributions
+
+    def power_law(self, maximum: int, alpha: float = 1.5) -> int:
+        """ Integer in [0, maximum], most often 0 or 1, rarely large """
+        return min(int(self.random.paretovariate(alpha)) - 1, maximum)
+
+    def zipf_choices(self, population: list, count: int, skew: float = 1.1) -> list:
+        """ Distinct items, the first items of `population` are the most popular """
+        key = (len(population), skew)
+        if key not in self._cum_weights:
+            self._cum_weights[key] = list(itertools.accumulate(
+                1 / (rank ** skew) for rank in range(1, len(population) + 1)))
+        chosen = set()
+        while len(chosen) < min(count, len(population)):
+            chosen.add(self.random.choices(population, cum_weights=self._cum_weights[key])[0])
+        return list(chosen)
+
+    def sentence(self, words: int) -> str:
+        return " ".join(self.random.choices(WORDS, k=words))
+
+    def created(self, after: datetime.datetime = None) -> datetime.datetime:
+        start = after or self.now - datetime.timedelta(days=self.days)
+        return start + (self.now - start) * self.random.random()
+
+    def votes(self, voter_ids: list, maximum: int) -> list:
+        """ Distinct voters with mostly positive votes """
+        count = self.power_law(maximum, alpha=1.2)
+        voters = self.random.sample(voter_ids, min(count, len(voter_ids)))
+        return [(voter, 1 if self.random.random() < 0.8 else -1) for voter in voters]
+
+    # writing
+
+    def bulk_create(self, model, objects: list) -> list:
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model._meta.label] += len(created)
+        return created
+
+    def create_users(self) -> list:
+        # continue numbering after users of previous runs
+        last = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by("-id").values_list("username", flat=True).first()
+        offset = int(last[len(USERNAME_PREFIX):]) + 1 if last else 0
+        users = self.bulk_create(User, [
+            # unusable password, the users are never logged in with it
+            User(username=f"{USERNAME_PREFIX}{offset + i}", email=f"seed{offset + i}@localhost",
+                 password="!")
+            for i in range(self.users)
+        ])
+        # bulk_create does not send post_save, profiles are created here
+        self.bulk_create(Profile, [Profile(user=user) for user in users])
+        return [user.id for user in users]
+
+    def create_tags(self) -> list:
+        existing = {name.lower() for name in Tag.objects.values_list("tag_text", flat=True)}
+        names = []
+        i = 0
+        while len(names) < self.tags:
+            name = f"{WORDS[i % len(WORDS)]}{i // len(WORDS) or ''}"
+            if name not in existing:
+                names.append(name)
+            i += 1
+        return [tag.id for tag in self.bulk_create(Tag, [Tag(tag_text=name) for name in names])]
+
+    def create_chunk(self, count: int, user_ids: list, tag_ids: list) -> None:
+        questions, question_votes = [], []
+        for _ in range(count):
+            votes = self.votes(user_ids, maximum=len(user_ids))
+            question_votes.append(votes)
+            questions.append(Question(
+                title=self.sentence(self.random.randint(4, 10)).capitalize() + "?",
+                text=self.sentence(self.random.randint(20, 80)),
+                author_id=self.random.choice(user_ids),
+                created=self.created(),
+                score=sum(vote for _, vote in votes),
+            ))
+        questions = self.bulk_create(Question, questions)
+
+        tag_links, vote_rows, answers, answer_votes = [], [], [], []
+        for question, votes in zip(questions, question_votes):
+            for tag_id in self.zipf_choices(tag_ids, self.random.randint(1, 3)):
+                tag_links.append(Question.tags.through(question_id=question.id, tag_id=tag_id))
+            vote_rows.extend(
+                QuestionVote(question_id=question.id, user_id=user_id, vote=vote)
+                for user_id, vote in votes)
+            for _ in range(self.power_law(maximum=50)):
+                votes = self.votes(user_ids, maximum=len(user_ids) // 2)
+                answer_votes.append(votes)
+                answers.append(Answer(
+                    question_id=question.id,
+                    text=self.sentence(self.random.randint(10, 60)),
+                    author_id=self.random.choice(user_ids),
+                    created=self.created(after=question.created),
+                    score=sum(vote for _, vote in votes),
+                ))
+        self.bulk_create(Question.tags.through, tag_links)
+        self.bulk_create(QuestionVote, vote_rows)
+        answers = self.bulk_create(Answer, answers)
+        self.bulk_create(AnswerVote, [
+            AnswerVote(answer_id=answer.id, user_id=user_id, vote=vote)
+            for answer, votes in zip(answers, answer_votes)
+            for user_id, vote in votes
+        ])
+
+    def run(self, progress=None) -> Counter:
+        """
+        Create all rows, return number of created rows per model
+        :param progress: called with the number of created questions after each batch
+        """
+        with transaction.atomic():
+            user_ids = self.create_users()
+            tag_ids = self.create_tags()
+            # the most popular tags are the first ones for zipf_choices
+            self.random.shuffle(tag_ids)
+        for start in range(0, self.questions, self.batch_size):
+            count = min(self.batch_size, self.questions - start)
+            with transaction.atomic():
+                self.create_chunk(count, user_ids, tag_ids)
+            if progress:
+                progress(start + count)
+        # bulk inserted links do not send m2m_changed
+        tag_lookup.recount_usage()
+        return self.counts
+
+
+class CopySeeder(Seeder):
+    """
+    Seeder streaming rows with PostgreSQL COPY instead of INSERT.
+    Primary keys are taken from the table sequence in one query per
+    batch, so that related rows can reference them.
+    """
+
+    def allocate_ids(self, model, count: int) -> list:
+        table = model._meta.db_table
+        column = model._meta.pk.column
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [table, column, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def bulk_create(self, model, objects: list) -> list:
+        if not objects:
+            return objects
+        for obj, pk in zip(objects, self.allocate_ids(model, len(objects))):
+            obj.pk = pk
+
+        fields = model._meta.concrete_fields
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        sql = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN"
+        # psycopg adapts plain values itself, only files need Django's
+        # preparation; the connection proxy is resolved once per batch
+        db = connections[DEFAULT_DB_ALIAS]
+        attnames = [field.attname for field in fields]
+        file_fields = [field for field in fields if isinstance(field, FileField)]
+        with db.cursor() as cursor:
+            # the psycopg cursor under Django's wrapper
+            with cursor.cursor.copy(sql) as copy:
+                for obj in objects:
+                    row = [getattr(obj, attname) for attname in attnames]
+                    for field in file_fields:
+                        row[attnames.index(field.attname)] = field.get_db_prep_save(
+                            getattr(obj, field.attname), db)
+                    copy.write_row(row)
+        self.counts[model._meta.label] += len(objects)
+        return objects
@@ -0,0 +1,163 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import Profile
+
+from . import fragments, live, pagecache, routers, search, tags, trending
+from .models import Answer, Question, Tag, vote_applied
+
+
+# votes are written with raw SQL, past the database router
+@receiver(vote_applied)
+def pin_voter_to_primary(sender, **kwargs):
+    routers.mark_written()
+
+
+# re-rank the trending sidebar when a question gets a vote or an answer
+@receiver(vote_applied, sender=Question)
+def update_trending_on_vote(sender, instance, **kwargs):
+    trending.question_changed(instance)
+
+
+@receiver(post_save, sender=Answer)
+def update_trending_on_answer(sender, instance, created, **kwargs):
+    if created:
+        trending.question_changed(instance.question)
+
+
+# live updates of open question pages
+@receiver(vote_applied, sender=Question)
+def publish_question_score(sender, instance, result, **kwargs):
+    live.publish(live.question_topic(instance.id), "score", {"question": instance.id, "score": result.score})
+
+
+@receiver(vote_applied, sender=Answer)
+def publish_answer_score(sender, instance, result, **kwargs):
+    live.publish(live.question_topic(instance.question_id), "score", {"answer": instance.id, "score": result.score})
+
+
+@receiver(post_save, sender=Answer)
+def publish_answer(sender, instance, created, **kwargs):
+    if created:
+        live.publish(live.question_topic(instance.question_id), "answer", {"answer": instance.id})
+
+
+# keep the index of the search backend up to date
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, **kwargs):
+    search.get_backend().index_question(instance.id)
+
+
+@receiver(post_delete, sender=Question)
+def remove_question_from_index(sender, instance, **kwargs):
+    search.get_backend().remove_question(instance.id)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def index_answer(sender, instance, **kwargs):
+    search.get_backend().index_question(instance.question_id)
+
+
+# bump versions of the cached question cards and answer blocks and
+# invalidate the cached pages of anonymous readers
+@receiver(vote_applied, sender=Question)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_caches(sender, instance, **kwargs):
+    fragments.bump("question", instance.id)
+    pagecache.changed(instance.id)
+
+
+@receiver(vote_applied, sender=Answer)
+def invalidate_answer_caches_on_vote(sender, instance, **kwargs):
+    fragments.bump("answer", instance.id)
+    # answer scores are shown on the question page only
+    pagecache.changed(instance.question_id, scopes=())
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_answer_caches(sender, instance, **kwargs):
+    fragments.bump("answer", instance.id)
+    # number of answers on the question card
+    fragments.bump("question", instance.question_id)
+    pagecache.changed(instance.question_id)
+
+
+def _questions_changed(*question_ids):
+    fragments.bump("question", *question_ids)
+    pagecache.changed(*question_ids)
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def invalidate_caches_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # tag.questions.clear(), the links are gone after it
+        _questions_changed(*instance.questions.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            _questions_changed(instance.id)
+        elif pk_set:
+            _questions_changed(*pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_caches_on_tag_change(sender, instance, created=False, **kwargs):
+    pagecache.changed(scopes=(pagecache.TAGS,))
+    # renamed or deleted tag on the cards and pages of its questions
+    if not created:
+        _questions_changed(*instance.questions.values_list("id", flat=True))
+
+
+# keep usage counts of tags; removals are counted before the links are
+# deleted, so that only the existing links are subtracted
+@receiver(m2m_changed, sender=Question.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # question.tags, pk_set are tags; post_add gets only the new links
+        if action == "post_add" and pk_set:
+            changed = tags.change_usage(Tag.objects.filter(pk__in=pk_set), 1)
+        elif action == "pre_remove" and pk_set:
+            changed = tags.change_usage(Tag.objects.filter(pk__in=pk_set, questions=instance), -1)
+        elif action == "pre_clear":
+            changed = tags.change_usage(Tag.objects.filter(questions=instance), -1)
+        else:
+            return
+    else:
+        # tag.questions, pk_set are questions
+        tag = Tag.objects.filter(pk=instance.pk)
+        if action == "post_add" and pk_set:
+            changed = tags.change_usage(tag, len(pk_set))
+        elif action == "pre_remove" and pk_set:
+            changed = tags.change_usage(tag, -instance.questions.filter(pk__in=pk_set).count())
+        elif action == "post_clear":
+            changed = tag.update(usage=0)
+        else:
+            return
+    if changed:
+        pagecache.changed(scopes=(pagecache.TAGS,))
+
+
+@receiver(pre_delete, sender=Question)
+def count_tag_usage_on_delete(sender, instance, **kwargs):
+    # the links are deleted by the cascade without m2m_changed
+    if tags.change_usage(Tag.objects.filter(questions=instance), -1):
+        pagecache.changed(scopes=(pagecache.TAGS,))
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_author_caches(sender, instance, **kwargs):
+    # avatar
+    fragments.bump("user", instance.user_id)
+    pagecache.changed(scopes=(pagecache.PROFILES,))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_caches_on_rename(sender, instance, created, update_fields, **kwargs):
+    # username; logins only update last_login
+    if not created and update_fields != frozenset(["last_login"]):
+        fragments.bump("user", instance.id)
+        pagecache.changed(scopes=(pagecache.PROFILES,))
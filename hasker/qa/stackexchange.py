@@ -0,0 +1,452 @@
+""" Resumable import of a Stack Exchange data dump (Users, Tags, Posts and Votes XML) """
+import datetime
+import html
+import logging
+import os
+import re
+import resource
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from typing import Iterator
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import Profile
+
+from . import pagecache, search, trending
+from . import tags as tag_lookup
+from .models import Answer, AnswerVote, ImportProgress, Question, QuestionVote, Tag
+
+logger = logging.getLogger(__name__)
+
+# stages of an import in order, each one commits its position after every batch
+STAGES = ("users", "tags", "posts", "accepted", "votes", "finish", "done")
+
+FILES = {
+    "users": "Users.xml",
+    "tags": "Tags.xml",
+    "posts": "Posts.xml",
+    "accepted": "Posts.xml",
+    "votes": "Votes.xml",
+}
+
+QUESTION_POST = "1"
+ANSWER_POST = "2"
+
+# VoteTypeId of up and down votes, other types (favorites, bounties,
+# close votes...) have no counterpart
+VOTE_TYPES = {"2": 1, "3": -1}
+
+# Stack Exchange user ids start at -1 (the Community user), a user row id
+# is the dump id + user_offset + USER_ID_SHIFT so that it is always positive
+USER_ID_SHIFT = 2
+
+DELETED_USER = "deleted"
+
+# "<c#><linux>" in older dumps, "|c#|linux|" in newer ones
+TAG_NAMES = re.compile(r"[^<>|]+")
+
+# bodies are sanitized HTML, a tag never contains ">"; five times faster
+# than django.utils.html.strip_tags, the text is escaped when rendered anyway
+HTML_TAG = re.compile(r"<[^>]*>")
+
+
+def rows(path: str) -> Iterator[dict]:
+    """
+    Attributes of the <row> elements of a dump file, parsed incrementally:
+    every element is cleared and dropped from the root once it is read,
+    so memory does not grow with the size of the file
+    """
+    root = None
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if root is None:
+            root = element
+        elif event == "end" and element.tag == "row":
+            # a copy, clear() empties the attributes
+            yield dict(element.attrib)
+            element.clear()
+            root.clear()
+
+
+def parse_date(value: str) -> datetime.datetime:
+    """ Dump dates are UTC without a time zone """
+    return datetime.datetime.fromisoformat(value).replace(tzinfo=datetime.timezone.utc)
+
+
+def plain_text(body: str) -> str:
+    """ Text of a post body, which is HTML in the dump """
+    return html.unescape(HTML_TAG.sub("", body)).strip()
+
+
+def peak_memory() -> int:
+    """ Peak resident memory of the process in bytes """
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _sequence_position(model) -> int:
+    """ The largest id of the table or its sequence, ids above it are free """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT GREATEST("
+            f"(SELECT MAX(id) FROM {connection.ops.quote_name(table)}), "
+            f"pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass), 0)",
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def _advance_sequence(model) -> None:
+    """ Move the sequence after ids written explicitly, so that new rows do not collide """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST("
+            f"(SELECT MAX(id) FROM {connection.ops.quote_name(table)}), "
+            f"pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass), 1))",
+            [table, table],
+        )
+
+
+def _existing(model, ids: set) -> set:
+    """ The ids that are rows of the model table, one query """
+    if not ids:
+        return set()
+    return set(model.objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+
+class Importer:
+    """
+    Imports one dump directory into users, tags, questions, answers and votes.
+
+    Dump ids are mapped to row ids by offsets fixed when the import starts
+    (the largest ids of the tables at that time), so that no mapping is held
+    in memory and answers, accepted answers and votes find their rows by
+    arithmetic. Rows are written with COPY in batches; every batch commits
+    together with the position of the import, so an interrupted import
+    continues after its last committed batch and writes every row once.
+    The database should not get other writes during an import.
+
+    Scores are the sums of the imported votes, as everywhere (see
+    recount_scores). Score of the dump is not used: it also counts the
+    anonymous votes, which have no rows.
+    """
+
+    def __init__(self, path: str, name: str = None, batch_size: int = 10000,
+                 username_prefix: str = "se_"):
+        """
+        :param path: directory with the XML files of the dump
+        :param name: name of the import progress, the directory name by default
+        :param batch_size: rows per COPY and transaction
+        :param username_prefix: usernames are this prefix and the dump user id
+        """
+        self.path = path
+        self.name = name or os.path.basename(os.path.normpath(path))
+        self.batch_size = batch_size
+        self.username_prefix = username_prefix
+        self.counts = Counter()
+        self.skipped = Counter()
+        self.read = 0
+        self.started = time.monotonic()
+        self._tag_ids = None
+        self._deleted_user_id = None
+
+    @property
+    def seconds(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def load_progress(self, restart: bool = False) -> ImportProgress:
+        """
+        Progress of the import of this name, a new one on the first run or
+        with `restart`. A new import needs a username prefix no user has:
+        usernames are the prefix and the dump ids, the users of an earlier
+        import would collide with the new ones.
+        """
+        progress = None if restart else ImportProgress.objects.filter(name=self.name).first()
+        if progress is None:
+            if User.objects.filter(username__startswith=self.username_prefix).exists():
+                raise ValueError(
+                    f"Users named {self.username_prefix}* exist, imported earlier: "
+                    f"start the import with another username prefix"
+                )
+            ImportProgress.objects.filter(name=self.name).delete()
+            progress = ImportProgress.objects.create(
+                name=self.name,
+                user_offset=_sequence_position(User),
+                question_offset=_sequence_position(Question),
+                answer_offset=_sequence_position(Answer),
+                stage=STAGES[0],
+            )
+        return progress
+
+    def user_id(self, dump_id) -> int:
+        return self.progress.user_offset + int(dump_id) + USER_ID_SHIFT
+
+    def question_id(self, dump_id) -> int:
+        return self.progress.question_offset + int(dump_id)
+
+    def answer_id(self, dump_id) -> int:
+        return self.progress.answer_offset + int(dump_id)
+
+    def copy(self, model, columns: list, values: list) -> None:
+        """ Write rows of column values with one COPY """
+        if not values:
+            return
+        names = ", ".join(connection.ops.quote_name(column) for column in columns)
+        sql = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({names}) FROM STDIN"
+        with connection.cursor() as cursor:
+            # the psycopg cursor under Django's wrapper
+            with cursor.cursor.copy(sql) as copy:
+                for row in values:
+                    copy.write_row(row)
+        self.counts[model._meta.label] += len(values)
+
+    def batches(self, stage: str) -> Iterator[list]:
+        """ Rows of the stage file after the committed position, in batches """
+        batch = []
+        for row in rows(os.path.join(self.path, FILES[stage])):
+            # dump ids start at -1, None is before all of them
+            if self.progress.position is not None and int(row["Id"]) <= self.progress.position:
+                # passed over, not counted in the rows read and their rate
+                self.skipped["rows imported before"] += 1
+                continue
+            self.read += 1
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run_stage(self, stage: str, write, report=None) -> None:
+        """ Write the batches of a stage, each one in a transaction with its position """
+        path = os.path.join(self.path, FILES[stage])
+        if not os.path.exists(path):
+            if stage == "posts":
+                raise FileNotFoundError(path)
+            logger.info("%s not found, %s skipped", path, stage)
+            return
+        for batch in self.batches(stage):
+            with transaction.atomic():
+                write(batch)
+                self.progress.position = int(batch[-1]["Id"])
+                self.progress.save(update_fields=["position"])
+            if report:
+                report(self)
+
+    def write_users(self, batch: list) -> None:
+        users = []
+        for row in batch:
+            users.append((
+                self.user_id(row["Id"]), "!", False, f"{self.username_prefix}{row['Id']}",
+                row.get("DisplayName", "")[:150], "", "", False, True, parse_date(row["CreationDate"]),
+            ))
+        self.copy(User, [
+            "id", "password", "is_superuser", "username", "first_name", "last_name",
+            "email", "is_staff", "is_active", "date_joined",
+        ], users)
+        # COPY does not send post_save, profiles are written here
+        self.copy(Profile, ["user_id", "avatar_source", "avatar_variants"],
+                  [(user[0], "", "") for user in users])
+        _advance_sequence(User)
+
+    def tag_ids(self, names: set) -> list:
+        """ Ids of the tags of the names, missing tags are created """
+        if self._tag_ids is None:
+            self._tag_ids = {
+                name.lower(): pk for pk, name in Tag.objects.values_list("pk", "tag_text")}
+        missing = {name for name in names if name.lower() not in self._tag_ids}
+        if missing:
+            with connection.cursor() as cursor:
+                # ON CONFLICT: the case-insensitive constraint may know a name
+                # in another case
+                cursor.execute(
+                    f"INSERT INTO {connection.ops.quote_name(Tag._meta.db_table)} (tag_text, usage) "
+                    f"SELECT unnest(%s::text[]), 0 ON CONFLICT DO NOTHING RETURNING id, tag_text",
+                    [sorted(missing)],
+                )
+                created = cursor.fetchall()
+            self.counts[Tag._meta.label] += len(created)
+            self._tag_ids.update((name.lower(), pk) for pk, name in created)
+        return [self._tag_ids[name.lower()] for name in names if name.lower() in self._tag_ids]
+
+    def write_tags(self, batch: list) -> None:
+        self.tag_ids({row["TagName"] for row in batch})
+
+    def deleted_user_id(self) -> int:
+        """ Author of the posts whose owners are not in the dump """
+        if self._deleted_user_id is None:
+            user, _ = User.objects.get_or_create(
+                username=f"{self.username_prefix}{DELETED_USER}", defaults={"password": "!"})
+            self._deleted_user_id = user.pk
+        return self._deleted_user_id
+
+    def authors(self, batch: list) -> dict:
+        """ Row id of the author of every post of the batch """
+        owners = {row["Id"]: self.user_id(row["OwnerUserId"]) for row in batch if "OwnerUserId" in row}
+        existing = _existing(User, set(owners.values()))
+        return {
+            row["Id"]: owners[row["Id"]] if owners.get(row["Id"]) in existing else self.deleted_user_id()
+            for row in batch
+        }
+
+    def write_posts(self, batch: list) -> None:
+        authors = self.authors(batch)
+        questions, links = [], []
+        for row in batch:
+            if row["PostTypeId"] != QUESTION_POST:
+                continue
+            question_id = self.question_id(row["Id"])
+            questions.append((
+                question_id, plain_text(row.get("Body", "")), authors[row["Id"]],
+                parse_date(row["CreationDate"]), 0,
+                html.unescape(row.get("Title", ""))[:200], int(row.get("ViewCount", 0)),
+            ))
+            names = dict.fromkeys(TAG_NAMES.findall(row.get("Tags", "")))
+            links.extend((question_id, tag_id) for tag_id in self.tag_ids(names))
+        self.copy(Question, ["id", "text", "author_id", "created", "score", "title", "views"], questions)
+        self.copy(Question.tags.through, ["question_id", "tag_id"], links)
+
+        # answers of deleted questions are not in the dump
+        answer_rows = [row for row in batch if row["PostTypeId"] == ANSWER_POST]
+        parents = _existing(Question, {self.question_id(row["ParentId"]) for row in answer_rows})
+        answers = []
+        for row in answer_rows:
+            question_id = self.question_id(row["ParentId"])
+            if question_id not in parents:
+                self.skipped["answers of missing questions"] += 1
+                continue
+            answers.append((
+                self.answer_id(row["Id"]), plain_text(row.get("Body", "")), authors[row["Id"]],
+                parse_date(row["CreationDate"]), 0, question_id,
+            ))
+        self.copy(Answer, ["id", "text", "author_id", "created", "score", "question_id"], answers)
+        self.skipped["other posts"] += len(batch) - len(questions) - len(answer_rows)
+        _advance_sequence(Question)
+        _advance_sequence(Answer)
+
+    def write_accepted(self, batch: list) -> None:
+        """ Second pass: accepted answers are later in the file than their questions """
+        pairs = [
+            (self.question_id(row["Id"]), self.answer_id(row["AcceptedAnswerId"]))
+            for row in batch if row["PostTypeId"] == QUESTION_POST and "AcceptedAnswerId" in row
+        ]
+        if not pairs:
+            return
+        values = ", ".join(["(%s::bigint, %s::bigint)"] * len(pairs))
+        questions = connection.ops.quote_name(Question._meta.db_table)
+        answers = connection.ops.quote_name(Answer._meta.db_table)
+        with connection.cursor() as cursor:
+            # accepted answers that are not in the dump are left out by the join
+            cursor.execute(
+                f"UPDATE {questions} q SET correct_answer_id = accepted.answer_id "
+                f"FROM (VALUES {values}) AS accepted (question_id, answer_id) "
+                f"JOIN {answers} a ON a.id = accepted.answer_id "
+                f"WHERE q.id = accepted.question_id AND a.question_id = q.id",
+                [value for pair in pairs for value in pair],
+            )
+            self.counts["accepted answers"] += cursor.rowcount
+
+    def write_votes(self, batch: list) -> None:
+        votes = [row for row in batch if row["VoteTypeId"] in VOTE_TYPES]
+        self.skipped["other votes"] += len(batch) - len(votes)
+        # public dumps do not tell who voted up or down, such votes are
+        # already in the post scores
+        anonymous = [row for row in votes if "UserId" not in row]
+        self.skipped["anonymous votes"] += len(anonymous)
+        votes = [row for row in votes if "UserId" in row]
+        if not votes:
+            return
+        users = _existing(User, {self.user_id(row["UserId"]) for row in votes})
+        questions = _existing(Question, {self.question_id(row["PostId"]) for row in votes})
+        answers = _existing(Answer, {self.answer_id(row["PostId"]) for row in votes})
+        question_votes, answer_votes = {}, {}
+        for row in votes:
+            user_id = self.user_id(row["UserId"])
+            if user_id not in users:
+                self.skipped["votes of missing users"] += 1
+            elif self.question_id(row["PostId"]) in questions:
+                question_votes[user_id, self.question_id(row["PostId"])] = VOTE_TYPES[row["VoteTypeId"]]
+            elif self.answer_id(row["PostId"]) in answers:
+                answer_votes[user_id, self.answer_id(row["PostId"])] = VOTE_TYPES[row["VoteTypeId"]]
+            else:
+                self.skipped["votes of missing posts"] += 1
+        # a user votes for a post once: within a batch the last vote of the
+        # dump is kept, a vote of an earlier batch is kept over later ones
+        self.insert_votes(QuestionVote, question_votes)
+        self.insert_votes(AnswerVote, answer_votes)
+
+    def insert_votes(self, model, votes: dict) -> None:
+        """
+        Write {(user id, post id): vote} and add the written votes to the
+        scores of the posts; votes that exist already are skipped and not counted
+        """
+        if not votes:
+            return
+        voted = model._meta.get_field(model.voted_field)
+        fk = connection.ops.quote_name(voted.column)
+        (user_ids, post_ids), values = zip(*votes), list(votes.values())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH written AS ("
+                f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} (user_id, {fk}, vote) "
+                f"SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::int[]) "
+                f"ON CONFLICT DO NOTHING RETURNING {fk} AS post_id, vote"
+                f"), scored AS ("
+                f"UPDATE {connection.ops.quote_name(voted.related_model._meta.db_table)} p "
+                f"SET score = p.score + totals.score "
+                f"FROM (SELECT post_id, SUM(vote) AS score FROM written GROUP BY post_id) totals "
+                f"WHERE p.id = totals.post_id"
+                f") SELECT COUNT(*) FROM written",
+                [list(user_ids), list(post_ids), values],
+            )
+            written = cursor.fetchone()[0]
+        self.counts[model._meta.label] += written
+        self.skipped["repeated votes"] += len(votes) - written
+
+    def finish(self, index: bool = True) -> None:
+        """ What COPY skipped: signals of tag usage, search index and caches """
+        tag_lookup.recount_usage()
+        with connection.cursor() as cursor:
+            for model in (User, Question, Question.tags.through, Answer, QuestionVote, AnswerVote, Tag):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        if index:
+            search.get_backend().rebuild()
+            trending.refresh()
+        pagecache.touch(pagecache.SITE, pagecache.SIDEBAR, pagecache.PROFILES, pagecache.TAGS)
+
+    def run(self, restart: bool = False, index: bool = True, report=None) -> Counter:
+        """
+        Import the dump or continue an interrupted import
+        :param restart: forget the progress of a previous import of the same name
+        :param index: rebuild the search index and trending ranking at the end
+        :param report: called with the importer after each batch
+        :return: number of written rows per model
+        """
+        self.progress = self.load_progress(restart)
+        writers = {
+            "users": self.write_users,
+            "tags": self.write_tags,
+            "posts": self.write_posts,
+            "accepted": self.write_accepted,
+            "votes": self.write_votes,
+        }
+        while self.progress.stage != "done":
+            stage = self.progress.stage
+            if stage == "finish":
+                self.finish(index)
+                self.progress.finished = timezone.now()
+            else:
+                self.run_stage(stage, writers[stage], report)
+            self.progress.stage = STAGES[STAGES.index(stage) + 1]
+            self.progress.position = None
+            self.progress.save()
+        return self.counts
@@ -0,0 +1,59 @@
+// Live updates from the event stream in data-live-url of <body> (qa.live):
+// vote scores and new answers of the question page, the trending sidebar.
+document.addEventListener("DOMContentLoaded", function () {
+    var url = document.body.dataset.liveUrl;
+    if (!url || !window.EventSource) {
+        return;
+    }
+    var source = new EventSource(url);
+    var notice = document.querySelector("[data-live-notice]");
+    var newAnswers = 0;
+
+    function showNotice(text) {
+        if (!notice) {
+            return;
+        }
+        var reload = document.createElement("a");
+        reload.href = "";
+        reload.textContent = "Reload";
+        notice.replaceChildren(text + " ", reload);
+        notice.hidden = false;
+    }
+
+    source.addEventListener("score", function (event) {
+        var data = JSON.parse(event.data);
+        var key = data.answer ? "answer:" + data.answer : "question:" + data.question;
+        document.querySelectorAll('[data-live-score="' + key + '"]').forEach(function (element) {
+            element.textContent = data.score;
+        });
+    });
+
+    source.addEventListener("answer", function () {
+        newAnswers += 1;
+        showNotice(newAnswers === 1 ? "A new answer was posted." : newAnswers + " new answers were posted.");
+    });
+
+    // events were dropped for this page, only a reload shows the current state
+    source.addEventListener("reset", function () {
+        showNotice("This page is out of date.");
+    });
+
+    // the whole shown ranking: [id, title, score, url]
+    source.addEventListener("trending", function (event) {
+        var list = document.querySelector("[data-live-trending]");
+        if (!list) {
+            return;
+        }
+        list.replaceChildren.apply(list, JSON.parse(event.data).questions.map(function (question) {
+            var item = document.createElement("li");
+            var score = document.createElement("span");
+            score.className = "badge bg-secondary";
+            score.textContent = question[2];
+            var link = document.createElement("a");
+            link.href = question[3];
+            link.textContent = question[1];
+            item.append(score, " ", link);
+            return item;
+        }));
+    });
+});
@@ -0,0 +1,47 @@
+// Suggestions for comma-separated tag inputs (class "tag-autocomplete"),
+// fetched from the url in data-autocomplete-url for the tag being typed.
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("input.tag-autocomplete").forEach(function (input) {
+        var list = document.createElement("datalist");
+        list.id = input.id + "_suggestions";
+        input.setAttribute("list", list.id);
+        input.after(list);
+
+        var timer = null;
+        var lastPrefix = null;
+
+        function suggest() {
+            var parts = input.value.split(",");
+            var prefix = parts.pop().trim();
+            if (prefix === lastPrefix) {
+                return;
+            }
+            lastPrefix = prefix;
+            list.replaceChildren();
+            if (!prefix) {
+                return;
+            }
+            // the whole value is completed, the tags typed before are kept
+            var head = parts.map(function (part) { return part.trim(); }).filter(Boolean);
+            var url = input.dataset.autocompleteUrl + "?q=" + encodeURIComponent(prefix);
+            fetch(url, {headers: {"Accept": "application/json"}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (prefix !== lastPrefix) {
+                        return;
+                    }
+                    list.replaceChildren.apply(list, data.results.map(function (tag) {
+                        var option = document.createElement("option");
+                        option.value = head.concat([tag.name]).join(", ");
+                        option.label = tag.name + " (" + tag.questions + ")";
+                        return option;
+                    }));
+                });
+        }
+
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(suggest, 150);
+        });
+    });
+});
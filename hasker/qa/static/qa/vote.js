@@ -0,0 +1,52 @@
+// Vote buttons (links with data-vote-url) vote with one POST and update
+// the score in place; without this script the links vote and redirect.
+document.addEventListener("DOMContentLoaded", function () {
+    function csrfToken() {
+        var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    document.addEventListener("click", function (event) {
+        var link = event.target.closest("a[data-vote-url]");
+        var token = csrfToken();
+        if (!link || !token || !window.fetch) {
+            return;
+        }
+        event.preventDefault();
+        if (link.dataset.voting) {
+            return;
+        }
+        link.dataset.voting = "1";
+        var body = new FormData();
+        body.append("vote", link.dataset.vote);
+        fetch(link.dataset.voteUrl, {
+            method: "POST",
+            headers: {"Accept": "application/json", "X-CSRFToken": token},
+            body: body,
+            credentials: "same-origin",
+        })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                var key = link.dataset.voteFor;
+                document.querySelectorAll('[data-live-score="' + key + '"]').forEach(function (element) {
+                    element.textContent = data.score;
+                });
+                // the button of the user's vote is shown pressed, none after a revoke
+                document.querySelectorAll('a[data-vote-for="' + key + '"]').forEach(function (button) {
+                    button.classList.toggle("active", Number(button.dataset.vote) === data.vote);
+                });
+            })
+            .catch(function () {
+                // the page flow still works: vote by the link
+                window.location = link.href;
+            })
+            .finally(function () {
+                delete link.dataset.voting;
+            });
+    });
+});
@@ -0,0 +1,172 @@
+""" Tag lookups by name, tag combinations, tag usage counts and the tag cloud """
+import math
+
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce, Lower
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from . import pagecache
+from .models import Question, Tag
+
+CLOUD_KEY = "qa:tag_cloud:{stamp!r}"
+
+# font size steps of the tag cloud
+CLOUD_WEIGHTS = 5
+
+
+def by_lower_name() -> QuerySet:
+    """ Tags with `name_lower`, the expression of the prefix index and unique constraint """
+    return Tag.objects.annotate(name_lower=Lower("tag_text"))
+
+
+def autocomplete(prefix: str, limit: int) -> list:
+    """
+    Most used tags starting with `prefix` (case-insensitive), found by
+    the tag_text_lower_prefix_idx index
+    :return: list of (tag name, number of questions)
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return []
+    return list(
+        by_lower_name().filter(
+            name_lower__startswith=prefix
+        ).order_by("-usage", "name_lower").values_list("tag_text", "usage")[:limit]
+    )
+
+
+def _found(lowered: dict, tags: list) -> tuple:
+    found = {tag.name_lower: tag for tag in tags}
+    return (
+        [found[key] for key in lowered if key in found],
+        [name for key, name in lowered.items() if key not in found],
+    )
+
+
+def find(names: list) -> tuple:
+    """
+    Tags of the names in one query, names are matched case-insensitively
+    :return: found tags in the order of `names`, names that are not tags
+    """
+    lowered = {name.lower(): name for name in names}
+    return _found(lowered, by_lower_name().filter(name_lower__in=lowered))
+
+
+async def afind(names: list) -> tuple:
+    """ find() for async views """
+    lowered = {name.lower(): name for name in names}
+    return _found(lowered, [tag async for tag in by_lower_name().filter(name_lower__in=lowered)])
+
+
+def question_tag_names() -> ArraySubquery:
+    """ Array of the tag names of the outer question, to read tags without a prefetch query """
+    return ArraySubquery(Question.tags.through.objects.filter(
+        question=OuterRef("pk")
+    ).order_by("tag__tag_text").values("tag__tag_text"))
+
+
+def tagged(questions: QuerySet, included: list, excluded: list = ()) -> QuerySet:
+    """
+    Questions having all `included` tags and none of `excluded`. Every tag
+    is one (NOT) EXISTS over the join table, the planner starts from the
+    rarest tag through the (tag_id, question_id) index and checks the
+    others through (question_id, tag_id); ordering and pagination stay in
+    the same query.
+    :param included: Tag objects or ids
+    :param excluded: Tag objects or ids
+    """
+    links = Question.tags.through.objects.order_by()
+    for tag in included:
+        questions = questions.filter(Exists(links.filter(question=OuterRef("pk"), tag=tag)))
+    if excluded:
+        questions = questions.exclude(
+            Exists(links.filter(question=OuterRef("pk"), tag__in=list(excluded))))
+    return questions
+
+
+def _split(included: list, excluded: list, found: list, unknown: list) -> tuple:
+    included_lower = {name.lower() for name in included}
+    excluded_lower = {name.lower() for name in excluded}
+    return (
+        [tag for tag in found if tag.name_lower in included_lower],
+        [tag for tag in found if tag.name_lower in excluded_lower],
+        [name for name in unknown if name.lower() in included_lower],
+    )
+
+
+def resolve(included: list, excluded: list) -> tuple:
+    """
+    Tags of the included and excluded names in one query
+    :return: included tags, excluded tags, included names that are not tags;
+        excluded names that are not tags are dropped, they exclude nothing
+    """
+    return _split(included, excluded, *find([*included, *excluded]))
+
+
+async def aresolve(included: list, excluded: list) -> tuple:
+    """ resolve() for async views """
+    return _split(included, excluded, *await afind([*included, *excluded]))
+
+
+def page_url(included: list, excluded: list = ()) -> str:
+    """ Url of the questions with all `included` tags and none of `excluded` """
+    url = reverse("qa:tag_detail", args=(included[0],))
+    params = [("tag", name) for name in included[1:]] + [("exclude", name) for name in excluded]
+    return f"{url}?{urlencode(params)}" if params else url
+
+
+def change_usage(tags: QuerySet, delta) -> int:
+    """
+    Add `delta` to the usage of the tags with one UPDATE; relative updates
+    of concurrent transactions do not overwrite each other
+    """
+    return tags.update(usage=F("usage") + delta)
+
+
+def recount_usage(dry_run: bool = False) -> int:
+    """
+    Recompute usage of every tag whose stored count has drifted from its
+    questions, with one set-based UPDATE
+    :param dry_run: only count drifted tags, do not update them
+    :return: number of drifted tags
+    """
+    links = Question.tags.through.objects.filter(
+        tag=OuterRef("pk")
+    ).order_by().values("tag").annotate(total=Count("*")).values("total")
+    actual_usage = Coalesce(Subquery(links), 0)
+
+    drifted = Tag.objects.alias(actual_usage=actual_usage).exclude(usage=F("actual_usage"))
+    if dry_run:
+        return drifted.count()
+    return drifted.update(usage=actual_usage)
+
+
+def cloud(size: int = None) -> list:
+    """
+    The most used tags in alphabetical order with a font weight from 1 to
+    CLOUD_WEIGHTS on a logarithmic scale. Cached until tags change.
+    :return: list of dicts with name, usage and weight
+    """
+    size = size or settings.TAG_CLOUD_SIZE
+    key = CLOUD_KEY.format(stamp=pagecache.last_modified([pagecache.TAGS]))
+    entries = cache.get(key)
+    if entries is None:
+        top = list(Tag.objects.filter(usage__gt=0).order_by("-usage", "tag_text").values_list(
+            "tag_text", "usage")[:size])
+        low, high = (math.log(top[-1][1]), math.log(top[0][1])) if top else (0, 0)
+        entries = sorted((
+            {
+                "name": name,
+                "usage": usage,
+                "weight": 1 + round((CLOUD_WEIGHTS - 1) * (math.log(usage) - low) / (high - low))
+                if high > low else 1,
+            }
+            for name, usage in top
+        ), key=lambda entry: entry["name"].lower())
+        # a change of tags changes the key, old clouds expire
+        cache.set(key, entries, settings.PAGE_CACHE_TIMEOUT)
+    return entries
@@ -1,13 +1,85 @@
 from django import template
 from django.conf import settings
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
 
-from ..models import Question
+from .. import fragments, live, routers, search, trending
 
 register = template.Library()
 
 
 @register.simple_tag
 def top_questions():
-    """ Trending questions queryset """
-    questions = sorted(Question.objects.all(), key=lambda a: -a.votes_count)[:settings.TRENDING_COUNT]
-    return questions
+    """ Trending questions from the cached hotness ranking, rebuilt from a replica """
+    with routers.replica_reads():
+        return trending.top_questions()
+
+
+@register.simple_tag(takes_context=True)
+def live_url(context):
+    """ Event stream of the page (qa.live), empty where hasker/asgi.py does not serve it """
+    if not settings.ASYNC_VIEWS:
+        return ""
+    question = context.get("question")
+    return live.stream_url(getattr(question, "id", None))
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor):
+    """ Current url with the page cursor replaced, other parameters (e.g. `q`) are kept """
+    params = context["request"].GET.copy()
+    params["cursor"] = cursor
+    params.pop("page", None)
+    return "?" + params.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def sort_url(context, sort):
+    """ Current url ordered by `sort`, from the first page """
+    params = context["request"].GET.copy()
+    params["sort"] = sort
+    params.pop("cursor", None)
+    params.pop("page", None)
+    return "?" + params.urlencode()
+
+
+@register.filter
+def highlight(snippet):
+    """ Escape a search snippet and wrap the matches into <mark> """
+    html = escape(snippet)
+    html = html.replace(search.HIGHLIGHT_START, "<mark>").replace(search.HIGHLIGHT_STOP, "</mark>")
+    return mark_safe(html)
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, obj):
+        self.nodelist = nodelist
+        self.obj = obj
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        cached = getattr(obj, "cached_fragment", None)
+        if cached is not None:
+            return cached
+        html = self.nodelist.render(context)
+        key = getattr(obj, "fragment_key", None)
+        if key:
+            fragments.store(key, html)
+        return html
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Cached part of a page rendered for one object:
+    {% fragment question %}...{% endfragment %}
+    The object is prepared by qa.fragments.prepare(), objects that were
+    not prepared are rendered every time.
+    """
+    try:
+        _, obj = token.split_contents()
+    except ValueError:
+        raise template.TemplateSyntaxError("fragment tag requires exactly one object") from None
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(obj))
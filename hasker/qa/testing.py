@@ -0,0 +1,41 @@
+""" Test helpers: query budgets for views and other database code """
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting that code stays within a number of queries
+    and that the number does not grow with the amount of data shown
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int, using: str = DEFAULT_DB_ALIAS):
+        """ Fail when the block runs more than `budget` queries """
+        with CaptureQueriesContext(connections[using]) as queries:
+            yield queries
+        if len(queries) > budget:
+            self.fail(
+                f"{len(queries)} queries executed, budget is {budget}:\n"
+                + "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(queries, start=1))
+            )
+
+    def assertConstantQueries(self, func, grow, budget: int, using: str = DEFAULT_DB_ALIAS) -> int:
+        """
+        Run `func`, call `grow` to add data, run `func` again: both runs
+        must execute the same number of queries, within `budget`
+        :return: the number of queries
+        """
+        with self.assertQueryBudget(budget, using) as before:
+            func()
+        grow()
+        with self.assertQueryBudget(budget, using) as after:
+            func()
+        if len(before) != len(after):
+            self.fail(
+                f"Number of queries grows with data: {len(before)} before, {len(after)} after:\n"
+                + "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(after, start=1))
+            )
+        return len(after)
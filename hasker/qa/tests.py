@@ -1,10 +1,49 @@
+import asyncio
+import contextlib
+import csv
 import datetime
+import gzip
+import importlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
-from django.urls import reverse
+from django.urls import clear_url_caches, resolve, reverse
 
-from .models import Question
+from hasker import urls as hasker_urls
+from . import (
+    async_views, benchmark, counters, export, fragments, live, loadtest, notifications, pagecache,
+    routers, search, stackexchange, tags, trending, urls,
+)
+from .api import resources
+from .search import memory, postgres
+from .models import (
+    Answer, AnswerVote, ImportProgress, Notification, PageVisits, Question, QuestionVote, Tag,
+    VoteStatus,
+)
+from .pagination import NEXT, CursorPaginator, encode_cursor
+from .seed import CopySeeder, Seeder
+from .testing import QueryBudgetMixin
+from .forms import QuestionForm
+from .views import QuestionDetailView, QuestionListView
 
 
 class QuestionModelTests(TestCase):
@@ -36,6 +75,13 @@ class QuestionModelTests(TestCase):
         self.assertIs(recent_question.was_created_recently(), True)
 
 
+def tearDownModule():
+    # visits and views counted by the tests are not flushed at exit
+    # into the development database
+    counters.visits.clear()
+    counters.views.clear()
+
+
 def create_question(text, days):
     """
     Create a question with the given `text` and created the
@@ -123,4 +169,2261 @@ class QuestionDetailViewTests(TestCase):
         past_question = create_question(text="Past Question.", days=-5)
         url = reverse("qa:question_detail", args=(past_question.id,))
         response = self.client.get(url)
-        self.assertContains(response, past_question.text)
\ No newline at end of file
+        self.assertContains(response, past_question.text)
+
+
+def create_user(username):
+    """ Create a user with a fixed password """
+    return User.objects.create_user(username=username, password="password")
+
+
+def create_authored_question(title, author, days=0):
+    """ Create a question by `author` created `days` offset to now """
+    time = timezone.now() + datetime.timedelta(days=days)
+    return Question.objects.create(title=title, text=title, author=author, created=time)
+
+
+class VoteScoreTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.voter = create_user("voter")
+        self.question = create_authored_question("Scored question", self.author)
+
+    def test_like_dislike_and_revoke_update_score(self):
+        """
+        Stored score follows like, switch to dislike and revoke.
+        """
+        self.question.do_vote(user=self.voter, current_vote=VoteStatus.LIKE)
+        self.assertEqual(self.question.score, 1)
+        self.question.do_vote(user=self.voter, current_vote=VoteStatus.DISLIKE)
+        self.assertEqual(self.question.score, -1)
+        self.question.do_vote(user=self.voter, current_vote=VoteStatus.DISLIKE)
+        self.assertEqual(self.question.score, 0)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.votes_count, 0)
+
+    def test_answer_score(self):
+        """
+        Answers keep their own score.
+        """
+        answer = Answer.objects.create(
+            text="Answer", author=self.author, question=self.question)
+        answer.do_vote(user=self.voter, current_vote=VoteStatus.LIKE)
+        answer.refresh_from_db()
+        self.question.refresh_from_db()
+        self.assertEqual(answer.score, 1)
+        self.assertEqual(self.question.score, 0)
+
+    def test_recount_scores_fixes_drift(self):
+        """
+        recount_scores command restores scores that differ from the votes sum.
+        """
+        QuestionVote.objects.create(
+            user=self.voter, question=self.question, vote=VoteStatus.LIKE)
+        out = StringIO()
+        call_command("recount_scores", stdout=out)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.score, 1)
+        self.assertIn("Fixed 1 drifted question score(s)", out.getvalue())
+
+    def test_index_ordered_by_score(self):
+        """
+        The index lists questions by score, newest first on ties.
+        """
+        older = create_authored_question("Older", self.author, days=-2)
+        newer = create_authored_question("Newer", self.author, days=-1)
+        older.do_vote(user=self.voter, current_vote=VoteStatus.LIKE)
+        response = self.client.get(reverse("qa:index"))
+        self.assertEqual(
+            list(response.context["questions"]),
+            [older, self.question, newer],
+        )
+
+
+class VoteEngineTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.voter = create_user("voter")
+        self.question = create_authored_question("Voted question", self.author)
+
+    def test_vote_result(self):
+        """
+        apply() returns the vote state, score delta and new score.
+        """
+        result = QuestionVote.apply(self.voter.id, self.question.id, VoteStatus.LIKE)
+        self.assertEqual(tuple(result), (1, 1, 1))
+        result = QuestionVote.apply(self.voter.id, self.question.id, VoteStatus.DISLIKE)
+        self.assertEqual(tuple(result), (-1, -2, -1))
+        result = QuestionVote.apply(self.voter.id, self.question.id, VoteStatus.DISLIKE)
+        self.assertEqual(tuple(result), (0, 1, 0))
+        self.assertFalse(QuestionVote.objects.exists())
+
+    def test_vote_is_one_statement(self):
+        """
+        A vote costs a single query.
+        """
+        answer = Answer.objects.create(
+            text="Answer", author=self.author, question=self.question)
+        with self.assertNumQueries(1):
+            answer.do_vote(user=self.voter, current_vote=VoteStatus.LIKE)
+        self.assertEqual(answer.score, 1)
+        self.assertEqual(AnswerVote.objects.get().vote, VoteStatus.LIKE)
+
+
+class ConcurrentVoteTests(TransactionTestCase):
+    """ Many parallel voters on one hot question """
+    voters_count = 16
+    clicks_per_voter = 5
+
+    def setUp(self):
+        self.author = create_user("author")
+        self.voters = [create_user(f"voter{i}") for i in range(self.voters_count)]
+        self.question = create_authored_question("Hot question", self.author)
+
+    def run_in_threads(self, targets):
+        """ Start all targets at once and re-raise the first error """
+        barrier = threading.Barrier(len(targets))
+        errors = []
+
+        def worker(target):
+            try:
+                barrier.wait()
+                target()
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def assert_score_matches_votes(self):
+        self.question.refresh_from_db()
+        votes_sum = self.question.votes.aggregate(total=Sum("vote"))["total"] or 0
+        self.assertEqual(self.question.score, votes_sum)
+        return votes_sum
+
+    def test_parallel_voters(self):
+        """
+        Every voter's clicks are applied and the score equals the votes sum.
+        """
+        def clicks(voter, vote):
+            def target():
+                for _ in range(self.clicks_per_voter):
+                    QuestionVote.apply(voter.id, self.question.id, vote)
+            return target
+
+        self.run_in_threads([
+            clicks(voter, VoteStatus.LIKE if i % 4 else VoteStatus.DISLIKE)
+            for i, voter in enumerate(self.voters)
+        ])
+
+        # an odd number of the same clicks leaves the vote in place
+        likes = sum(1 for i in range(self.voters_count) if i % 4)
+        dislikes = self.voters_count - likes
+        self.assertEqual(self.assert_score_matches_votes(), likes - dislikes)
+
+    def test_same_user_double_clicks(self):
+        """
+        Racing clicks of one user never break the unique constraint or the score.
+        """
+        voter = self.voters[0]
+        self.run_in_threads([
+            lambda vote=vote: QuestionVote.apply(voter.id, self.question.id, vote)
+            for vote in [VoteStatus.LIKE, VoteStatus.DISLIKE] * 4
+        ])
+
+        self.assertLessEqual(self.question.votes.count(), 1)
+        self.assertIn(self.assert_score_matches_votes(), (-1, 0, 1))
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        self.voter = create_user("voter")
+
+    def test_hotness_decays_with_age(self):
+        """
+        The same votes weigh less on an older question.
+        """
+        now = timezone.now()
+        fresh = trending.hotness(5, 1, now - datetime.timedelta(hours=1), now)
+        old = trending.hotness(5, 1, now - datetime.timedelta(days=3), now)
+        self.assertGreater(fresh, old)
+
+    def test_sidebar_served_from_cache(self):
+        """
+        Only a cold cache costs a query.
+        """
+        question = create_authored_question("Trending", self.author, days=-1)
+        with self.assertNumQueries(1):
+            self.assertEqual(trending.top_questions()[0]["id"], question.id)
+        with self.assertNumQueries(0):
+            trending.top_questions()
+
+    def test_vote_and_answer_update_ranking(self):
+        """
+        Votes and answers re-rank the cached ranking without a full refresh.
+        """
+        older = create_authored_question("Older", self.author, days=-2)
+        newer = create_authored_question("Newer", self.author, days=-1)
+        self.assertEqual([e["id"] for e in trending.top_questions()], [newer.id, older.id])
+
+        older.do_vote(user=self.voter, current_vote=VoteStatus.LIKE)
+        Answer.objects.create(text="Answer", author=self.voter, question=older)
+        top = trending.top_questions()
+        self.assertEqual([e["id"] for e in top], [older.id, newer.id])
+        self.assertEqual(top[0]["score"], 1)
+        self.assertEqual(top[0]["answers"], 1)
+
+    def test_refresh_trending_command(self):
+        """
+        The periodic command fills the cache.
+        """
+        create_authored_question("Trending", self.author)
+        out = StringIO()
+        call_command("refresh_trending", stdout=out)
+        self.assertEqual(len(cache.get(trending.CACHE_KEY)), 1)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.panic = Question.objects.create(
+            title="Kernel panic on boot",
+            text="My machine shows a kernel panic after the update, uptime < 1 min",
+            author=self.author)
+        self.network = Question.objects.create(
+            title="Network is slow",
+            text="Downloads are slow since the kernel was upgraded",
+            author=self.author)
+        self.linux = Tag.objects.create(tag_text="linux")
+        self.panic.tags.add(self.linux)
+
+    def search(self, phrase):
+        return self.client.get(reverse("qa:search_results"), {"q": phrase})
+
+    def test_parse_query(self):
+        """
+        Tags are split from the full-text part of a phrase.
+        """
+        self.assertEqual(
+            search.parse_query('tag:linux "kernel panic" boot*'),
+            search.ParsedQuery(tags=["linux"], text='"kernel panic" boot*'),
+        )
+        self.assertEqual(postgres.to_tsquery('"kernel panic" boot*'), "(kernel <-> panic) & boot:*")
+
+    def test_ranked_by_relevance(self):
+        """
+        A title match outranks a body match.
+        """
+        response = self.search("kernel")
+        self.assertEqual(list(response.context["questions"]), [self.panic, self.network])
+
+    def test_phrase_and_prefix(self):
+        """
+        Phrase and prefix queries are supported.
+        """
+        response = self.search('"kernel panic"')
+        self.assertEqual(list(response.context["questions"]), [self.panic])
+        response = self.search("downl*")
+        self.assertEqual(list(response.context["questions"]), [self.network])
+
+    def test_answers_are_searched(self):
+        """
+        Text of the answers is indexed for their question.
+        """
+        Answer.objects.create(text="Try reinstalling grub", author=self.author, question=self.network)
+        response = self.search("grub")
+        self.assertEqual(list(response.context["questions"]), [self.network])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        """
+        Matches are marked in the snippet, user HTML is escaped.
+        """
+        response = self.search("panic")
+        self.assertContains(response, "<mark>panic</mark>")
+        self.assertContains(response, "uptime &lt; 1 min")
+
+    def test_mixed_tag_query(self):
+        """
+        `tag:linux kernel` filters by tag and searches the text.
+        """
+        response = self.search("tag:linux kernel")
+        self.assertEqual(list(response.context["questions"]), [self.panic])
+
+    def test_bare_tag_redirects(self):
+        """
+        A single tag without text redirects to the tag page.
+        """
+        response = self.search("tag:linux")
+        self.assertRedirects(response, reverse("qa:tag_detail", args=["linux"]))
+
+
+@override_settings(SEARCH_BACKEND="qa.search.memory.InvertedIndexBackend", SEARCH_INDEX_BATCH=2)
+class InvertedIndexSearchTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.panic = Question.objects.create(
+            title="Kernel panic on boot",
+            text="My machine shows a kernel panic after the update",
+            author=self.author)
+        self.network = Question.objects.create(
+            title="Network is slow",
+            text="Downloads are slow since the kernel was upgraded",
+            author=self.author)
+        self.backend = search.get_backend()
+        self.backend.rebuild()
+
+    def search(self, phrase):
+        return self.client.get(reverse("qa:search_results"), {"q": phrase})
+
+    def test_tokenize(self):
+        """
+        Words are lowercased and stop words dropped.
+        """
+        self.assertEqual(memory.tokenize("The Kernel, and a panic!"), ["kernel", "panic"])
+
+    def test_bm25_ranking(self):
+        """
+        A title match outranks a body match, all words must match.
+        """
+        response = self.search("kernel")
+        self.assertEqual(list(response.context["questions"]), [self.panic, self.network])
+        response = self.search("kernel slow")
+        self.assertEqual(list(response.context["questions"]), [self.network])
+
+    def test_prefix(self):
+        """
+        A trailing * matches every term with the prefix.
+        """
+        response = self.search("upgr*")
+        self.assertEqual(list(response.context["questions"]), [self.network])
+
+    def test_signals_update_index(self):
+        """
+        Saved answers and deleted questions reach the index.
+        """
+        Answer.objects.create(text="Try reinstalling grub", author=self.author, question=self.network)
+        response = self.search("grub")
+        self.assertEqual(list(response.context["questions"]), [self.network])
+
+        network_id = self.network.id
+        self.network.delete()
+        self.assertEqual(list(self.backend.search(Question.objects.all(), "grub")), [])
+        self.assertNotIn(network_id, self.backend._lengths)
+
+    @override_settings(SEARCH_INDEX_BATCH=3)
+    def test_unloaded_index_keeps_one_batch(self):
+        """
+        A worker that never searches keeps less than a batch of changes, a loaded one applies them.
+        """
+        worker = memory.InvertedIndexBackend()
+        for question_id in range(1, 8):
+            worker.index_question(question_id)
+            self.assertLess(len(worker._pending), 3)
+        self.assertIsNone(worker._postings)
+
+        worker.rebuild()
+        for question_id in (self.panic.id, self.network.id, self.panic.id, 10 ** 6):
+            worker.index_question(question_id)
+        self.assertEqual(worker._pending, set())
+        self.assertEqual(set(worker._lengths), {self.panic.id, self.network.id})
+
+    def test_snapshot_round_trip(self):
+        """
+        A worker started from the snapshot finds the same questions.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index")
+            self.backend.save(path)
+            worker = memory.InvertedIndexBackend()
+            self.assertTrue(worker.load(path))
+        self.assertEqual(
+            list(worker.search(Question.objects.all(), "panic")),
+            [self.panic],
+        )
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        created = timezone.now()
+        # equal scores and creation times exercise the id tie-breaker
+        self.questions = [
+            Question.objects.create(
+                title=f"Question {i}", text="Text", author=self.author,
+                created=created, score=i // 2)
+            for i in range(7)
+        ]
+        self.expected = sorted(
+            self.questions, key=lambda q: (q.score, q.created, q.id), reverse=True)
+
+    def walk(self, paginator):
+        """ Follow next cursors to the end and previous cursors back """
+        pages, page = [], paginator.page()
+        pages.append(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+        backwards = [page]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backwards.append(page)
+        return pages, backwards
+
+    def test_walk_forward_and_back(self):
+        """
+        Pages cover all rows once in order, in both directions.
+        """
+        paginator = CursorPaginator(Question.objects.all(), ("score", "created", "id"), 3)
+        pages, backwards = self.walk(paginator)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([q for page in pages for q in page], self.expected)
+        self.assertEqual(
+            [q for page in reversed(backwards) for q in page], self.expected)
+        self.assertFalse(backwards[-1].has_previous())
+
+    def test_malformed_cursor_gives_first_page(self):
+        """
+        Garbage in the cursor parameter is ignored.
+        """
+        paginator = CursorPaginator(Question.objects.all(), ("score", "created", "id"), 3)
+        for cursor in ("garbage", "W10", "WyJuIiwgWyJ4Il1d"):
+            self.assertEqual(list(paginator.page(cursor)), self.expected[:3])
+        # values of the wrong types
+        for values in ([1, 123, 1], [1, ["2024-01-01"], 1], [{}, "2024-01-01T00:00:00+00:00", 1]):
+            cursor = encode_cursor(NEXT, values)
+            self.assertEqual(list(paginator.page(cursor)), self.expected[:3], values)
+        response = self.client.get(reverse("qa:index"), {"cursor": encode_cursor(NEXT, [1, 123, 1])})
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.object(QuestionListView, "paginate_by", 3)
+    def test_index_pages_without_count(self):
+        """
+        The index pages with cursors and never counts all questions.
+        """
+        response = self.client.get(reverse("qa:index"))
+        self.assertEqual(list(response.context["questions"]), self.expected[:3])
+        next_cursor = response.context["page_obj"].next_cursor
+        self.assertContains(response, f"?cursor={next_cursor}")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("qa:index"), {"cursor": next_cursor})
+        self.assertEqual(list(response.context["questions"]), self.expected[3:6])
+        self.assertFalse(any("COUNT(*)" in query["sql"] for query in queries))
+
+    @mock.patch.object(QuestionListView, "paginate_by", 2)
+    def test_search_cursor_keeps_query(self):
+        """
+        Search result pages keep the search phrase and follow relevance.
+        """
+        response = self.client.get(reverse("qa:search_results"), {"q": "question"})
+        page = response.context["page_obj"]
+        self.assertContains(response, "q=question&amp;cursor=")
+        response = self.client.get(
+            reverse("qa:search_results"), {"q": "question", "cursor": page.next_cursor})
+        self.assertEqual(len(response.context["questions"]), 2)
+        self.assertTrue(set(response.context["questions"]).isdisjoint(page.object_list))
+
+    def test_answer_pages(self):
+        """
+        Answers of a question are paginated with cursors too.
+        """
+        question = self.questions[0]
+        answers = [
+            Answer.objects.create(text=f"Answer {i}", author=self.author, question=question)
+            for i in range(7)
+        ]
+        url = reverse("qa:question_detail", args=(question.id,))
+        response = self.client.get(url)
+        page = response.context["answers_page_obj"]
+        self.assertEqual(list(page), answers[::-1][:5])
+        response = self.client.get(url, {"cursor": page.next_cursor})
+        self.assertEqual(list(response.context["answers"]), answers[::-1][5:])
+
+
+@mock.patch.object(QuestionListView, "paginate_by", 10)
+@mock.patch.object(QuestionDetailView, "answers_paginate_by", 10)
+class ListingQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """ Listings fetch a whole page in a constant number of queries """
+
+    def setUp(self):
+        cache.clear()
+        self.tags = [Tag.objects.create(tag_text=f"tag{i}") for i in range(3)]
+        self.question = None
+        self.users = 0
+        self.add_questions(2)
+
+    def add_questions(self, count):
+        """ Questions by distinct authors, with tags, answers and votes """
+        for _ in range(count):
+            self.users += 1
+            author = create_user(f"user{self.users}")
+            question = Question.objects.create(
+                title=f"Kernel question {self.users}", text="Kernel text", author=author)
+            question.tags.add(*self.tags[:1 + self.users % 3])
+            question.do_vote(user=author, current_vote=VoteStatus.LIKE)
+            self.question = self.question or question
+            answer = Answer.objects.create(text="Answer", author=author, question=self.question)
+            answer.do_vote(user=author, current_vote=VoteStatus.LIKE)
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+    def assertListingBudget(self, url, budget, params=None):
+        # a first request warms caches, e.g. the trending sidebar
+        self.get(url, params)
+        self.assertConstantQueries(lambda: self.get(url, params), lambda: self.add_questions(6), budget)
+
+    def test_index(self):
+        """
+        Index page costs the same with 2 or 8 questions.
+        """
+        self.assertListingBudget(reverse("qa:index"), 6)
+
+    def test_tag_detail(self):
+        """
+        Tag page costs the same with 2 or 8 questions.
+        """
+        self.assertListingBudget(reverse("qa:tag_detail", args=["tag0"]), 7)
+
+    def test_search(self):
+        """
+        Search results cost the same with 2 or 8 matches.
+        """
+        self.assertListingBudget(reverse("qa:search_results"), 6, {"q": "kernel"})
+
+    def test_question_detail(self):
+        """
+        Question page costs the same with 2 or 8 answers.
+        """
+        self.assertListingBudget(reverse("qa:question_detail", args=(self.question.id,)), 3)
+
+    def test_logged_in_index(self):
+        """
+        Header and vote buttons of a logged in user add no per-card queries.
+        """
+        self.client.force_login(User.objects.get(username="user1"))
+        self.assertListingBudget(reverse("qa:index"), 8)
+
+
+class SeederTests(TestCase):
+    def test_reproducible_and_consistent(self):
+        """
+        The same seed gives the same data, stored scores match the votes.
+        """
+        Seeder(30, seed=7, batch_size=10).run()
+        titles = list(Question.objects.order_by("id").values_list("title", flat=True))
+        Question.objects.all().delete()
+        Seeder(30, seed=7, batch_size=10).run()
+        self.assertEqual(
+            list(Question.objects.order_by("id").values_list("title", flat=True)), titles)
+
+        out = StringIO()
+        call_command("recount_scores", "--dry-run", stdout=out)
+        self.assertIn("Found 0 drifted question score(s)", out.getvalue())
+        self.assertIn("Found 0 drifted answer score(s)", out.getvalue())
+
+    def test_copy_seeder(self):
+        """
+        COPY streams produce related rows with valid keys and scores.
+        """
+        counts = CopySeeder(30, seed=7, batch_size=10).run()
+        self.assertEqual(counts["qa.Question"], 30)
+        self.assertEqual(Question.objects.count(), 30)
+        self.assertEqual(
+            Answer.objects.filter(question__isnull=False).count(), counts["qa.Answer"])
+        # sequences were advanced, regular inserts do not collide
+        create_authored_question("After seeding", User.objects.first())
+
+        out = StringIO()
+        call_command("recount_scores", "--dry-run", stdout=out)
+        self.assertIn("Found 0 drifted question score(s)", out.getvalue())
+        call_command("recount_tags", "--dry-run", stdout=out)
+        self.assertIn("Found 0 drifted tag usage count(s)", out.getvalue())
+
+    def test_seed_hasker_command(self):
+        """
+        The command reports created rows and throughput.
+        """
+        out = StringIO()
+        call_command("seed_hasker", "20", "--batch-size", "10", stdout=out)
+        self.assertEqual(Question.objects.count(), 20)
+        self.assertIn("rows/s", out.getvalue())
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        benchmark.seed_dataset(40, seed=1)
+
+    def test_benchmark_paths(self):
+        """
+        Every path is measured and stays within its query budget.
+        """
+        results = benchmark.Benchmark(iterations=2, warmup=1).run()
+        self.assertEqual(
+            set(results),
+            {"index", "tag_detail", "search", "question_detail", "vote", "answer_post",
+             "api_questions", "index_cached", "tag_detail_cached", "question_detail_cached"},
+        )
+        # answer_post includes the savepoint and outbox insert of the notification
+        budgets = {
+            "index": 6, "tag_detail": 7, "search": 6,
+            "question_detail": 4, "vote": 4, "answer_post": 10, "api_questions": 1,
+            "index_cached": 0, "tag_detail_cached": 0, "question_detail_cached": 0,
+        }
+        for name, result in results.items():
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["queries"], budgets[name], name)
+        # pages are rendered, not served from the page cache
+        for name in benchmark.CACHED_PAGES:
+            self.assertGreater(results[name]["queries"], 0, name)
+        self.assertEqual(results["api_questions"]["rows"], 40)
+        self.assertGreater(results["api_questions"]["rows_per_s"], 0)
+
+    def test_compare(self):
+        """
+        Comparison reports latency and query count changes.
+        """
+        before = {"results": {"index": {"p50_ms": 10, "p95_ms": 20, "queries": 8}}}
+        after = {"results": {"index": {"p50_ms": 5, "p95_ms": 20, "queries": 6}}}
+        self.assertEqual(
+            benchmark.compare(before, after),
+            ["index: p50_ms 10.0 -> 5.0 (-50%), p95_ms 20.0 -> 20.0 (+0%), queries 8 -> 6"],
+        )
+
+
+class FailingBackend(locmem.EmailBackend):
+    """ Email backend failing for one recipient, counting opened connections """
+    opened = 0
+
+    def open(self):
+        FailingBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any("broken@" in address for message in messages for address in message.to):
+            raise ConnectionError("SMTP server went away")
+        return super().send_messages(messages)
+
+
+@override_settings(NOTIFICATION_BATCH_SIZE=2, NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_RETRY_DELAY=60)
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.author.email = "author@example.com"
+        self.author.save()
+        self.question = create_authored_question("Where is my mail?", self.author)
+        self.replier = create_user("replier")
+        FailingBackend.opened = 0
+
+    def test_answer_post_queues_notification(self):
+        """
+        Posting an answer stores a notification and sends no email in the request.
+        """
+        self.client.force_login(self.replier)
+        self.client.post(
+            reverse("qa:question_detail", args=(self.question.id,)), {"text": "Right here"})
+        self.assertEqual(len(mail.outbox), 0)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, "author@example.com")
+        self.assertIn("replier has replied", notification.body)
+
+    def test_rolled_back_answer_queues_nothing(self):
+        """
+        The notification is written in the transaction of the answer.
+        """
+        with mock.patch.object(notifications, "enqueue", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.force_login(self.replier)
+                self.client.post(
+                    reverse("qa:question_detail", args=(self.question.id,)), {"text": "Lost"})
+        self.assertFalse(Answer.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(EMAIL_BACKEND="qa.tests.FailingBackend")
+    def test_worker_sends_batches_over_one_connection(self):
+        """
+        All due notifications are sent in batches through one opened connection.
+        """
+        for i in range(5):
+            notifications.enqueue(f"user{i}@example.com", f"Subject {i}", "Body")
+        with notifications.Worker() as worker:
+            result = worker.deliver()
+        self.assertEqual(result, notifications.DeliveryResult(sent=5, failed=0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(FailingBackend.opened, 1)
+        self.assertFalse(Notification.objects.filter(sent__isnull=True).exists())
+        self.assertEqual(notifications.metrics()["pending"], 0)
+
+    @override_settings(EMAIL_BACKEND="qa.tests.FailingBackend")
+    def test_failures_are_retried_with_backoff(self):
+        """
+        A failed notification is rescheduled with a doubling delay and given up
+        after the maximum number of attempts, others are still delivered.
+        """
+        broken = notifications.enqueue("broken@example.com", "Never", "Body")
+        notifications.enqueue("fine@example.com", "Fine", "Body")
+
+        with notifications.Worker() as worker:
+            self.assertEqual(worker.deliver(), notifications.DeliveryResult(sent=1, failed=1))
+        broken.refresh_from_db()
+        self.assertEqual(broken.attempts, 1)
+        self.assertIn("SMTP server went away", broken.last_error)
+        delay = broken.next_attempt - timezone.now()
+        self.assertTrue(datetime.timedelta(seconds=50) < delay <= datetime.timedelta(seconds=60))
+
+        # not due yet
+        with notifications.Worker() as worker:
+            self.assertEqual(worker.deliver(), notifications.DeliveryResult(sent=0, failed=0))
+
+        for attempt in (2, 3):
+            Notification.objects.filter(pk=broken.pk).update(next_attempt=timezone.now())
+            with notifications.Worker() as worker:
+                worker.deliver()
+            broken.refresh_from_db()
+            self.assertEqual(broken.attempts, attempt)
+        self.assertEqual(notifications.retry_delay(2), datetime.timedelta(seconds=120))
+
+        # given up
+        Notification.objects.filter(pk=broken.pk).update(next_attempt=timezone.now())
+        with notifications.Worker() as worker:
+            self.assertEqual(worker.deliver(), notifications.DeliveryResult(sent=0, failed=0))
+        stats = notifications.metrics()
+        self.assertEqual((stats["pending"], stats["dead"]), (0, 1))
+
+    def test_send_notifications_command(self):
+        """
+        The command drains the outbox and reports queue depth and latency.
+        """
+        notifications.enqueue("user@example.com", "Subject", "Body")
+        out = StringIO()
+        call_command("send_notifications", stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Sent 1, failed 0", out.getvalue())
+        self.assertIn("Queue depth 0", out.getvalue())
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        self.voter = create_user("voter")
+        self.question = create_authored_question("Cached card question", self.author)
+        self.answer = Answer.objects.create(
+            question=self.question, author=self.author, text="Cached answer block")
+
+    def get_index(self):
+        return self.client.get(reverse("qa:index")).content.decode()
+
+    def test_cards_are_served_from_cache(self):
+        """
+        The second render of a page reuses the cards of the first one.
+        """
+        first = self.get_index()
+        self.assertEqual(fragments.stats()["question_card"]["misses"], 1)
+        second = self.get_index()
+        self.assertEqual(first, second)
+        self.assertEqual(fragments.stats()["question_card"]["hits"], 1)
+
+    def test_vote_invalidates_card_and_answer_block(self):
+        """
+        Votes bump the version of the voted object, its fragment is re-rendered.
+        """
+        self.client.force_login(self.voter)
+        self.get_index()
+        detail_url = reverse("qa:question_detail", args=(self.question.id,))
+        self.client.get(detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("qa:question_vote", args=(self.question.id, "+1")))
+            self.client.get(reverse("qa:answer_vote", args=(self.answer.id, "-1")))
+
+        self.assertInHTML(f'<span data-live-score="question:{self.question.id}">1</span>', self.get_index())
+        self.assertInHTML(
+            f'<span data-live-score="answer:{self.answer.id}">-1</span>', self.client.get(detail_url).content.decode())
+        self.assertEqual(fragments.stats()["question_card"]["hits"], 0)
+        self.assertEqual(fragments.stats()["answer_block"]["hits"], 0)
+
+    def test_answer_tag_and_avatar_changes_invalidate_card(self):
+        """
+        New answers, tag changes and author changes show up at once.
+        """
+        self.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, author=self.voter, text="Another")
+        self.assertIn("[2]", self.get_index())
+
+        tag = Tag.objects.create(tag_text="fragments")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.tags.add(tag)
+        self.assertIn("fragments", self.get_index())
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.tag_text = "renamed"
+            tag.save()
+        self.assertIn("renamed", self.get_index())
+
+        before = fragments.versions([("user", self.author.id)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.profile.save()
+        self.assertNotEqual(fragments.versions([("user", self.author.id)]), before)
+        self.assertEqual(fragments.stats()["question_card"]["hits"], 0)
+
+    def test_variants_are_not_shared(self):
+        """
+        Anonymous and logged-in readers get different cards, buttons are user specific.
+        """
+        self.assertNotIn("+1", self.get_index())
+        self.client.force_login(self.voter)
+        self.assertIn("+1", self.get_index())
+        self.assertNotIn("Mark answer as correct", self.client.get(
+            reverse("qa:question_detail", args=(self.question.id,))).content.decode())
+        self.client.force_login(self.author)
+        self.assertIn("Mark answer as correct", self.client.get(
+            reverse("qa:question_detail", args=(self.question.id,))).content.decode())
+
+    def test_evicted_version_is_never_reused(self):
+        """
+        A recreated version counter does not match fragments of the evicted one.
+        """
+        before = fragments.versions([("question", self.question.id)])
+        cache.delete(fragments.VERSION_KEY.format(kind="question", id=self.question.id))
+        self.assertNotEqual(fragments.versions([("question", self.question.id)]), before)
+
+    def test_fragment_stats_command(self):
+        """
+        The command shows the counters and resets them.
+        """
+        self.get_index()
+        out = StringIO()
+        call_command("fragment_stats", "--reset", stdout=out)
+        self.assertIn("misses          1", out.getvalue())
+        self.assertEqual(fragments.stats()["question_card"]["misses"], 0)
+
+
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        # older than the trending window, changes do not touch the sidebar
+        self.question = create_authored_question("Cached page question", self.author, days=-60)
+        self.detail_url = reverse("qa:question_detail", args=(self.question.id,))
+        trending.refresh()
+
+    def test_second_request_is_served_from_cache(self):
+        """
+        A cached page needs no queries and carries validators.
+        """
+        first = self.client.get(reverse("qa:index"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("qa:index"))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertIn("Last-Modified", second)
+        self.assertIn("no-cache", second["Cache-Control"])
+
+    def test_conditional_requests_get_304(self):
+        """
+        Matching If-None-Match or If-Modified-Since gives 304 Not Modified.
+        """
+        response = self.client.get(self.detail_url)
+        not_modified = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        not_modified = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.assertEqual(
+            self.client.get(self.detail_url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_changes_invalidate_pages(self):
+        """
+        New answers and votes invalidate the page, pages of other questions stay cached.
+        """
+        other = create_authored_question("Other question", self.author, days=-60)
+        other_url = reverse("qa:question_detail", args=(other.id,))
+        other_etag = self.client.get(other_url)["ETag"]
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        Answer.objects.create(question=self.question, author=self.author, text="Fresh answer")
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Fresh answer")
+
+        scope = [pagecache.question_scope(self.question.id)]
+        before = pagecache.last_modified(scope)
+        self.question.do_vote(create_user("voter"), VoteStatus.LIKE)
+        self.assertGreater(pagecache.last_modified(scope), before)
+        self.assertEqual(
+            self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag).status_code, 304)
+
+    def test_users_and_search_are_not_cached(self):
+        """
+        Logged-in pages and search results are rendered for every request.
+        """
+        self.assertNotIn("ETag", self.client.get(reverse("qa:search_results"), {"q": "cached"}))
+        self.client.force_login(self.author)
+        self.assertNotIn("ETag", self.client.get(reverse("qa:index")))
+
+    def test_trending_change_invalidates_pages(self):
+        """
+        The sidebar stamp moves when the shown trending questions change.
+        """
+        trending.refresh()
+        before = pagecache.last_modified([pagecache.SIDEBAR])
+        trending.question_changed(create_authored_question("Newcomer", self.author))
+        self.assertGreater(pagecache.last_modified([pagecache.SIDEBAR]), before)
+
+
+class ReadOnlyTrafficTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        counters.visits.clear()
+        self.author = create_user("author")
+        self.question = create_authored_question("Read only question", self.author)
+        self.question.tags.add(Tag.objects.create(tag_text="readonly"))
+
+    def test_reading_writes_nothing(self):
+        """
+        Anonymous reading neither creates sessions nor writes to the database.
+        """
+        urls = [
+            reverse("qa:index"),
+            reverse("qa:tag_detail", args=("readonly",)),
+            reverse("qa:question_detail", args=(self.question.id,)),
+            reverse("qa:search_results") + "?q=read",
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            for url in urls:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        writes = [query["sql"] for query in queries
+                  if query["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")]
+        self.assertEqual(writes, [])
+
+    def test_visits_are_flushed_in_batches(self):
+        """
+        Visits are counted in memory and added to the stored counts on flush.
+        """
+        for _ in range(3):
+            self.client.get(reverse("qa:index"))
+        self.client.get(reverse("qa:tag_detail", args=("readonly",)))
+        self.assertFalse(PageVisits.objects.exists())
+
+        with self.assertNumQueries(3):  # savepoint, upsert, release
+            self.assertEqual(counters.visits.flush(), 2)
+        self.client.get(reverse("qa:index"))
+        counters.visits.flush()
+        self.assertEqual(
+            dict(PageVisits.objects.values_list("page", "visits")),
+            {"index": 4, "tag_detail": 1},
+        )
+
+    def test_failed_flush_keeps_increments(self):
+        """
+        Increments survive a failed write and are written by the next flush.
+        """
+        counters.visits.add("index", 5)
+        with mock.patch.object(counters.VisitCounter, "write", side_effect=RuntimeError):
+            self.assertEqual(counters.visits.flush(), 0)
+        self.assertEqual(sum(counters.visits.pending().values()), 5)
+        counters.visits.flush()
+        self.assertEqual(PageVisits.objects.get().visits, 5)
+
+    def test_flush_after_interval(self):
+        """
+        The first increment after the interval flushes the buffer.
+        """
+        counter = counters.VisitCounter(flush_interval=0)
+        counter.add("index")
+        self.assertEqual(PageVisits.objects.get().visits, 1)
+        self.assertFalse(counter.pending())
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        counters.views.clear()
+        self.author = create_user("author")
+        self.question = create_authored_question("Viewed question", self.author)
+        self.detail_url = reverse("qa:question_detail", args=(self.question.id,))
+
+    def test_views_are_deduplicated_and_flushed_at_once(self):
+        """
+        Repeated views of one visitor count once, all views are written by one UPDATE.
+        """
+        other = create_authored_question("Other viewed question", self.author)
+        for _ in range(3):
+            self.client.get(self.detail_url)
+        self.client.get(self.detail_url, REMOTE_ADDR="10.0.0.2")
+        self.client.get(reverse("qa:question_detail", args=(other.id,)))
+        self.assertEqual(counters.views.pending(), {self.question.id: 2, other.id: 1})
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.views, 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(counters.views.flush(), 2)
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("FROM (VALUES", updates[0])
+        self.assertEqual(
+            dict(Question.objects.values_list("id", "views")), {self.question.id: 2, other.id: 1})
+
+    def test_missing_questions_are_not_counted(self):
+        """
+        Pages of questions that do not exist add no views and no deduplication entries.
+        """
+        for pk in range(self.question.id + 1, self.question.id + 4):
+            self.assertEqual(self.client.get(reverse("qa:question_detail", args=(pk,))).status_code, 404)
+        self.assertEqual(counters.views.pending(), {})
+        self.assertEqual(counters.views._seen, {})
+        self.client.get(self.detail_url)
+        self.assertEqual(counters.views.pending(), {self.question.id: 1})
+
+    def test_logged_in_visitor_is_counted_by_session(self):
+        """
+        A logged-in user is one visitor whatever the address.
+        """
+        self.client.force_login(self.author)
+        self.client.get(self.detail_url, REMOTE_ADDR="10.0.0.3")
+        self.client.get(self.detail_url, REMOTE_ADDR="10.0.0.4")
+        self.assertEqual(counters.views.pending(), {self.question.id: 1})
+
+    def test_views_are_counted_again_after_window(self):
+        """
+        The same visitor is counted again after the deduplication window.
+        """
+        counter = counters.ViewCounter(flush_interval=60, dedup_window=0)
+        self.assertTrue(counter.add_view(self.question.id, "ip:10.0.0.1"))
+        self.assertTrue(counter.add_view(self.question.id, "ip:10.0.0.1"))
+        self.assertEqual(counter.pending(), {self.question.id: 2})
+        counter.clear()
+
+    def test_sort_by_views(self):
+        """
+        ?sort=views lists the most viewed questions first, cursors keep the order.
+        """
+        questions = [create_authored_question(f"Question {i}", self.author) for i in range(4)]
+        for views, question in zip((5, 50, 0, 20), questions):
+            Question.objects.filter(pk=question.pk).update(views=views)
+
+        with mock.patch.object(QuestionListView, "paginate_by", 2):
+            response = self.client.get(reverse("qa:index"), {"sort": "views"})
+            first = [q.id for q in response.context["questions"]]
+            response = self.client.get(
+                reverse("qa:index"),
+                {"sort": "views", "cursor": response.context["page_obj"].next_cursor})
+            second = [q.id for q in response.context["questions"]]
+        self.assertEqual(
+            first + second, [questions[1].id, questions[3].id, questions[0].id, questions[2].id])
+        self.assertContains(response, "50 views", count=0)
+        self.assertContains(response, "5 views")
+
+    def test_flush_invalidates_pages_showing_views(self):
+        """
+        Flushed views invalidate the question lists and the pages of the viewed questions.
+        """
+        other = create_authored_question("Not viewed question", self.author)
+        self.client.get(self.detail_url)
+        scopes = [pagecache.VIEWS, pagecache.question_scope(self.question.id), pagecache.question_scope(other.id)]
+        before = {scope: pagecache.last_modified([scope]) for scope in scopes}
+        time.sleep(0.01)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.views.flush()
+        after = {scope: pagecache.last_modified([scope]) for scope in scopes}
+        self.assertGreater(after[pagecache.VIEWS], before[pagecache.VIEWS])
+        self.assertGreater(after[scopes[1]], before[scopes[1]])
+        self.assertEqual(after[scopes[2]], before[scopes[2]])
+
+    def test_cached_pages_show_flushed_views(self):
+        """
+        Anonymous readers get pages with the flushed view counts, not the cached ones.
+        """
+        # older than the trending window, the flush does not touch the sidebar
+        Question.objects.filter(pk=self.question.pk).update(created=timezone.now() - datetime.timedelta(days=60))
+        trending.refresh()
+        self.assertContains(self.client.get(self.detail_url), "viewed 0 times")
+        self.assertContains(self.client.get(reverse("qa:index")), "0 views")
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.detail_url), "viewed 0 times")
+        time.sleep(0.01)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.views.flush()
+        self.assertContains(self.client.get(self.detail_url), "viewed 1 times")
+        self.assertContains(self.client.get(reverse("qa:index")), "1 views")
+
+
+class TagAutocompleteTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.tags = {name: Tag.objects.create(tag_text=name)
+                     for name in ("Python", "pytest", "pandas", "django", "postgres")}
+        for i, names in enumerate((["pytest"], ["pytest", "pandas"], ["Python"], ["pytest"])):
+            question = create_authored_question(f"Tagged question {i}", self.author)
+            question.tags.set([self.tags[name] for name in names])
+
+    def test_prefix_is_case_insensitive_and_ranked_by_usage(self):
+        """
+        Tags starting with the prefix are ranked by the number of questions.
+        """
+        response = self.client.get(reverse("qa:tag_autocomplete"), {"q": "PY"})
+        self.assertEqual(response.json()["results"], [
+            {"name": "pytest", "questions": 3},
+            {"name": "Python", "questions": 1},
+        ])
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+
+    @override_settings(TAG_AUTOCOMPLETE_LIMIT=1)
+    def test_results_are_limited(self):
+        """
+        No more than TAG_AUTOCOMPLETE_LIMIT tags are suggested, an empty prefix suggests nothing.
+        """
+        response = self.client.get(reverse("qa:tag_autocomplete"), {"q": "p"})
+        self.assertEqual(response.json()["results"], [{"name": "pytest", "questions": 3}])
+        response = self.client.get(reverse("qa:tag_autocomplete"), {"q": " "})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_tag_names_are_validated_in_one_query(self):
+        """
+        Entered names are matched case-insensitively with a single query.
+        """
+        form = QuestionForm({"title": "Title", "text": "Text", "tags": "PYTHON, django,"})
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["tags"], [self.tags["Python"], self.tags["django"]])
+
+    def test_unknown_tags_and_limit(self):
+        """
+        Unknown names are reported, at most three tags are accepted.
+        """
+        form = QuestionForm({"title": "Title", "text": "Text", "tags": "python, rust, go"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["tags"], ["Unknown tags: rust, go"])
+        form = QuestionForm({"title": "Title", "text": "Text", "tags": "python, pytest, pandas, django"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["tags"], ["You can choose 3 tags maximum"])
+
+    def test_question_is_created_with_tag_names(self):
+        """
+        The create page does not list all tags, the question gets the entered tags.
+        """
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("qa:question_create"))
+        self.assertNotContains(response, "<option")
+        self.assertContains(response, 'data-autocomplete-url="/qa/tag/autocomplete/"')
+        self.client.post(reverse("qa:question_create"), {
+            "title": "New tagged question", "text": "Text", "tags": "django, postgres",
+        })
+        question = Question.objects.get(title="New tagged question")
+        self.assertEqual(
+            sorted(question.tags.values_list("tag_text", flat=True)), ["django", "postgres"])
+
+
+class TagUsageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        self.linux, self.python, self.rust = (
+            Tag.objects.create(tag_text=name) for name in ("linux", "python", "rust"))
+        self.questions = [
+            create_authored_question(f"Tag usage question {i}", self.author, days=-60)
+            for i in range(3)]
+
+    def assertUsage(self, expected):
+        self.assertEqual(
+            dict(Tag.objects.values_list("tag_text", "usage")),
+            dict(expected, **{name: 0 for name in ("linux", "python", "rust") if name not in expected}))
+
+    def test_usage_follows_question_tags(self):
+        """
+        Adding, removing, setting and clearing tags of a question change the usage counts.
+        """
+        first, second, _ = self.questions
+        first.tags.add(self.linux, self.python)
+        second.tags.add(self.linux)
+        # already linked tags are not counted twice
+        second.tags.add(self.linux, self.rust)
+        self.assertUsage({"linux": 2, "python": 1, "rust": 1})
+        # removing a tag the question does not have changes nothing
+        first.tags.remove(self.rust, self.python)
+        self.assertUsage({"linux": 2, "rust": 1})
+        second.tags.set([self.python])
+        self.assertUsage({"linux": 1, "python": 1})
+        first.tags.clear()
+        self.assertUsage({"python": 1})
+
+    def test_usage_follows_tag_questions_and_deletion(self):
+        """
+        Changes from the tag side and deleted questions change the usage counts.
+        """
+        self.linux.questions.add(*self.questions)
+        self.python.questions.add(self.questions[0])
+        self.assertUsage({"linux": 3, "python": 1})
+        self.linux.questions.remove(self.questions[1], self.questions[1])
+        self.assertUsage({"linux": 2, "python": 1})
+        self.questions[0].delete()
+        self.assertUsage({"linux": 1})
+        self.linux.questions.clear()
+        self.assertUsage({})
+
+    def test_recount_tags_fixes_drift(self):
+        """
+        recount_tags restores counts that differ from the number of questions.
+        """
+        self.questions[0].tags.add(self.linux, self.python)
+        Tag.objects.filter(pk=self.linux.pk).update(usage=7)
+        Question.tags.through.objects.create(question=self.questions[1], tag=self.rust)
+
+        out = StringIO()
+        call_command("recount_tags", "--dry-run", stdout=out)
+        self.assertIn("Found 2 drifted tag usage count(s)", out.getvalue())
+        with CaptureQueriesContext(connection) as queries:
+            call_command("recount_tags", stdout=out)
+        self.assertEqual(
+            len([query for query in queries if query["sql"].startswith("UPDATE")]), 1)
+        self.assertIn("Fixed 2 drifted tag usage count(s)", out.getvalue())
+        self.assertUsage({"linux": 1, "python": 1, "rust": 1})
+
+    def test_directory_sorted_by_popularity(self):
+        """
+        ?sort=popular lists the most used tags first with their counts.
+        """
+        self.rust.questions.add(*self.questions)
+        self.python.questions.add(self.questions[0])
+        response = self.client.get(reverse("qa:tag_list"), {"sort": "popular"})
+        self.assertEqual(
+            [tag.tag_text for tag in response.context["object_list"]], ["rust", "python", "linux"])
+        response = self.client.get(reverse("qa:tag_list"))
+        self.assertEqual(
+            [tag.tag_text for tag in response.context["object_list"]], ["linux", "python", "rust"])
+
+    def test_cloud_is_cached_until_tags_change(self):
+        """
+        The cloud is weighted by usage, served from the cache and rebuilt after tag changes.
+        """
+        self.rust.questions.add(*self.questions)
+        self.python.questions.add(self.questions[0])
+        expected = [
+            {"name": "python", "usage": 1, "weight": 1},
+            {"name": "rust", "usage": 3, "weight": tags.CLOUD_WEIGHTS},
+        ]
+        self.assertEqual(tags.cloud(), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(tags.cloud(), expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.linux.questions.add(self.questions[1])
+        self.assertEqual([entry["name"] for entry in tags.cloud()], ["linux", "python", "rust"])
+
+    def test_directory_page_is_cached_for_anonymous_readers(self):
+        """
+        The directory is served from the page cache until a tag is used.
+        """
+        trending.refresh()
+        etag = self.client.get(reverse("qa:tag_list"))["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("qa:tag_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].tags.add(self.rust)
+        response = self.client.get(reverse("qa:tag_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "tag-weight-1")
+
+
+class TagCombinationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        self.python, self.django, self.windows = (
+            Tag.objects.create(tag_text=name) for name in ("python", "django", "windows"))
+        self.web = create_authored_question("Django on linux", self.author)
+        self.web.tags.set([self.python, self.django])
+        self.desktop = create_authored_question("Django on windows", self.author)
+        self.desktop.tags.set([self.python, self.django, self.windows])
+        self.script = create_authored_question("Python script", self.author)
+        self.script.tags.set([self.python])
+
+    def questions(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return {question.id for question in response.context["questions"]}
+
+    def test_parse_excluded_tags(self):
+        """
+        `-tag:` tokens are excluded tags.
+        """
+        self.assertEqual(
+            search.parse_query("tag:python tag:Django -tag:windows setup"),
+            search.ParsedQuery(tags=["python", "Django"], text="setup", excluded_tags=("windows",)),
+        )
+
+    def test_intersection_and_exclusion(self):
+        """
+        The tag page lists questions with all tags and none of the excluded ones.
+        """
+        url = reverse("qa:tag_detail", args=["python"])
+        self.assertEqual(self.questions(url), {self.web.id, self.desktop.id, self.script.id})
+        self.assertEqual(self.questions(url, {"tag": "DJANGO"}), {self.web.id, self.desktop.id})
+        self.assertEqual(
+            self.questions(url, {"tag": "django", "exclude": "windows"}), {self.web.id})
+        # an unknown excluded tag excludes nothing
+        self.assertEqual(self.questions(url, {"tag": "django", "exclude": "mac"}),
+                         {self.web.id, self.desktop.id})
+        self.assertEqual(self.client.get(url, {"tag": "rust"}).status_code, 404)
+
+    def test_combination_is_one_query(self):
+        """
+        Tags are resolved with one query and the questions are filtered in the page query.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse("qa:tag_detail", args=["python"]), {"tag": "django", "exclude": "windows"})
+        page_query = next(query["sql"] for query in queries if 'FROM "qa_question"' in query["sql"]
+                          and "LIMIT" in query["sql"])
+        # python, django and NOT EXISTS windows
+        self.assertEqual(page_query.count("EXISTS"), 3)
+        self.assertEqual(page_query.count("NOT (EXISTS"), 1)
+        self.assertEqual(len([query for query in queries if 'FROM "qa_tag"' in query["sql"]
+                              and "qa_question_tags" not in query["sql"]]), 1)
+
+    def test_search_syntax(self):
+        """
+        Tags without text redirect to the tag page, with text they filter the search.
+        """
+        response = self.client.get(
+            reverse("qa:search_results"), {"q": "tag:python tag:django -tag:windows"})
+        self.assertRedirects(
+            response, reverse("qa:tag_detail", args=["python"]) + "?tag=django&exclude=windows")
+        self.assertEqual(
+            self.questions(reverse("qa:search_results"), {"q": "-tag:windows django"}),
+            {self.web.id})
+        self.assertEqual(
+            self.questions(reverse("qa:search_results"), {"q": "tag:rust django"}), set())
+
+
+class JsonApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        self.linux = Tag.objects.create(tag_text="linux")
+        self.questions = []
+        for i in range(5):
+            question = create_authored_question(f"Api question {i}", self.author, days=-60)
+            Question.objects.filter(pk=question.pk).update(score=i)
+            self.questions.append(question)
+        self.questions[1].tags.add(self.linux)
+
+    def get(self, url, params=None, **headers):
+        response = self.client.get(url, params, **headers)
+        if response.streaming:
+            response.json_body = json.loads(b"".join(response.streaming_content))
+        else:
+            response.json_body = response.json()
+        return response
+
+    def test_sparse_fieldsets(self):
+        """
+        ?fields= selects fields, unknown fields are rejected.
+        """
+        response = self.get(reverse("api:questions"), {"fields": "id,title,tags", "limit": 1})
+        self.assertEqual(response.json_body["results"], [
+            {"id": self.questions[4].id, "title": "Api question 4", "tags": []},
+        ])
+        response = self.get(reverse("api:questions"), {"limit": 1})
+        self.assertEqual(set(response.json_body["results"][0]), set(resources.QUESTION.default))
+        response = self.get(reverse("api:questions"), {"fields": "id,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json_body, {"error": "Unknown fields: password"})
+
+    @override_settings(API_CHUNK_SIZE=2)
+    def test_cursor_pages_are_streamed(self):
+        """
+        Pages are streamed in chunks with one query, next urls walk all questions.
+        """
+        url, ids, pages = reverse("api:questions") + "?limit=3&fields=id", [], 0
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+                self.assertTrue(response.streaming)
+                chunks = list(response.streaming_content)
+            body = json.loads(b"".join(chunks))
+            if len(body["results"]) == 3:
+                # opening, two chunks of rows and closing
+                self.assertEqual(len(chunks), 4)
+            ids.extend(item["id"] for item in body["results"])
+            url, pages = body["next"], pages + 1
+        self.assertEqual(pages, 2)
+        self.assertEqual(ids, [question.id for question in reversed(self.questions)])
+
+        response = self.get(reverse("api:questions"), {"limit": 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        """
+        A matching ETag gives 304 without queries until the question changes.
+        """
+        url = reverse("api:question", args=(self.questions[0].id,))
+        response = self.get(url)
+        self.assertEqual(response.json_body["title"], "Api question 0")
+        self.assertIn("no-cache", response["Cache-Control"])
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.questions[0], author=self.author, text="New")
+        response = self.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json_body["answers"], 1)
+
+    def test_answers_tags_and_search(self):
+        """
+        Answers of a question, tags by usage and search with tag filters.
+        """
+        question = self.questions[0]
+        answer = Answer.objects.create(question=question, author=self.author, text="Right")
+        Answer.objects.create(question=question, author=self.author, text="Wrong")
+        Question.objects.filter(pk=question.pk).update(correct_answer=answer)
+        response = self.get(reverse("api:answers", args=(question.id,)), {"fields": "text,is_correct"})
+        self.assertCountEqual(response.json_body["results"], [
+            {"text": "Right", "is_correct": True}, {"text": "Wrong", "is_correct": False},
+        ])
+        self.assertEqual(self.get(reverse("api:answers", args=(0,))).status_code, 404)
+        self.assertEqual(self.get(reverse("api:question", args=(0,))).status_code, 404)
+
+        Tag.objects.create(tag_text="lisp")
+        response = self.get(reverse("api:tags"), {"q": "LI"})
+        self.assertEqual(
+            [tag["name"] for tag in response.json_body["results"]], ["linux", "lisp"])
+        self.assertEqual(response.json_body["results"][0]["questions"], 1)
+
+        response = self.get(reverse("api:search"), {"q": "tag:linux", "fields": "id"})
+        self.assertEqual(response.json_body["results"], [{"id": self.questions[1].id}])
+        response = self.get(reverse("api:search"), {"q": "-tag:linux question", "fields": "id"})
+        self.assertEqual(len(response.json_body["results"]), 4)
+        self.assertEqual(self.get(reverse("api:search")).status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.author = create_user("author")
+        self.linux = Tag.objects.create(tag_text="linux")
+        self.old = create_authored_question("Old question", self.author, days=-30)
+        self.old.tags.add(self.linux)
+        self.right = Answer.objects.create(question=self.old, author=self.author, text="Right, \"quoted\"")
+        self.wrong = Answer.objects.create(question=self.old, author=self.author, text="Wrong")
+        Question.objects.filter(pk=self.old.pk).update(correct_answer=self.right)
+        self.unanswered = create_authored_question("Unanswered question", self.author, days=-30)
+
+    def run_export(self, fmt="ndjson", **kwargs):
+        chunks, stats = export.export(fmt, **kwargs)
+        return b"".join(chunks), stats
+
+    def test_ndjson_is_streamed_with_one_query(self):
+        """
+        Every question is a line with its tags and answers, read by one query.
+        """
+        with self.assertNumQueries(1):
+            data, stats = self.run_export(chunk_size=1)
+        lines = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual([line["title"] for line in lines], ["Old question", "Unanswered question"])
+        self.assertEqual(lines[0]["tags"], ["linux"])
+        self.assertEqual(lines[0]["correct_answer"], self.right.id)
+        self.assertEqual(
+            [(answer["text"], answer["author"]) for answer in lines[0]["answers"]],
+            [('Right, "quoted"', "author"), ("Wrong", "author")])
+        self.assertEqual((stats.questions, stats.answers, stats.bytes), (2, 2, len(data)))
+
+    def test_csv_and_gzip(self):
+        """
+        CSV has a line per question followed by its answers, gzip output decompresses to it.
+        """
+        data, _ = self.run_export("csv")
+        rows = list(csv.reader(data.decode().splitlines()))
+        self.assertEqual(rows[0], export.CSV_HEADER)
+        self.assertEqual([(row[0], row[4], row[-1]) for row in rows[1:]], [
+            ("question", "Old question", ""),
+            ("answer", 'Right, "quoted"', "1"),
+            ("answer", "Wrong", "0"),
+            ("question", "Unanswered question", ""),
+        ])
+        compressed, _ = self.run_export("csv", compress=True)
+        self.assertEqual(gzip.decompress(compressed), data)
+
+    def test_incremental_export(self):
+        """
+        Since a moment, only questions asked or answered after it are exported.
+        """
+        since = timezone.now() - datetime.timedelta(days=1)
+        Answer.objects.filter(pk=self.wrong.pk).update(created=timezone.now() - datetime.timedelta(days=2))
+        Answer.objects.filter(pk=self.right.pk).update(created=timezone.now() - datetime.timedelta(days=2))
+        data, stats = self.run_export(since=since)
+        self.assertEqual(stats.questions, 0)
+        Answer.objects.create(question=self.unanswered, author=self.author, text="Late answer")
+        data, stats = self.run_export(since=since)
+        self.assertEqual([json.loads(line)["id"] for line in data.splitlines()], [self.unanswered.id])
+        self.assertEqual(export.parse_since("2024-05-01").isoformat()[:10], "2024-05-01")
+
+    def test_command(self):
+        """
+        export_qa writes the file and reports the throughput.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "qa.ndjson.gz")
+            out = StringIO()
+            call_command("export_qa", "--gzip", "--output", path, stdout=out)
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 2)
+        self.assertIn("2 questions, 2 answers", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("export_qa", "--since", "yesterday", stdout=out)
+
+    def test_admin_download(self):
+        """
+        Only staff can download, the file is streamed as an attachment.
+        """
+        url = reverse("admin:qa_question_export")
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        admin = User.objects.create_superuser("admin", "admin@localhost", "password")
+        self.client.force_login(admin)
+        response = self.client.get(url, {"format": "csv"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('attachment; filename="hasker-qa-', response["Content-Disposition"])
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 5)
+        self.assertEqual(self.client.get(url, {"format": "xml"}).status_code, 400)
+        self.assertContains(self.client.get(reverse("admin:qa_question_changelist")), url)
+
+
+DUMP = {
+    "Users.xml": """<?xml version="1.0" encoding="utf-8"?>
+<users>
+  <row Id="-1" CreationDate="2010-07-28T16:38:27.683" DisplayName="Community" />
+  <row Id="2" CreationDate="2010-07-28T17:02:35.020" DisplayName="Geoff" />
+  <row Id="3" CreationDate="2010-07-28T18:00:00.000" DisplayName="Jarrod" />
+</users>""",
+    "Tags.xml": """<?xml version="1.0" encoding="utf-8"?>
+<tags>
+  <row Id="1" TagName="linux" Count="2" />
+  <row Id="2" TagName="bash" Count="1" />
+  <row Id="3" TagName="unused" Count="0" />
+</tags>""",
+    "Posts.xml": """<?xml version="1.0" encoding="utf-8"?>
+<posts>
+  <row Id="1" PostTypeId="1" AcceptedAnswerId="3" CreationDate="2010-07-28T19:04:21.300" Score="10" ViewCount="500" Body="&lt;p&gt;How do I list files &amp;amp; dirs?&lt;/p&gt;" OwnerUserId="2" Title="Listing files &amp;amp; dirs" Tags="&lt;linux&gt;&lt;bash&gt;" />
+  <row Id="2" PostTypeId="1" CreationDate="2010-07-28T19:05:00.000" Score="-1" ViewCount="7" Body="&lt;p&gt;Kernel?&lt;/p&gt;" OwnerUserId="99" Title="Which kernel" Tags="|linux|Kernel|" />
+  <row Id="3" PostTypeId="2" ParentId="1" CreationDate="2010-07-28T19:10:00.000" Score="5" Body="&lt;pre&gt;&lt;code&gt;ls -la&lt;/code&gt;&lt;/pre&gt;" OwnerUserId="3" />
+  <row Id="4" PostTypeId="2" ParentId="1" CreationDate="2010-07-28T19:11:00.000" Score="0" Body="&lt;p&gt;dir&lt;/p&gt;" OwnerUserId="-1" />
+  <row Id="5" PostTypeId="2" ParentId="42" CreationDate="2010-07-28T19:12:00.000" Score="0" Body="&lt;p&gt;orphan&lt;/p&gt;" OwnerUserId="2" />
+  <row Id="6" PostTypeId="5" CreationDate="2010-07-28T19:13:00.000" Score="0" Body="wiki" />
+</posts>""",
+    "Votes.xml": """<?xml version="1.0" encoding="utf-8"?>
+<votes>
+  <row Id="1" PostId="1" VoteTypeId="2" CreationDate="2010-07-28T00:00:00.000" />
+  <row Id="2" PostId="1" VoteTypeId="2" UserId="3" CreationDate="2010-07-28T00:00:00.000" />
+  <row Id="3" PostId="4" VoteTypeId="3" UserId="2" CreationDate="2010-07-28T00:00:00.000" />
+  <row Id="4" PostId="1" VoteTypeId="5" UserId="2" CreationDate="2010-07-28T00:00:00.000" />
+</votes>""",
+}
+
+
+class StackExchangeImportTests(TestCase):
+    def setUp(self):
+        # rows that exist before the import keep their ids
+        self.author = create_user("author")
+        self.existing = create_authored_question("Existing question", self.author)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "unix.stackexchange.com")
+        os.mkdir(self.path)
+        for name, content in DUMP.items():
+            with open(os.path.join(self.path, name), "w", encoding="utf-8") as file:
+                file.write(content)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_import(self):
+        """
+        Users, tags, questions, answers, accepted answers and attributed votes are imported.
+        """
+        importer = stackexchange.Importer(self.path, batch_size=2)
+        counts = importer.run(index=False)
+        self.assertEqual(counts["auth.User"], 3)
+        self.assertEqual(counts["qa.Question"], 2)
+        self.assertEqual(counts["qa.Answer"], 2)
+        self.assertEqual(counts["accepted answers"], 1)
+        self.assertEqual(importer.skipped["anonymous votes"], 1)
+        self.assertEqual(importer.skipped["answers of missing questions"], 1)
+
+        question = Question.objects.get(title="Listing files & dirs")
+        self.assertGreater(question.id, self.existing.id)
+        self.assertEqual(question.text, "How do I list files & dirs?")
+        # the vote of se_3, Score of the dump also counts anonymous votes
+        self.assertEqual((question.score, question.views), (1, 500))
+        self.assertEqual(question.author.username, "se_2")
+        self.assertEqual(question.author.profile.user_id, question.author.id)
+        self.assertEqual(question.created.year, 2010)
+        self.assertEqual(question.correct_answer.text, "ls -la")
+        self.assertEqual(sorted(question.tags.values_list("tag_text", flat=True)), ["bash", "linux"])
+        self.assertEqual(question.answer_set.get(text="dir").author.username, "se_-1")
+
+        # the owner is not in the dump, a new tag is created on the fly
+        kernel = Question.objects.get(title="Which kernel")
+        self.assertEqual(kernel.author.username, "se_deleted")
+        self.assertEqual(Tag.objects.get(tag_text="linux").usage, 2)
+        self.assertTrue(Tag.objects.filter(tag_text="Kernel", usage=1).exists())
+        self.assertTrue(Tag.objects.filter(tag_text="unused", usage=0).exists())
+
+        self.assertEqual(
+            list(QuestionVote.objects.values_list("user__username", "question", "vote")),
+            [("se_3", question.id, 1)])
+        self.assertEqual(AnswerVote.objects.get().vote, -1)
+        self.assertEqual(ImportProgress.objects.get().stage, "done")
+
+        # the sequences are moved after the imported ids
+        self.assertGreater(create_authored_question("New", self.author).id, kernel.id)
+
+    def test_resume(self):
+        """
+        An interrupted import continues after its last committed batch, rows are written once.
+        """
+        def interrupt(importer):
+            if importer.progress.stage == "posts":
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            stackexchange.Importer(self.path, batch_size=2).run(index=False, report=interrupt)
+        progress = ImportProgress.objects.get()
+        self.assertEqual((progress.stage, progress.position), ("posts", 2))
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertEqual(Answer.objects.count(), 0)
+
+        importer = stackexchange.Importer(self.path, batch_size=2)
+        counts = importer.run(index=False)
+        # the rest of the posts, all posts again for the accepted answers and the votes
+        self.assertEqual(importer.skipped["rows imported before"], 2)
+        self.assertEqual(importer.read, 4 + 6 + 4)
+        self.assertNotIn("auth.User", counts)
+        self.assertEqual(counts["qa.Answer"], 2)
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertEqual(User.objects.filter(username__startswith="se_").count(), 4)
+        self.assertIsNotNone(Question.objects.get(title="Listing files & dirs").correct_answer)
+
+    def test_repeated_votes(self):
+        """
+        The last vote of a batch is written, votes repeated in later batches are skipped and not counted.
+        """
+        with open(os.path.join(self.path, "Votes.xml"), "w", encoding="utf-8") as file:
+            file.write(DUMP["Votes.xml"].replace("</votes>", """\
+  <row Id="5" PostId="4" VoteTypeId="3" UserId="3" CreationDate="2010-07-29T00:00:00.000" />
+  <row Id="6" PostId="4" VoteTypeId="2" UserId="3" CreationDate="2010-07-29T00:00:00.000" />
+  <row Id="7" PostId="1" VoteTypeId="3" UserId="3" CreationDate="2010-07-29T00:00:00.000" />
+</votes>"""))
+        importer = stackexchange.Importer(self.path, batch_size=2)
+        counts = importer.run(index=False)
+        self.assertEqual((counts["qa.QuestionVote"], counts["qa.AnswerVote"]), (1, 2))
+        self.assertEqual(importer.skipped["repeated votes"], 1)
+        self.assertEqual(QuestionVote.objects.get().vote, 1)
+        # skipped votes are not added to the scores
+        self.assertEqual(Question.objects.get(title="Listing files & dirs").score, 1)
+        self.assertEqual(
+            sorted(AnswerVote.objects.values_list("user__username", "vote")), [("se_2", -1), ("se_3", 1)])
+
+    def test_scores_are_vote_sums(self):
+        """
+        Imported scores are the sums of the imported votes, recount_scores finds nothing to fix.
+        """
+        stackexchange.Importer(self.path, batch_size=2).run(index=False)
+        out = StringIO()
+        call_command("recount_scores", "--dry-run", stdout=out)
+        self.assertEqual(out.getvalue().count("Found 0 drifted"), 2, out.getvalue())
+        call_command("recount_scores", stdout=out)
+        self.assertEqual(
+            sorted(Answer.objects.filter(author__username__startswith="se_").values_list("text", "score")),
+            [("dir", -1), ("ls -la", 0)])
+        self.assertEqual(Question.objects.get(title="Which kernel").score, 0)
+
+    def test_restart(self):
+        """
+        A restarted import needs a new username prefix, the interrupted one is kept until then.
+        """
+        def interrupt(importer):
+            if importer.progress.stage == "posts":
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            stackexchange.Importer(self.path, batch_size=2).run(index=False, report=interrupt)
+        with self.assertRaisesMessage(ValueError, "se_*"):
+            stackexchange.Importer(self.path, batch_size=2).run(restart=True, index=False)
+        self.assertEqual(ImportProgress.objects.get().stage, "posts")
+        with self.assertRaises(CommandError):
+            call_command("import_stackexchange", self.path, "--restart", stdout=StringIO())
+
+        counts = stackexchange.Importer(self.path, batch_size=2, username_prefix="se2_").run(
+            restart=True, index=False)
+        self.assertEqual(counts["auth.User"], 3)
+        self.assertEqual(counts["qa.Question"], 2)
+        self.assertEqual(User.objects.filter(username__startswith="se2_").count(), 4)
+        self.assertEqual(Question.objects.filter(author__username__startswith="se2_").count(), 2)
+        self.assertEqual(ImportProgress.objects.get().stage, "done")
+
+    def test_command(self):
+        """
+        import_stackexchange reports throughput and peak memory, a finished import does nothing.
+        """
+        out = StringIO()
+        call_command("import_stackexchange", self.path, "--no-index", stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+        self.assertIn("peak memory", out.getvalue())
+        call_command("import_stackexchange", self.path, stdout=out)
+        self.assertEqual(Question.objects.count(), 3)
+        with self.assertRaises(CommandError):
+            call_command("import_stackexchange", self.directory.name, stdout=out)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    # "replica" is a second connection to the test database (TEST MIRROR),
+    # committed rows are visible through both
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user("author")
+        self.question = create_authored_question("Replicated question", self.author, days=-1)
+        self.user = create_user("voter")
+        # no page was changed just now
+        trending.refresh()
+        cache.set_many({
+            pagecache.STAMP_KEY.format(scope=scope): time.time() - 60
+            for scope in (pagecache.SITE, pagecache.SIDEBAR, pagecache.PROFILES, pagecache.TAGS, pagecache.VIEWS,
+                          pagecache.question_scope(self.question.pk))
+        }, None)
+
+    def queries(self, url, **kwargs):
+        """ Response and the SQL sent to the primary and to the replica """
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = self.client.get(url, **kwargs)
+        return response, [q["sql"] for q in primary], [q["sql"] for q in replica]
+
+    def test_pages_read_from_replica(self):
+        """
+        Question list, question page, tag directory and the sidebar are read from the replica.
+        """
+        for url in (reverse("qa:index"), self.question.get_absolute_url(), reverse("qa:tag_list")):
+            response, primary, replica = self.queries(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(replica, url)
+            self.assertFalse([sql for sql in primary if "qa_question" in sql], url)
+            self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_writer_is_pinned_to_primary(self):
+        """
+        After a vote the voter reads from the primary until the pin cookie expires.
+        """
+        self.client.force_login(self.user)
+        response, _, _ = self.queries(reverse("qa:question_vote", args=(self.question.id, "+1")))
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_PIN_SECONDS)
+
+        response, primary, replica = self.queries(self.question.get_absolute_url())
+        self.assertEqual(replica, [])
+        self.assertContains(response, "Replicated question")
+
+        self.client.cookies[routers.PIN_COOKIE] = str(int(time.time()) - 1)
+        _, _, replica = self.queries(self.question.get_absolute_url())
+        self.assertTrue(replica)
+
+    def test_recent_change_is_not_cached_from_replica(self):
+        """
+        A page of a question changed less than REPLICA_PIN_SECONDS ago is rendered from the primary.
+        """
+        pagecache.touch(pagecache.question_scope(self.question.pk))
+        _, primary, replica = self.queries(self.question.get_absolute_url())
+        self.assertEqual(replica, [])
+        self.assertTrue([sql for sql in primary if "qa_question" in sql])
+
+    def test_router(self):
+        """
+        Writes, reads outside replica_reads() and reads after a write use the primary.
+        """
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Question), "default")
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(Question), "replica")
+            self.assertEqual(router.db_for_read(Session), "default")
+            self.assertEqual(router.db_for_write(Question), "default")
+            self.assertEqual(router.db_for_read(Question), "default")
+        self.assertIs(router.allow_migrate("replica", "qa"), False)
+        replica_question = Question.objects.using("replica").get(pk=self.question.pk)
+        self.assertTrue(router.allow_relation(replica_question, self.author))
+
+
+def reload_urls():
+    """ qa.urls chooses the views by settings.ASYNC_VIEWS when it is imported """
+    importlib.reload(urls)
+    importlib.reload(hasker_urls)
+    clear_url_caches()
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # cleanups run in reverse order: the urls are reloaded after the settings are restored
+        cls.addClassCleanup(reload_urls)
+        cls.enterClassContext(override_settings(ASYNC_VIEWS=True))
+        reload_urls()
+
+    def setUp(self):
+        cache.clear()
+        counters.visits.clear()
+        counters.views.clear()
+        self.author = create_user("author")
+        self.user = create_user("reader")
+        self.tag = Tag.objects.create(tag_text="asyncio")
+        self.question = create_authored_question("Async question", self.author, days=-1)
+        self.question.tags.add(self.tag)
+        self.other = create_authored_question("Untagged question", self.author, days=-2)
+        self.answer = Answer.objects.create(text="Async answer", author=self.user, question=self.question)
+        self.detail_url = reverse("qa:question_detail", args=(self.question.id,))
+        self.author.email = "author@example.com"
+        self.author.save()
+        trending.refresh()
+
+    def test_urls_use_async_views(self):
+        """
+        Question lists, question pages and votes resolve to the async views.
+        """
+        for url in (reverse("qa:index"), reverse("qa:tag_detail", args=("asyncio",)), self.detail_url,
+                    reverse("qa:question_vote", args=(self.question.id, "+1"))):
+            view_class = resolve(url).func.view_class
+            self.assertIs(view_class.__module__, async_views.__name__, url)
+            self.assertTrue(view_class.view_is_async, url)
+        self.assertIsNot(
+            resolve(reverse("qa:search_results")).func.view_class.__module__, async_views.__name__)
+
+    def test_question_lists(self):
+        """
+        The index and tag pages show the same questions as the sync views.
+        """
+        for client in (self.client, self.client_class()):
+            if client is not self.client:
+                client.force_login(self.user)
+            response = client.get(reverse("qa:index"))
+            self.assertEqual(response.status_code, 200)
+            self.assertTemplateUsed(response, "qa/question_list.html")
+            self.assertEqual(list(response.context["questions"]), [self.question, self.other])
+            self.assertEqual(response.context["questions"][0].num_answers, 1)
+            self.assertEqual(response.context["title"], "Latest questions list")
+
+            response = client.get(reverse("qa:tag_detail", args=("Asyncio",)), {"exclude": "windows"})
+            self.assertEqual(list(response.context["questions"]), [self.question])
+            self.assertEqual(response.context["title"], "Tags: Asyncio, without windows")
+        self.assertEqual(self.client.get(reverse("qa:tag_detail", args=("unknown",))).status_code, 404)
+        self.assertEqual(counters.visits.pending()[("index", timezone.localdate())], 2)
+
+    def test_question_page(self):
+        """
+        The question page shows the answers, is cached for anonymous readers and counts views.
+        """
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, "Async question")
+        self.assertContains(response, "Async answer")
+        self.assertEqual(response.context["answers"], [self.answer])
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(counters.views.pending(), {self.question.id: 1})
+        self.assertEqual(
+            self.client.get(reverse("qa:question_detail", args=(self.question.id + 100,))).status_code, 404)
+        self.assertEqual(counters.views.pending(), {self.question.id: 1})
+
+    def test_vote_and_answer(self):
+        """
+        Votes and answers of a user are saved, anonymous voters are sent to the login page.
+        """
+        vote_url = reverse("qa:question_vote", args=(self.question.id, "+1"))
+        response = self.client.get(vote_url)
+        self.assertRedirects(response, f"{reverse('login')}?next={vote_url.replace('+', '%2B')}",
+                             fetch_redirect_response=False)
+
+        self.client.force_login(self.user)
+        response = self.client.get(vote_url, {"next": self.detail_url})
+        self.assertRedirects(response, self.detail_url, fetch_redirect_response=False)
+        response = self.client.get(reverse("qa:answer_vote", args=(self.answer.id, "-1")))
+        self.assertRedirects(response, self.detail_url, fetch_redirect_response=False)
+        self.question.refresh_from_db()
+        self.answer.refresh_from_db()
+        self.assertEqual((self.question.score, self.answer.score), (1, -1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.detail_url, {"text": "Posted asynchronously"})
+        self.assertRedirects(response, self.detail_url, fetch_redirect_response=False)
+        self.assertTrue(Answer.objects.filter(question=self.question, text="Posted asynchronously").exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.author.email).count(), 1)
+
+    async def test_asgi_request(self):
+        """
+        Under the async handler the vote pins the voter to the primary and the page shows the vote.
+        """
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse("qa:question_vote", args=(self.question.id, "+1")), {"next": self.detail_url})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        response = await self.async_client.get(self.detail_url)
+        self.assertEqual(response.context["question"].score, 1)
+
+    async def test_vote_api(self):
+        """
+        The JSON vote endpoint is async under ASGI and returns the new score.
+        """
+        url = reverse("qa:answer_vote_api", args=(self.answer.id,))
+        self.assertTrue(resolve(url).func.view_class.view_is_async)
+        response = await self.async_client.post(url, {"vote": "1"})
+        self.assertEqual(response.status_code, 403)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(url, {"vote": "1"})
+        self.assertEqual(response.json(), {"score": 1, "vote": 1})
+        response = await self.async_client.post(url, {"vote": "0"})
+        self.assertEqual(response.status_code, 400)
+
+
+class LoadTestTests(TestCase):
+    def read(self, data: bytes) -> tuple:
+        async def parse():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await loadtest.read_response(reader), await reader.read()
+
+        return asyncio.run(parse())
+
+    def test_read_response(self):
+        """
+        Responses are read to their end by Content-Length, chunks or the closed connection.
+        """
+        self.assertEqual(
+            self.read(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhelloNEXT"), ((200, True), b"NEXT"))
+        self.assertEqual(
+            self.read(b"HTTP/1.1 404 Not Found\r\nTransfer-Encoding: chunked\r\n\r\n"
+                      b"5\r\nhello\r\n1;ext=1\r\n!\r\n0\r\n\r\nNEXT"),
+            ((404, True), b"NEXT"))
+        self.assertEqual(
+            self.read(b"HTTP/1.1 302 Found\r\nConnection: close\r\nContent-Length: 0\r\n\r\n"),
+            ((302, False), b""))
+        self.assertEqual(self.read(b"HTTP/1.0 200 OK\r\n\r\nbody"), ((200, False), b""))
+
+    def test_run(self):
+        """
+        Every connection sends requests until the deadline, failed responses are errors.
+        """
+        async def serve():
+            async def respond(reader, writer):
+                # every second response of a connection fails
+                statuses = itertools.cycle(["200 OK", "500 Internal Server Error"])
+                # until the client closes the connection
+                with contextlib.suppress(asyncio.IncompleteReadError):
+                    while await reader.readuntil(b"\r\n\r\n"):
+                        writer.write(f"HTTP/1.1 {next(statuses)}\r\nContent-Length: 2\r\n\r\nok".encode())
+
+            server = await asyncio.start_server(respond, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await loadtest.run(
+                    "127.0.0.1", port, loadtest.http_request("GET", "/"), concurrency=4, duration=0.2)
+
+        result = asyncio.run(serve())
+        self.assertGreater(result.requests, 4)
+        self.assertAlmostEqual(result.errors, result.requests / 2, delta=4)
+        summary = result.summary()
+        self.assertEqual(summary["concurrency"], 4)
+        self.assertLessEqual(summary["p50_ms"], summary["p99_ms"])
+
+    def test_requests(self):
+        """
+        Requests of the user carry the session and a CSRF token matching the cookie.
+        """
+        benchmark.seed_dataset(5, seed=1)
+        requests = loadtest.requests()
+        self.assertEqual(
+            set(requests),
+            {"index_anonymous", "index", "tag_detail", "question_detail", "vote", "answer_post"})
+        self.assertNotIn(b"Cookie", requests["index_anonymous"])
+        head, body = requests["answer_post"].split(b"\r\n\r\n")
+        token = dict(part.split("=") for part in body.decode().split("&"))["csrfmiddlewaretoken"]
+        self.assertIn(f"csrftoken={token}".encode(), head)
+        self.assertIn(f"Content-Length: {len(body)}".encode(), head)
+
+    def test_event_parser(self):
+        """
+        Events split across reads are parsed once complete, comments and retry hints are skipped.
+        """
+        parser = loadtest.EventParser()
+        self.assertEqual(parser.feed(b"retry: 5000\n\n: ping\n\nevent: score\ndata: {\"sc"), [])
+        self.assertEqual(
+            parser.feed(b"ore\": 1}\n\ndata: a\ndata: b\n\n"),
+            [("score", '{"score": 1}'), ("message", "a\nb")])
+
+
+class LiveStream:
+    """ A request to LiveApplication driven by the test """
+
+    def __init__(self, path: str, method: str = "GET"):
+        self.scope = {"type": "http", "path": path, "method": method}
+        self.sent = []
+        self.disconnected = asyncio.Event()
+        self.received = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.sent.append(message)
+        self.received.set()
+
+    @property
+    def status(self) -> int:
+        return self.sent[0]["status"]
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(message.get("body", b"") for message in self.sent[1:])
+
+    async def wait_for(self, data: bytes) -> None:
+        async with asyncio.timeout(5):
+            while data not in self.body:
+                self.received.clear()
+                await self.received.wait()
+
+
+@override_settings(LIVE_BACKEND="memory")
+class LiveTests(TestCase):
+    def setUp(self):
+        self.user = create_user("voter")
+        self.question = create_authored_question("Live question", self.user, days=-1)
+        self.answer = Answer.objects.create(text="Live answer", author=self.user, question=self.question)
+        self.application = live.LiveApplication(self.django_application)
+
+    async def django_application(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"django"})
+
+    def run_stream(self, stream: LiveStream, events=(), expected: bytes = None) -> None:
+        """
+        Open the stream, dispatch `events` once it is subscribed and
+        disconnect when `expected` came, other responses end on their own
+        """
+        async def run():
+            task = asyncio.ensure_future(self.application(stream.scope, stream.receive, stream.send))
+            if expected is not None:
+                await stream.wait_for(b"retry:")
+                for event in events:
+                    live.hub.dispatch(event)
+                await stream.wait_for(expected)
+                stream.disconnected.set()
+            await task
+
+        asyncio.run(run())
+
+    def test_topics(self):
+        """
+        Stream paths map to the trending topic and to the topic of a question.
+        """
+        self.assertEqual(live.topics(""), (live.TRENDING,))
+        self.assertEqual(live.topics("question/5/"), ("question:5", live.TRENDING))
+        self.assertIsNone(live.topics("question/five/"))
+        self.assertEqual(live.stream_url(5), "/qa/live/question/5/")
+        self.assertEqual(live.stream_url(), "/qa/live/")
+
+    def test_stream(self):
+        """
+        A stream gets the events of its topics only and is unsubscribed on disconnect.
+        """
+        stream = LiveStream(live.stream_url(self.question.id))
+        other = live.message(live.question_topic(self.question.id + 1), "score", {"score": 9})
+        event = live.message(live.question_topic(self.question.id), "score", {"score": 1})
+        self.run_stream(stream, [other, event], b"event: score\n")
+        self.assertEqual(stream.status, 200)
+        self.assertIn((b"content-type", b"text/event-stream"), stream.sent[0]["headers"])
+        self.assertEqual(stream.body, b'retry: 5000\n\nevent: score\ndata: {"score":1}\n\n')
+        self.assertEqual(live.hub.clients, 0)
+        self.assertEqual(dict(live.hub.subscribers), {})
+
+    def test_other_requests(self):
+        """
+        Other paths go to Django, unknown streams are not found and streams over the limit are refused.
+        """
+        stream = LiveStream("/qa/")
+        self.run_stream(stream)
+        self.assertEqual(stream.body, b"django")
+        for stream in (LiveStream("/qa/live/question/x/"), LiveStream(live.stream_url(), "POST")):
+            self.run_stream(stream)
+            self.assertEqual(stream.status, 404)
+        with override_settings(LIVE_MAX_CLIENTS=0):
+            stream = LiveStream(live.stream_url())
+            self.run_stream(stream)
+        self.assertEqual(stream.status, 503)
+        self.assertIn((b"retry-after", b"30"), stream.sent[0]["headers"])
+
+    def test_slow_client(self):
+        """
+        Events a client cannot take are replaced by one reset.
+        """
+        async def offer():
+            subscriber = live.Subscriber((live.TRENDING,), 3)
+            for number in range(5):
+                subscriber.offer(live.frame("score", {"score": number}))
+            return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())], subscriber.dropped
+
+        queued, dropped = asyncio.run(offer())
+        self.assertEqual(queued, [live.RESET, b'event: score\ndata: {"score":4}\n\n'])
+        self.assertEqual(dropped, 3)
+
+    def test_votes_and_answers_publish(self):
+        """
+        Scores and new answers are published to the question after commit.
+        """
+        with mock.patch.object(live, "send") as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.question.do_vote(user=self.user, current_vote=VoteStatus.LIKE)
+                self.answer.do_vote(user=self.user, current_vote=VoteStatus.DISLIKE)
+                send.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                answer = Answer.objects.create(text="Another", author=self.user, question=self.question)
+        topic = live.question_topic(self.question.id)
+        messages = [json.loads(call.args[0]) for call in send.call_args_list]
+        # the question entered the trending ranking
+        self.assertIn(live.TRENDING, [message["topic"] for message in messages])
+        self.assertEqual([message for message in messages if message["topic"] == topic], [
+            {"topic": topic, "event": "score", "data": {"question": self.question.id, "score": 1}},
+            {"topic": topic, "event": "score", "data": {"answer": self.answer.id, "score": -1}},
+            {"topic": topic, "event": "answer", "data": {"answer": answer.id}},
+        ])
+
+    def test_live_url(self):
+        """
+        Pages open the stream only when served with the async views.
+        """
+        self.assertContains(self.client.get(reverse("qa:index")), 'data-live-url=""')
+        with override_settings(ASYNC_VIEWS=True):
+            response = self.client.get(reverse("qa:question_detail", args=(self.question.id,)))
+        self.assertContains(response, f'data-live-url="{live.stream_url(self.question.id)}"')
+
+
+@override_settings(LIVE_BACKEND="postgres")
+class LiveNotifyTests(TransactionTestCase):
+    def test_notify(self):
+        """
+        Events sent with NOTIFY reach the streams of the process through its LISTEN connection.
+        """
+        if connection.vendor != "postgresql":
+            self.skipTest("NOTIFY needs PostgreSQL")
+        stream = LiveStream(live.stream_url())
+        event = live.message(live.TRENDING, "trending", {"questions": []})
+
+        async def run():
+            task = asyncio.ensure_future(live.LiveApplication(None)(stream.scope, stream.receive, stream.send))
+            await stream.wait_for(b"retry:")
+            async with asyncio.timeout(10):
+                await live.hub.listening.wait()
+            await asyncio.to_thread(live.send, event)
+            await stream.wait_for(b"event: trending\n")
+            stream.disconnected.set()
+            await task
+
+        asyncio.run(run())
+        self.assertTrue(stream.body.endswith(b'event: trending\ndata: {"questions":[]}\n\n'))
+
+
+class VoteApiTests(TestCase):
+    def setUp(self):
+        self.user = create_user("voter")
+        self.question = create_authored_question("Voted question", self.user, days=-1)
+        self.answer = Answer.objects.create(text="Voted answer", author=self.user, question=self.question)
+        self.question_url = reverse("qa:question_vote_api", args=(self.question.id,))
+        self.answer_url = reverse("qa:answer_vote_api", args=(self.answer.id,))
+        self.client.force_login(self.user)
+
+    def test_vote(self):
+        """
+        A vote returns the new score and the user's vote, the same vote again revokes it.
+        """
+        response = self.client.post(self.question_url, {"vote": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"score": 1, "vote": 1})
+        self.assertEqual(self.client.post(self.question_url, {"vote": "-1"}).json(), {"score": -1, "vote": -1})
+        self.assertEqual(self.client.post(self.question_url, {"vote": "-1"}).json(), {"score": 0, "vote": 0})
+        self.assertEqual(self.client.post(self.answer_url, {"vote": "-1"}).json(), {"score": -1, "vote": -1})
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.score, -1)
+
+    def test_vote_is_cheap(self):
+        """
+        A vote takes the session, the object and one vote statement: no page is rendered.
+        """
+        self.client.post(self.question_url, {"vote": "1"})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.answer_url, {"vote": "1"})
+        statements = [query["sql"] for query in queries]
+        self.assertEqual(sum("qa_answervote" in sql for sql in statements), 1, statements)
+        self.assertLessEqual(len(statements), 6, statements)
+
+    def test_errors(self):
+        """
+        Bad votes, unknown objects, anonymous users and GET are refused with JSON.
+        """
+        for data in ({}, {"vote": "2"}, {"vote": "up"}):
+            response = self.client.post(self.question_url, data)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+        response = self.client.post(reverse("qa:answer_vote_api", args=(self.answer.id + 100,)), {"vote": "1"})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(self.question_url).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.post(self.question_url, {"vote": "1"}).status_code, 403)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.score, 0)
+
+    def test_csrf(self):
+        """
+        Votes need the CSRF token, sent in the X-CSRFToken header by the buttons.
+        """
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        client.get(reverse("qa:question_create"))
+        self.assertEqual(client.post(self.question_url, {"vote": "1"}).status_code, 403)
+        response = client.post(
+            self.question_url, {"vote": "1"}, HTTP_X_CSRFTOKEN=client.cookies[settings.CSRF_COOKIE_NAME].value)
+        self.assertEqual(response.json(), {"score": 1, "vote": 1})
+
+    def test_buttons(self):
+        """
+        Vote links of the pages carry the JSON endpoint for the script, the links still work without it.
+        """
+        response = self.client.get(reverse("qa:question_detail", args=(self.question.id,)))
+        self.assertContains(response, f'data-vote-url="{self.question_url}" data-vote="1"')
+        self.assertContains(response, f'data-vote-url="{self.answer_url}" data-vote="-1"')
+        self.assertContains(response, reverse("qa:answer_vote", args=(self.answer.id, "-1")))
+        self.assertContains(response, "qa/vote.js")
@@ -0,0 +1,126 @@
+""" Time-decayed ranking of trending questions for the sidebar """
+import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DurationField, ExpressionWrapper, F, FloatField
+from django.db.models.functions import Extract, Now, Power
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from . import live, pagecache
+from .models import Question
+
+CACHE_KEY = "qa:trending"
+
+# cached candidates beyond the displayed ones, so that incremental updates
+# can promote questions without a full recompute
+CANDIDATES_FACTOR = 3
+
+
+def hotness(score: int, answers: int, created: datetime.datetime,
+            now: Optional[datetime.datetime] = None) -> float:
+    """
+    Hotness of a question: votes and answers decayed by the question age
+    :param score: votes score
+    :param answers: number of answers
+    :param created: question creation time
+    :param now: moment to compute hotness for, current time by default
+    """
+    now = now or timezone.now()
+    age_hours = max((now - created).total_seconds(), 0) / 3600
+    points = score + settings.TRENDING_ANSWER_WEIGHT * answers + 1
+    return points / (age_hours + 2) ** settings.TRENDING_GRAVITY
+
+
+def _entry(question: Question, answers: int) -> dict:
+    """ Cached representation of a trending question """
+    return {
+        "id": question.id,
+        "title": question.title,
+        "url": question.get_absolute_url(),
+        "score": question.score,
+        "answers": answers,
+        "created": question.created,
+    }
+
+
+def _rank(entries: list) -> list:
+    """ Sort entries by hotness at the current moment, keep the candidates """
+    now = timezone.now()
+    entries.sort(
+        key=lambda e: (hotness(e["score"], e["answers"], e["created"], now), e["created"]),
+        reverse=True,
+    )
+    return entries[:settings.TRENDING_COUNT * CANDIDATES_FACTOR]
+
+
+def _shown(entries: list) -> list:
+    return [(e["id"], e["title"], e["score"]) for e in (entries or [])[:settings.TRENDING_COUNT]]
+
+
+def _store(entries: list, previous: list) -> None:
+    """ Cache the ranking, invalidate cached pages when the shown part changes """
+    cache.set(CACHE_KEY, entries, settings.TRENDING_CACHE_TIMEOUT)
+    if _shown(previous) != _shown(entries):
+        pagecache.touch(pagecache.SIDEBAR)
+        # open pages redraw the sidebar, titles as short as shown (NOTIFY payloads are small)
+        live.publish(live.TRENDING, "trending", {"questions": [
+            [e["id"], Truncator(e["title"]).words(4), e["score"], e["url"]]
+            for e in entries[:settings.TRENDING_COUNT]
+        ]})
+
+
+def refresh() -> list:
+    """ Recompute the ranking with one query and store it in the cache """
+    window_start = timezone.now() - datetime.timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    age_hours = Extract(
+        ExpressionWrapper(Now() - F("created"), output_field=DurationField()),
+        "epoch",
+    ) / 3600.0
+    questions = Question.objects.filter(
+        created__gte=window_start
+    ).annotate(
+        num_answers=Count("answer"),
+    ).annotate(
+        hotness=ExpressionWrapper(
+            (F("score") + settings.TRENDING_ANSWER_WEIGHT * F("num_answers") + 1.0)
+            / Power(age_hours + 2.0, settings.TRENDING_GRAVITY),
+            output_field=FloatField(),
+        ),
+    ).only(
+        "id", "title", "score", "created"
+    ).order_by("-hotness", "-created")[:settings.TRENDING_COUNT * CANDIDATES_FACTOR]
+
+    entries = [_entry(question, question.num_answers) for question in questions]
+    _store(entries, previous=cache.get(CACHE_KEY))
+    return entries
+
+
+def top_questions() -> list:
+    """ Trending questions, one cache lookup unless the ranking has expired """
+    entries = cache.get(CACHE_KEY)
+    if entries is None:
+        entries = refresh()
+    return entries[:settings.TRENDING_COUNT]
+
+
+def question_changed(question: Question) -> None:
+    """
+    Re-rank one question in the cached ranking after a vote or an answer.
+    Concurrent updates from several workers may overwrite each other,
+    the periodic refresh corrects such rare losses.
+    """
+    entries = cache.get(CACHE_KEY)
+    if entries is None:
+        # nothing to update, the next read recomputes the ranking
+        return
+
+    previous = entries
+    window_start = timezone.now() - datetime.timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    entries = [e for e in entries if e["id"] != question.id]
+    if question.created >= window_start:
+        entries.append(_entry(question, question.answer_set.count()))
+
+    _store(_rank(entries), previous)
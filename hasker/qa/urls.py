@@ -1,30 +1,39 @@
+from django.conf import settings
 from django.urls import path, re_path
 
-from . import views
+from . import async_views, views
+
+# under ASGI the question lists, question pages and votes are async views
+pages = async_views if settings.ASYNC_VIEWS else views
 
 app_name = "qa"
 urlpatterns = [
     # ex: /qa/
-    path("", views.QuestionListView.as_view(), name="index"),
+    path("", pages.QuestionListView.as_view(), name="index"),
     path("search/", views.QuestionListView.as_view(), name="search_results"),
     # ex: /qa/5/ - question_detail view question and its answers
-    path("question/<int:pk>/", views.QuestionDetailView.as_view(), name="question_detail"),
+    path("question/<int:pk>/", pages.QuestionDetailView.as_view(), name="question_detail"),
     # ex: /qa/question/create/ - create new question
     path("question/create/", views.QuestionCreate.as_view(), name='question_create'),
     # ex: /qa/tag/create/ - create new tag
     path("tag/create/", views.TagCreate.as_view(), name='tag_create'),
     # ex: /qa/tag/list/ - list all tags
     path("tag/list/", views.TagListView.as_view(), name='tag_list'),
+    # ex: /qa/tag/autocomplete/?q=li - JSON of tags starting with "li"
+    path("tag/autocomplete/", views.TagAutocompleteView.as_view(), name="tag_autocomplete"),
     # ex: /qa/tag/linux - display all questions with this tag
-    path("tag/<str:tag_text>/", views.QuestionListView.as_view(), name="tag_detail"),
+    path("tag/<str:tag_text>/", pages.QuestionListView.as_view(), name="tag_detail"),
     # "mark answer as correct" button
     path("question/<int:question_id>/mark_answer_as_correct/<int:answer_id>",
         views.MarkCorrectAnswerView.as_view(),
         name="mark_answer_as_correct"),
+    # ex: POST /qa/question/5/vote/ with vote=1 - JSON of the new score
+    path("question/<int:question_id>/vote/", pages.QuestionVoteApiView.as_view(), name="question_vote_api"),
+    path("answer/<int:answer_id>/vote/", pages.AnswerVoteApiView.as_view(), name="answer_vote_api"),
     re_path(r'^question/(?P<question_id>\d+)/vote/(?P<vote>[+-]1)',
-        views.QuestionVoteView.as_view(),
+        pages.QuestionVoteView.as_view(),
         name="question_vote"),
     re_path(r'^answer/(?P<answer_id>\d+)/vote/(?P<vote>[+-]1)',
-        views.AnswerVoteView.as_view(),
+        pages.AnswerVoteView.as_view(),
         name="answer_vote")
 ]
@@ -1,37 +1,106 @@
 """ Views for Q&A application """
+from typing import Optional
+
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core import paginator
-from django.core.mail import send_mail
-
-from django.db.models import Q, Count
-from django.http import HttpResponse, HttpResponseRedirect, HttpResponseBadRequest, HttpRequest
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, HttpResponseBadRequest, HttpRequest, JsonResponse
+)
 
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, resolve, reverse_lazy
-from django.utils.text import Truncator
-from django.views.generic import ListView, DetailView, RedirectView
+from django.utils.cache import patch_cache_control
+from django.views.generic import ListView, DetailView, RedirectView, View
 from django.views.generic.edit import CreateView
 
-from .models import Answer, Question, Tag
+from . import counters, fragments, notifications, pagecache, routers, search, tags
+from .models import Answer, Question, Tag, VoteResult, VoteStatus
+from .pagination import CursorPaginator
 from .forms import AnswerForm, TagForm, QuestionForm
 
+
+def question_cards(questions):
+    """ Questions with everything their cards show """
+    # subquery instead of a join keeps GROUP BY out of the search query
+    answers_count = Answer.objects.filter(
+        question=OuterRef("pk")
+    ).order_by().values("question").annotate(count=Count("pk")).values("count")
+    # a whole page in a constant number of queries: cards show tags,
+    # author and avatar, the search vector is never shown
+    return questions.annotate(
+        num_answers=Coalesce(Subquery(answers_count), 0)
+    ).select_related(
+        "author__profile"
+    ).prefetch_related(
+        "tags"
+    ).defer("search_vector")
+
+
+def question_details():
+    """ Questions with everything the question page shows """
+    return Question.objects.select_related(
+        "author__profile"
+    ).prefetch_related(
+        "tags"
+    ).defer("search_vector")
+
+
+def answers_paginator(question: Question, per_page: int) -> CursorPaginator:
+    return CursorPaginator(
+        question.answer_set.select_related("author__profile"),
+        ("score", "created", "id"),
+        per_page,
+    )
+
+
+def post_answer(question: Question, author, text: str) -> Answer:
+    answer = Answer(text=text, author=author, question=question)
+    # the notification is queued in the same transaction and
+    # delivered by `manage.py send_notifications`
+    with transaction.atomic():
+        answer.save()
+        notifications.notify_question_author(answer)
+    return answer
+
+
 # https://docs.djangoproject.com/en/5.0/topics/class-based-views/generic-display/
-class QuestionListView(ListView):
+class QuestionListView(routers.ReplicaReadsMixin, pagecache.AnonymousPageCacheMixin, ListView):
     """ View for listing all questions or for search results """
     model = Question
     template_name = "qa/question_list.html"
     context_object_name = "questions"
     title = ""
     search_phrase = ""
+    search_query = None
     tag_text = ""
+    included_tags = []
+    excluded_tags = []
     paginate_by = settings.PAGINATE_QUESTIONS
+    # ?sort= value -> keyset pagination order, all descending, the last field is unique
+    sort_orderings = {
+        "score": ("score", "created", "id"),
+        "views": ("views", "created", "id"),
+    }
+    sort = "score"
         
     def dispatch(self, request, *args, **kwargs):
         url_name = resolve(self.request.path).url_name
+        # buffered in memory, the session is not written for reading
+        counters.visits.add(url_name)
+        if request.GET.get("sort") in self.sort_orderings:
+            self.sort = request.GET["sort"]
+        self.keyset_ordering = self.sort_orderings[self.sort]
         if url_name == "tag_detail":
             self.tag_text = self.kwargs.get("tag_text", "")
-            self.title = f"Tags: {self.tag_text}"
+            # ex: /qa/tag/python/?tag=django&exclude=windows
+            self.included_tags = [self.tag_text, *request.GET.getlist("tag")]
+            self.excluded_tags = request.GET.getlist("exclude")
+            self.title = f"Tags: {' + '.join(self.included_tags)}"
+            if self.excluded_tags:
+                self.title += f", without {', '.join(self.excluded_tags)}"
         
         elif url_name == "search_results":
             self.search_phrase = self.request.GET.get("q", "")
@@ -40,126 +109,142 @@ class QuestionListView(ListView):
                 return HttpResponseBadRequest("Empty search phrase")
             self.title = f"Search results: {self.search_phrase}"
             
-            if self.search_phrase.startswith("tag:"):
-                tag_text = self.search_phrase[4:].strip()
-                if not tag_text:
-                    return HttpResponseBadRequest("Empty tag")
-                return redirect("qa:tag_detail", tag_text=tag_text)
+            self.search_query = search.parse_query(self.search_phrase)
+            if not (self.search_query.tags or self.search_query.excluded_tags
+                    or self.search_query.text):
+                return HttpResponseBadRequest("Empty tag")
+            # `tag:linux tag:kernel -tag:windows` without text is the tag page
+            if self.search_query.tags and not self.search_query.text:
+                return redirect(tags.page_url(self.search_query.tags, self.search_query.excluded_tags))
         else:
             self.title = "Latest questions list"
             
         return super().dispatch(request, *args, **kwargs)
     
     
+    def page_cache_scopes(self):
+        # search results are not cached, queries are too diverse
+        if self.search_phrase:
+            return None
+        # cards show view counts
+        return [*super().page_cache_scopes(), pagecache.VIEWS]
+
     def get_queryset(self):
         if self.search_phrase:
-            questions = Question.objects.filter(
-                Q(title__icontains=self.search_phrase) |
-                Q(text__icontains=self.search_phrase)
-            )
+            questions = Question.objects.all()
+            if self.search_query.tags or self.search_query.excluded_tags:
+                included, excluded, unknown = tags.resolve(
+                    self.search_query.tags, self.search_query.excluded_tags)
+                questions = questions.none() if unknown else tags.tagged(questions, included, excluded)
+            if self.search_query.text:
+                questions = search.search(questions, self.search_query.text)
+                # ordered by relevance unless another order is asked for
+                if self.sort == "score":
+                    self.keyset_ordering = ("rank", *self.keyset_ordering)
         elif self.tag_text:
-            tag = get_object_or_404(Tag, tag_text=self.tag_text)
-            questions = tag.questions.all()
+            included, excluded, unknown = tags.resolve(self.included_tags, self.excluded_tags)
+            if unknown:
+                raise Http404(f"Unknown tags: {', '.join(unknown)}")
+            questions = tags.tagged(Question.objects.all(), included, excluded)
         else:
             questions = Question.objects.all()
-        questions = questions.annotate(num_answers=Count("answer"))
+        return question_cards(questions)
 
-        return sorted(questions, key=lambda a: (a.votes_count, a.created), reverse=True)
+    def paginate_queryset(self, queryset, page_size):
+        """ Cursor pagination: no COUNT(*), deep pages cost as much as the first one """
+        questions_paginator = CursorPaginator(queryset, self.keyset_ordering, page_size)
+        page = questions_paginator.page(self.request.GET.get("cursor"))
+        return questions_paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = self.title
         context["tag"] = self.tag_text
+        context["included_tags"] = self.included_tags
+        context["excluded_tags"] = self.excluded_tags
         context["search_phrase"] = self.search_phrase
-
-        num_visits = self.request.session.get('num_visits', 0)
-        self.request.session['num_visits'] = num_visits + 1
-        context['num_visits'] = num_visits
+        context["sort"] = self.sort
+        # search snippets depend on the query, such cards are not cached
+        if not (self.search_query and self.search_query.text):
+            fragments.prepare_question_cards(context["questions"], self.request)
 
         return context
 
 
-class TagListView(ListView):
+class TagListView(routers.ReplicaReadsMixin, pagecache.AnonymousPageCacheMixin, ListView):
+    """ Directory of tags by name or by number of questions, with the tag cloud """
     model = Tag
     paginate_by = 100
+    # ?sort= value -> ordering, "popular" is served by tag_usage_idx
+    sort_orderings = {
+        "name": ("tag_text",),
+        "popular": ("-usage", "tag_text"),
+    }
+    sort = "name"
 
+    def page_cache_scopes(self):
+        return [pagecache.TAGS, pagecache.SIDEBAR, pagecache.PROFILES]
 
-class QuestionDetailView(DetailView):
+    def get_queryset(self):
+        if self.request.GET.get("sort") in self.sort_orderings:
+            self.sort = self.request.GET["sort"]
+        return Tag.objects.order_by(*self.sort_orderings[self.sort])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["sort"] = self.sort
+        context["cloud"] = tags.cloud()
+        return context
+
+
+class QuestionDetailView(routers.ReplicaReadsMixin, pagecache.AnonymousPageCacheMixin, DetailView):
     """ Shows question detail with its answers"""
     model = Question
     template_name = "qa/question_detail.html"
     context_object_name = "question"
     answers_paginate_by = settings.PAGINATE_ANSWERS
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['form'] = AnswerForm()
+    def page_cache_scopes(self):
+        return [pagecache.question_scope(self.kwargs["pk"]), pagecache.SIDEBAR, pagecache.PROFILES]
 
-        answers_page = self.request.GET.get("page", 1)
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        # cached pages are counted too, missing questions are not
+        if request.method == "GET" and response.status_code in (200, 304):
+            counters.views.add_view(self.kwargs["pk"], counters.visitor(request))
+        return response
 
-        answers = sorted(
-            self.object.answer_set.all(), 
-            key=lambda a: (a.votes_count, a.created), reverse=True)
+    def get_queryset(self):
+        return question_details()
 
-        context["answers"] = answers
-        answers_paginator = paginator.Paginator(
-            answers, self.answers_paginate_by
-        )
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['form'] = AnswerForm()
 
-        try:  # Catch invalid page numbers
-            answers_page_obj = answers_paginator.page(answers_page)
-        except (paginator.PageNotAnInteger, paginator.EmptyPage):
-            answers_page_obj = answers_paginator.page(1)
+        # malformed cursors give the first page
+        answers_page_obj = answers_paginator(self.object, self.answers_paginate_by).page(self.request.GET.get("cursor"))
 
         context["answers_page_obj"] = answers_page_obj
         context["answers"] = answers_page_obj.object_list
+        fragments.prepare_answer_blocks(context["answers"], self.object, self.request)
 
         return context
 
     def post(self, request, *args, **kwargs):
         """ Used for posting answer to the question """
         self.object = self.get_object()
-        print('posting answer')
         if not request.user.is_authenticated:
             return super().get(request, *args, **kwargs)
 
         form = AnswerForm(request.POST)
         if form.is_valid():
-            answer_instance = Answer(
-                text=form.cleaned_data['text'],
-                author=request.user,
-                question=self.object
-            )
-            answer_instance.save()
-            self.notify_question_author(answer_instance)
-            form = AnswerForm()
-
-        context = self.get_context_data(object=self.object)
-        context["form"] = form
+            post_answer(self.object, request.user, form.cleaned_data['text'])
 
         # Always return an HttpResponseRedirect after successfully dealing
         # with POST data. This prevents data from being posted twice if a
         # user hits the Back button.
         return HttpResponseRedirect(reverse("qa:question_detail", args=(self.object.id,)))
 
-    @staticmethod
-    def notify_question_author(answer):
-        """ Notify the author of the question when a new answer is added """
-        title_truncated = Truncator(answer.question.title)
-
-        subject = f"New reply for '{title_truncated.words(5)}' - Hasker"
-        message = f"""
-            <p>{answer.author.username} has replied to your question
-            <a href="{answer.question.url}">{title_truncated.words(10)}</a>:</p>
-            <p>{Truncator(answer.text).words(25)}</p>
-        """
-        from_email = settings.TECH_EMAIL
-        recipient_list = [answer.question.author.email]
-        print(f'sending mail to {recipient_list}' )
-        send_mail(
-            subject, message, from_email, recipient_list
-        )
-
 
 class QuestionCreate(LoginRequiredMixin, CreateView):
     """ Create question """
@@ -178,6 +263,20 @@ class TagCreate(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy("qa:tag_list")
 
 
+class TagAutocompleteView(View):
+    """ JSON list of the most used tags starting with ?q= """
+    http_method_names = ["get"]
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        results = tags.autocomplete(request.GET.get("q", ""), settings.TAG_AUTOCOMPLETE_LIMIT)
+        response = JsonResponse({
+            "results": [{"name": name, "questions": usage} for name, usage in results],
+        })
+        # the same prefixes are typed by everybody
+        patch_cache_control(response, public=True, max_age=settings.TAG_AUTOCOMPLETE_MAX_AGE)
+        return response
+
+
 class BaseVoteView(LoginRequiredMixin, CreateView):
     """ Base view for voting for questions or answers """
     http_method_names = ["get"]
@@ -224,6 +323,61 @@ class AnswerVoteView(BaseVoteView):
     pk_url_kwarg = "answer_id"
 
 
+def posted_vote(request: HttpRequest) -> Optional[VoteStatus]:
+    """ VoteStatus of POST vote=1 or vote=-1, None for anything else """
+    try:
+        return VoteStatus(int(request.POST.get("vote", "")))
+    except ValueError:
+        return None
+
+
+def vote_error(request: HttpRequest, vote: Optional[VoteStatus]) -> Optional[JsonResponse]:
+    """ Response to a vote that cannot be made, None when it can """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Log in to vote"}, status=403)
+    if vote is None:
+        return JsonResponse({"error": "vote must be 1 or -1"}, status=400)
+    return None
+
+
+def vote_result(result: VoteResult) -> JsonResponse:
+    # the user's vote after the click: 1, -1 or 0 when the same vote revoked it
+    return JsonResponse({"score": result.score, "vote": result.vote})
+
+
+class BaseVoteApiView(View):
+    """
+    Vote with POST vote=1 or vote=-1 (CSRF token required), the answer is
+    JSON with the new score and the user's vote instead of a redirect
+    """
+    http_method_names = ["post"]
+    model = None
+    pk_url_kwarg = None
+
+    def post(self, request: HttpRequest, *args, **kwargs) -> JsonResponse:
+        vote = posted_vote(request)
+        error = vote_error(request, vote)
+        if error:
+            return error
+        try:
+            vote_object = self.model.objects.get(id=kwargs[self.pk_url_kwarg])
+        except self.model.DoesNotExist:
+            return JsonResponse({"error": "Not found"}, status=404)
+        return vote_result(vote_object.do_vote(user=request.user, current_vote=vote))
+
+
+class QuestionVoteApiView(BaseVoteApiView):
+
+    model = Question
+    pk_url_kwarg = "question_id"
+
+
+class AnswerVoteApiView(BaseVoteApiView):
+
+    model = Answer
+    pk_url_kwarg = "answer_id"
+
+
 class MarkCorrectAnswerView(LoginRequiredMixin, RedirectView):
 
     def get_redirect_url(self, *args, **kwargs):
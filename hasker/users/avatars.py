@@ -0,0 +1,100 @@
+""" Processing of uploaded avatars in a pool of worker processes """
+import concurrent.futures
+import logging
+import multiprocessing
+import threading
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .models import Profile
+from .thumbnails import make_variants
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# set when the variants of a scheduled avatar are saved
+_pending = set()
+
+
+def executor() -> concurrent.futures.ProcessPoolExecutor:
+    """ Pool of the current process, started on the first upload """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            # spawned workers do not inherit database connections and threads
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=settings.AVATAR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def needs_processing(profile: Profile) -> bool:
+    """ New upload, the variants of the current image are not made yet """
+    return bool(profile.avatar) and profile.avatar_source != profile.avatar.name
+
+
+def _apply(profile_id: int, source: str, variants: str) -> None:
+    # the avatar may have been replaced meanwhile, its own job handles it;
+    # save() sends post_save, which invalidates the cached pages
+    profile = Profile.objects.filter(pk=profile_id, avatar=source).first()
+    if profile is not None:
+        profile.avatar_source = source
+        profile.avatar_variants = variants
+        profile.save(update_fields=["avatar_source", "avatar_variants"])
+
+
+def _job(profile: Profile) -> tuple:
+    return (
+        default_storage.path(profile.avatar.name),
+        default_storage.path(settings.AVATAR_VARIANTS_DIR),
+        tuple(settings.AVATAR_SIZES),
+    )
+
+
+def _finished(profile_id: int, source: str, done: threading.Event,
+              future: concurrent.futures.Future) -> None:
+    # runs in a thread of the pool, not in a request
+    try:
+        _apply(profile_id, source, future.result())
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Avatar %s of profile %s was not processed", source, profile_id)
+    finally:
+        # the connection of this thread
+        connection.close()
+        _pending.discard(done)
+        done.set()
+
+
+def process(profile: Profile) -> None:
+    """ Make the variants of the current avatar in the calling process """
+    _apply(profile.pk, profile.avatar.name, make_variants(*_job(profile)))
+
+
+def schedule(profile: Profile) -> None:
+    """
+    Make the variants of a new upload after commit, in the pool or,
+    with AVATAR_WORKERS = 0, in the calling process
+    """
+    if not needs_processing(profile):
+        return
+    profile_id, source, job = profile.pk, profile.avatar.name, _job(profile)
+
+    def submit():
+        if not settings.AVATAR_WORKERS:
+            _apply(profile_id, source, make_variants(*job))
+            return
+        done = threading.Event()
+        _pending.add(done)
+        future = executor().submit(make_variants, *job)
+        future.add_done_callback(lambda future: _finished(profile_id, source, done, future))
+
+    transaction.on_commit(submit)
+
+
+def wait(timeout: float = None) -> bool:
+    """ Wait until the scheduled avatars are processed, False on timeout """
+    return all(done.wait(timeout) for done in list(_pending))
@@ -0,0 +1,22 @@
+""" Backfill of resized avatars """
+from django.core.management.base import BaseCommand
+
+from users import avatars
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Resize uploaded avatars that have no variants yet, e.g. uploaded before resizing existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the workers")
+
+    def handle(self, *args, **options):
+        scheduled = 0
+        for profile in Profile.objects.exclude(avatar="").exclude(avatar__isnull=True).iterator():
+            if avatars.needs_processing(profile):
+                avatars.schedule(profile)
+                scheduled += 1
+        if not avatars.wait(options["timeout"]):
+            self.stderr.write("Timed out waiting for the workers")
+        self.stdout.write(f"Processed {scheduled} avatar(s)")
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_source',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_variants',
+            field=models.CharField(blank=True, editable=False, help_text='Name pattern of the resized avatars, {size} stands for the size', max_length=100),
+        ),
+    ]
@@ -1,9 +1,11 @@
 """ Users profile model for Q&A application """
-from PIL import Image
-
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db import models
 from django.contrib.auth.models import User
 
+from .thumbnails import SIZE_PLACEHOLDER
+
 
 class Profile(models.Model):
     """ Add some fields to built-in Django user class """
@@ -12,17 +14,32 @@ class Profile(models.Model):
         verbose_name="Profile picture", upload_to="avatars",
         blank=True, null=True
     )
-    
+    # set by users.avatars when the variants of `avatar_source` are made
+    avatar_source = models.CharField(max_length=100, blank=True, editable=False)
+    avatar_variants = models.CharField(
+        max_length=100, blank=True, editable=False,
+        help_text="Name pattern of the resized avatars, {size} stands for the size")
+
     def __str__(self):
         return self.user.username
-    
-    def save(self, *args, **kwargs):
-        """ Resizing avatar images on save"""
-        super().save()
-        if self.avatar:
-            img = Image.open(self.avatar.path)
-
-            if img.height > 256 or img.width > 256:
-                new_img = (256, 256)
-                img.thumbnail(new_img)
-                img.save(self.avatar.path)
+
+    def avatar_url(self, size: int):
+        """ Url of the avatar variant, the uploaded image until it is processed """
+        if not self.avatar:
+            return None
+        if self.avatar_variants and self.avatar_source == self.avatar.name:
+            name = self.avatar_variants.replace(SIZE_PLACEHOLDER, str(size))
+            return default_storage.url(f"{settings.AVATAR_VARIANTS_DIR}/{name}")
+        return self.avatar.url
+
+    @property
+    def avatar_32(self):
+        return self.avatar_url(32)
+
+    @property
+    def avatar_64(self):
+        return self.avatar_url(64)
+
+    @property
+    def avatar_256(self):
+        return self.avatar_url(256)
@@ -2,6 +2,7 @@ from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 
+from . import avatars
 from .models import Profile
 
 # create the profiles automatically when a new user is created
@@ -11,6 +12,7 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
-@receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
+# resize new uploads once, out of the request
+@receiver(post_save, sender=Profile)
+def process_avatar(sender, instance, **kwargs):
+    avatars.schedule(instance)
@@ -1,3 +1,151 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from . import avatars
+from .models import Profile
+from .thumbnails import make_variants
+
+
+def image_file(name="avatar.png", size=(300, 200), mode="RGB", color=(200, 30, 30)):
+    """ An uploaded image of the given size """
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class MediaRootMixin:
+    """ Uploads and variants go to a temporary media root """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+
+class ThumbnailTests(MediaRootMixin, TestCase):
+    def test_variants_are_square_and_content_hashed(self):
+        """
+        Every size is written once under a name derived from the content.
+        """
+        source = os.path.join(self.media_root, "source.png")
+        with open(source, "wb") as file:
+            file.write(image_file().read())
+        directory = os.path.join(self.media_root, "variants")
+
+        name = make_variants(source, directory, (32, 64))
+        self.assertRegex(name, r"^[0-9a-f]{20}-\{size\}\.jpg$")
+        for size in (32, 64):
+            with Image.open(os.path.join(directory, name.replace("{size}", str(size)))) as image:
+                self.assertEqual(image.size, (size, size))
+
+        # the same content again: nothing is rewritten
+        mtime = os.path.getmtime(os.path.join(directory, name.replace("{size}", "32")))
+        copy = os.path.join(self.media_root, "copy.png")
+        shutil.copy(source, copy)
+        self.assertEqual(make_variants(copy, directory, (32, 64)), name)
+        self.assertEqual(
+            os.path.getmtime(os.path.join(directory, name.replace("{size}", "32"))), mtime)
+
+    def test_transparent_images_stay_png(self):
+        """
+        Images with an alpha channel are not flattened to JPEG.
+        """
+        source = os.path.join(self.media_root, "source.png")
+        with open(source, "wb") as file:
+            file.write(image_file(mode="RGBA", color=(0, 0, 0, 0)).read())
+        self.assertTrue(make_variants(source, self.media_root, (32,)).endswith(".png"))
+
+
+@override_settings(AVATAR_WORKERS=0)
+class AvatarPipelineTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="avatar_user", password="password")
+
+    def upload(self):
+        profile = self.user.profile
+        profile.avatar = image_file()
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        profile.refresh_from_db()
+        return profile
+
+    def test_upload_is_processed_once(self):
+        """
+        Variants are made after the upload and used by the templates.
+        """
+        profile = self.upload()
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+        self.assertIn("avatars/variants/", profile.avatar_32)
+        self.assertTrue(profile.avatar_32.endswith("-32.jpg"))
+        self.assertFalse(avatars.needs_processing(profile))
+
+        with mock.patch.object(avatars, "make_variants") as make:
+            with self.captureOnCommitCallbacks(execute=True):
+                profile.save()
+        make.assert_not_called()
+
+    def test_login_does_not_touch_the_avatar(self):
+        """
+        Saving the user (e.g. last_login on login) does not resave the profile.
+        """
+        self.upload()
+        with mock.patch.object(Image, "open") as image_open:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.login(username="avatar_user", password="password")
+        image_open.assert_not_called()
+        self.assertEqual(callbacks, [])
+
+    def test_unprocessed_upload_falls_back_to_original(self):
+        """
+        Until the variants exist the uploaded image is shown.
+        """
+        profile = self.user.profile
+        profile.avatar = image_file()
+        profile.save()
+        self.assertEqual(profile.avatar_32, profile.avatar.url)
+        self.assertIsNone(Profile(user=self.user).avatar_32)
+
+    def test_process_avatars_command(self):
+        """
+        The command backfills avatars uploaded before processing.
+        """
+        profile = self.user.profile
+        profile.avatar = image_file()
+        profile.save()
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("process_avatars", stdout=out)
+        self.assertIn("Processed 1 avatar(s)", out.getvalue())
+        profile.refresh_from_db()
+        self.assertFalse(avatars.needs_processing(profile))
+
+
+@override_settings(AVATAR_WORKERS=1)
+class AvatarPoolTests(MediaRootMixin, TransactionTestCase):
+    def test_upload_is_processed_in_worker_process(self):
+        """
+        The pool makes the variants and the profile is updated afterwards.
+        """
+        user = User.objects.create_user(username="pool_user", password="password")
+        profile = user.profile
+        profile.avatar = image_file()
+        profile.save()
+        self.assertTrue(avatars.wait(timeout=60))
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.media_root, "avatars/variants", profile.avatar_variants.replace("{size}", "256"))))
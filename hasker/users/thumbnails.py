@@ -0,0 +1,48 @@
+""" Avatar variants made with Pillow, run in worker processes (no Django imports) """
+import hashlib
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+# part of the variant file names replaced by the size
+SIZE_PLACEHOLDER = "{size}"
+
+
+def make_variants(source: str, directory: str, sizes: tuple) -> str:
+    """
+    Write square variants of an image, named by the hash of its content.
+    Variants of an already processed content are not made again.
+    :param source: path of the uploaded image
+    :param directory: directory of the variants
+    :param sizes: side lengths in pixels
+    :return: file name pattern of the variants, SIZE_PLACEHOLDER stands for the size
+    """
+    with open(source, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()[:20]
+
+    with Image.open(source) as image:
+        # photos keep their orientation, transparent images stay PNG
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        extension = "png" if has_alpha else "jpg"
+        name = f"{digest}-{SIZE_PLACEHOLDER}.{extension}"
+        pattern = os.path.join(directory, name)
+        missing = [size for size in sizes
+                   if not os.path.exists(pattern.replace(SIZE_PLACEHOLDER, str(size)))]
+        if not missing:
+            return name
+
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        os.makedirs(directory, exist_ok=True)
+        for size in missing:
+            variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            # written aside and renamed, a reader never sees a partial file
+            handle, temporary = tempfile.mkstemp(dir=directory, suffix=f".{extension}")
+            with os.fdopen(handle, "wb") as file:
+                if has_alpha:
+                    variant.save(file, "PNG", optimize=True)
+                else:
+                    variant.save(file, "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(temporary, pattern.replace(SIZE_PLACEHOLDER, str(size)))
+    return name